@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+In-memory IP -> ASN interval index
+
+Loads the as_ip_ranges table once into sorted uint32 boundaries and resolves
+IPs to ASN and AS name with a vectorized binary search (np.searchsorted)
+instead of an INET_ATON(...) BETWEEN ... join per resolver.
+
+Overlapping or nested ranges are flattened into disjoint segments up front;
+every segment is owned by the most specific (smallest) range covering it, so a
+/24 announced inside a /16 wins for its addresses. A second flattening keyed
+by (ASN, address) finds the most specific range of a given ASN, for matching
+resolvers against their recorded ASN like the old join did. The index can be
+saved to a .npz file so later runs skip rebuilding it; the file records
+storage.table_fingerprint of as_ip_ranges (row count, max id and UPDATE_TIME
+or file modification times) and is rebuilt once the table no longer matches
+it.
+
+Usage:
+    python3 asn_index.py build [--db URL] [--output asn_index.npz]
+    python3 asn_index.py annotate IP_FILE [--db URL] [--index asn_index.npz] [--output annotated.tsv]
+
+Requires: pip install mysql-connector-python numpy pandas
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+from typing import Optional, Tuple
+
+from ipv4 import parse_ipv4
+from storage import DEFAULT_DB_CONFIG, DatabaseErrors, StorageBackend, get_backend, resolve_source, table_fingerprint
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'asn_index.npz')
+
+ASN_KEY_SHIFT = 33  # Per-ASN segment keys are asn_code << 33 | address (range stops reach 2^32)
+
+
+def _to_uint32(values) -> Tuple[np.ndarray, np.ndarray]:
+    """Accept dotted-quad strings or integers and return (uint32 array, valid mask)"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iu':
+        arr = arr.astype(np.int64)
+        valid = (arr >= 0) & (arr <= 0xFFFFFFFF)
+        return np.where(valid, arr, 0).astype(np.uint32), valid
+    return parse_ipv4(arr)
+
+
+def _flatten(starts: np.ndarray, stops: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Disjoint segments of possibly nested [start, stop) ranges
+
+    Returns the sorted segment bounds and, per segment, the index of the most
+    specific range covering it (-1 where none does).
+    """
+    # Disjoint elementary segments between every range boundary
+    bounds = np.unique(np.concatenate((starts, stops)))
+    owners = np.full(bounds.size, -1, dtype=np.int32)
+    first = np.searchsorted(bounds, starts)
+    last = np.searchsorted(bounds, stops)
+
+    # Paint the widest ranges first so nested, more specific ranges win
+    sizes = (stops - starts).astype(np.int64)
+    for i in np.argsort(-sizes, kind='stable'):
+        owners[first[i]:last[i]] = i
+
+    # Drop boundaries between segments that ended up with the same owner
+    keep = np.ones(bounds.size, dtype=bool)
+    keep[1:] = owners[1:] != owners[:-1]
+    return bounds[keep], owners[keep]
+
+
+class ASNIndex:
+    """Sorted, disjoint segment index over the as_ip_ranges table"""
+
+    def __init__(self, bounds: np.ndarray, owners: np.ndarray, asns: np.ndarray, as_names: np.ndarray,
+                 fingerprint: Optional[str] = None, asn_keys: np.ndarray = None, match_bounds: np.ndarray = None,
+                 match_owners: np.ndarray = None):
+        """
+        Args:
+            bounds: Sorted segment start addresses (uint64, the last one may be 2^32)
+            owners: Label index owning each segment, -1 where no range applies
+            asns: ASN label per owner index
+            as_names: AS name label per owner index
+            fingerprint: table_fingerprint() of the table the index was built from
+            asn_keys: Sorted distinct ASN labels
+            match_bounds: Sorted per-ASN segment keys (asn_keys index << ASN_KEY_SHIFT | address)
+            match_owners: Label index owning each per-ASN segment, -1 where no range of that ASN applies
+        """
+        self.bounds = bounds
+        self.owners = owners
+        self.asns = asns
+        self.as_names = as_names
+        self.fingerprint = fingerprint
+        self.asn_keys = asn_keys
+        self.match_bounds = match_bounds
+        self.match_owners = match_owners
+
+    @classmethod
+    def from_ranges(cls, start_ips, end_ips, asns, as_names) -> 'ASNIndex':
+        """
+        Build the index from parallel range columns
+
+        Args:
+            start_ips: First address of each range (dotted quad or integer)
+            end_ips: Last address of each range, inclusive
+            asns: ASN of each range
+            as_names: AS name of each range
+        """
+        starts, valid_start = _to_uint32(start_ips)
+        ends, valid_end = _to_uint32(end_ips)
+        valid = valid_start & valid_end & (starts <= ends)
+
+        starts = starts[valid].astype(np.uint64)
+        stops = ends[valid].astype(np.uint64) + 1
+        asns = np.asarray(asns, dtype=str)[valid]
+        as_names = np.asarray(as_names, dtype=str)[valid]
+
+        bounds, owners = _flatten(starts, stops)
+
+        # Ranges of different ASNs never overlap once keyed by (ASN, address),
+        # so the same flattening gives the most specific range per ASN
+        asn_keys, asn_codes = np.unique(asns, return_inverse=True)
+        offsets = asn_codes.astype(np.uint64) << np.uint64(ASN_KEY_SHIFT)
+        match_bounds, match_owners = _flatten(offsets + starts, offsets + stops)
+        return cls(bounds, owners, asns, as_names, asn_keys=asn_keys, match_bounds=match_bounds,
+                   match_owners=match_owners)
+
+    @classmethod
+    def from_backend(cls, backend: StorageBackend, table: str = 'as_ip_ranges') -> 'ASNIndex':
+        """Build the index from a single scan of the AS range table"""
+        fingerprint = table_fingerprint(backend, table)
+        cursor = backend.cursor()
+        cursor.execute(f"SELECT start_ip, end_ip, asn, as_name FROM {table} WHERE start_ip IS NOT NULL AND end_ip IS NOT NULL")
+        rows = cursor.fetchall()
+        cursor.close()
+
+        if not rows:
+            index = cls.from_ranges([], [], [], [])
+        else:
+            start_ips, end_ips, asns, as_names = zip(*rows)
+            asns = ['' if asn is None else asn for asn in asns]
+            as_names = ['' if name is None else name for name in as_names]
+            index = cls.from_ranges(start_ips, end_ips, asns, as_names)
+        index.fingerprint = fingerprint
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> 'ASNIndex':
+        """Load an index previously written with save()"""
+        with np.load(path) as data:
+            fingerprint = str(data['fingerprint']) if 'fingerprint' in data.files else None
+            return cls(data['bounds'], data['owners'], data['asns'], data['as_names'], fingerprint,
+                       data['asn_keys'], data['match_bounds'], data['match_owners'])
+
+    @classmethod
+    def cached(cls, backend: Optional[StorageBackend] = None, path: str = DEFAULT_INDEX_PATH,
+               rebuild: bool = False, table: str = 'as_ip_ranges') -> 'ASNIndex':
+        """
+        Load the index from disk, building and saving it from the database if needed
+
+        With a backend, the saved index is only reused while its fingerprint
+        matches the current table; without one it is trusted as is.
+        """
+        if not rebuild and os.path.exists(path):
+            try:
+                index = cls.load(path)
+            except KeyError:
+                index = None  # Written before the per-ASN segments existed
+            if index is not None and (backend is None or index.fingerprint == table_fingerprint(backend, table)):
+                return index
+        if backend is None:
+            raise FileNotFoundError(f"No ASN index at {path} and no database connection to build one")
+        index = cls.from_backend(backend, table)
+        index.save(path)
+        return index
+
+    def save(self, path: str):
+        """Write the flattened index (and its table fingerprint) to a .npz file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, bounds=self.bounds, owners=self.owners, asns=self.asns, as_names=self.as_names,
+                 fingerprint=np.array(self.fingerprint or ''), asn_keys=self.asn_keys,
+                 match_bounds=self.match_bounds, match_owners=self.match_owners)
+
+    def __len__(self) -> int:
+        return len(self.asns)
+
+    def lookup_owner(self, ips: np.ndarray) -> np.ndarray:
+        """Return the owning range index for every uint32 IP (-1 if unrouted)"""
+        ips = np.asarray(ips, dtype=np.uint32).astype(np.uint64)
+        if self.bounds.size == 0:
+            return np.full(ips.size, -1, dtype=np.int32)
+        segment = np.searchsorted(self.bounds, ips, side='right') - 1
+        return np.where(segment >= 0, self.owners[np.maximum(segment, 0)], -1)
+
+    def lookup(self, ips, missing: str = '') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resolve IPs to ASN and AS name
+
+        Args:
+            ips: uint32 addresses or dotted-quad strings
+            missing: Label used for unrouted or invalid addresses
+
+        Returns:
+            (asns, as_names) as string arrays aligned with the input
+        """
+        ips, valid = _to_uint32(ips)
+        owner = np.where(valid, self.lookup_owner(ips), -1)
+        found = owner >= 0
+
+        asns = np.full(owner.size, missing, dtype=object)
+        as_names = np.full(owner.size, missing, dtype=object)
+        asns[found] = self.asns[owner[found]]
+        as_names[found] = self.as_names[owner[found]]
+        return asns, as_names
+
+    def lookup_matching(self, ips, asns, missing=None) -> np.ndarray:
+        """
+        AS name of the most specific range that covers each IP and has its ASN
+
+        Same rule as joining on the address range AND d.asn = a.asn: an outer
+        range of the recorded ASN still matches when a more specific range of
+        another AS sits inside it.
+
+        Args:
+            ips: uint32 addresses or dotted-quad strings
+            asns: Recorded ASN label per IP
+            missing: Label used where no covering range has the recorded ASN
+
+        Returns:
+            AS names as an object array aligned with the input
+        """
+        ips, valid = _to_uint32(ips)
+        asns = np.asarray(asns, dtype=str)
+        as_names = np.full(ips.size, missing, dtype=object)
+        if self.match_bounds.size == 0:
+            return as_names
+
+        code = np.minimum(np.searchsorted(self.asn_keys, asns), self.asn_keys.size - 1)
+        known = valid & (self.asn_keys[code] == asns)
+        keys = (code.astype(np.uint64) << np.uint64(ASN_KEY_SHIFT)) | ips.astype(np.uint64)
+        segment = np.searchsorted(self.match_bounds, keys, side='right') - 1
+        owner = np.where(known & (segment >= 0), self.match_owners[np.maximum(segment, 0)], -1)
+
+        found = owner >= 0
+        as_names[found] = self.as_names[owner[found]]
+        return as_names
+
+
+def main(argv: Optional[list] = None):
+    """Build the index or annotate a list of IPs"""
+    parser = argparse.ArgumentParser(description="Build or query the in-memory IP -> ASN index")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build the index from the as_ip_ranges table')
+    build.add_argument('--db', help="Storage URL (default: $DNS_DB_URL)")
+    build.add_argument('--output', default=DEFAULT_INDEX_PATH)
+
+    annotate = sub.add_parser('annotate', help='Annotate a file of IPs with ASN and AS name (tab separated)')
+    annotate.add_argument('ip_file')
+    annotate.add_argument('--db', help="Storage URL (default: $DNS_DB_URL)")
+    annotate.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    annotate.add_argument('--output', default='-')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = ASNIndex.from_backend(get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG)))
+        index.save(args.output)
+        print(f"✓ Indexed {len(index):,} AS ranges into {len(index.bounds):,} segments -> {args.output}", file=sys.stderr)
+        return
+
+    # Rebuilds the saved index when as_ip_ranges changed since it was written
+    try:
+        index = ASNIndex.cached(get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG)), args.index)
+    except DatabaseErrors as err:
+        if not os.path.exists(args.index):
+            print(f"✗ No ASN index at {args.index} and no database to build one: {err}", file=sys.stderr)
+            sys.exit(1)
+        print(f"! Could not check {args.index} against as_ip_ranges ({err}); using it as is", file=sys.stderr)
+        index = ASNIndex.load(args.index)
+
+    with open(args.ip_file) as f:
+        ips = [line.strip() for line in f if line.strip()]
+    asns, as_names = index.lookup(ips)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for ip, asn, as_name in zip(ips, asns, as_names):
+            out.write(f"{ip}\t{asn}\t{as_name}\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
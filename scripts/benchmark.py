@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the resolver analyses
+
+Generates synthetic resolver tables with Internet-like skew (Zipf-distributed
+ASes, /8s and /16s within each /8, a ~4% DNSSEC subset as in
+dnssec_resolvers.csv vs dns_resolvers.csv) and times the analysis stages on
+them:
+
+- DNSGiniCalculator.calculate_gini, extract_address_space,
+  analyze_address_space_distribution and analyze_as_distribution
+- gini_resolvers.analyze_resolvers (its in-memory part, analyze_columns)
+- the Hilbert mapping (hilbert.ip_to_xy and density_raster)
+
+Tables are generated directly as the columns the analyses read (uint32 IPs,
+integer-coded ASNs), so sizes up to 100M rows fit in memory. Results are
+written as JSON (with the commit they were measured on) and can be compared
+against an earlier run to spot regressions.
+
+Usage:
+    python3 benchmark.py [--sizes 10000 100000 1000000] [--repeat 3] [--only gini hilbert_raster]
+    python3 benchmark.py --sizes 100000000 --repeat 1 --compare data/benchmarks/<earlier>.json
+
+Requires: pip install numpy pandas
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from gini_coefficient import DNSGiniCalculator
+from gini_resolvers import analyze_columns
+from hilbert import density_raster, ip_to_xy
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'benchmarks')
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DNSSEC_RATIO = 0.04  # 1,209 of 29,719 resolvers in data/db_exports
+AS_COUNT = 60_000
+AS_EXPONENT = 1.2
+PREFIX_EXPONENT = 1.0
+
+# Public unicast /8s (no 0, 10, 127 or 224+)
+PUBLIC_OCTETS = np.array([o for o in range(1, 224) if o not in (10, 127)], dtype=np.uint32)
+
+
+def zipf_choice(rng: np.random.Generator, n: int, support: int, exponent: float) -> np.ndarray:
+    """Draw n ranks in [0, support) with P(rank k) proportional to 1 / (k + 1)^exponent"""
+    cdf = np.cumsum(1.0 / np.arange(1, support + 1) ** exponent)
+    cdf /= cdf[-1]
+    return np.minimum(np.searchsorted(cdf, rng.random(n)), support - 1)
+
+
+def synthetic_columns(n: int, seed: int = 0, dnssec_ratio: float = DNSSEC_RATIO, as_count: int = AS_COUNT) -> Dict:
+    """
+    A synthetic resolver table in the column layout of gini_resolvers.fetch_resolvers()
+
+    The popularity ranks of ASes, /8s and /16s are mapped onto shuffled
+    identifiers so the largest buckets are not simply the lowest numbers.
+    """
+    rng = np.random.default_rng(seed)
+
+    first = rng.permutation(PUBLIC_OCTETS)[zipf_choice(rng, n, len(PUBLIC_OCTETS), PREFIX_EXPONENT)]
+    second = rng.permutation(256).astype(np.uint32)[zipf_choice(rng, n, 256, PREFIX_EXPONENT)]
+    ips = (first << 24) | (second << 16) | rng.integers(0, 1 << 16, n, dtype=np.uint32)
+
+    asn_numbers = rng.choice(400_000, as_count, replace=False) + 1
+    asn_labels = np.array([f"AS{a}" for a in asn_numbers], dtype=object)
+    asn_codes = zipf_choice(rng, n, as_count, AS_EXPONENT).astype(np.int64)
+
+    dnssec_support = (rng.random(n) < dnssec_ratio).astype(np.uint8)
+    dnssec_validated = dnssec_support & (rng.random(n) < 0.5)
+
+    return {
+        'ip': ips,
+        'ip_valid': np.ones(n, dtype=bool),
+        'asn_codes': asn_codes,
+        'asn_labels': asn_labels,
+        'as_names': {label: f"Synthetic Network {label}" for label in asn_labels},
+        'dnssec_support': dnssec_support,
+        'dnssec_validated': dnssec_validated.astype(np.uint8),
+    }
+
+
+def synthetic_frame(columns: Dict) -> pd.DataFrame:
+    """The same table as DNSGiniCalculator.get_resolver_data() returns it from a snapshot"""
+    labels = columns['asn_labels']
+    return pd.DataFrame({
+        'ip_int': columns['ip'],
+        'ip_valid': columns['ip_valid'],
+        'asn': pd.Categorical.from_codes(columns['asn_codes'], categories=labels),
+        'as_name': pd.Categorical.from_codes(columns['asn_codes'],
+                                             categories=[columns['as_names'][label] for label in labels]),
+    })
+
+
+def time_call(func: Callable, repeat: int) -> List[float]:
+    """Wall-clock seconds of repeat calls (their console output is suppressed)"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmarks(columns: Dict, df: pd.DataFrame) -> Dict[str, Callable]:
+    """The timed stages, bound to one synthetic table"""
+    calculator = DNSGiniCalculator()
+    ips = columns['ip']
+    as_counts = np.bincount(columns['asn_codes'])
+
+    return {
+        'calculate_gini': lambda: calculator.calculate_gini(as_counts),
+        'extract_address_space': lambda: calculator.extract_address_space(ips, 16),
+        'analyze_address_space_distribution': lambda: calculator.analyze_address_space_distribution(df, 16),
+        'analyze_as_distribution': lambda: calculator.analyze_as_distribution(df),
+        'analyze_resolvers': lambda: analyze_columns(columns, ('all', 'dnssec')),
+        'hilbert_mapping': lambda: ip_to_xy(ips, 24),
+        'hilbert_raster': lambda: density_raster(ips, 24),
+    }
+
+
+def git_commit() -> str:
+    """The commit being measured (None outside a git checkout)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, repeat: int = 3, seed: int = 0, only=None, dnssec_ratio: float = DNSSEC_RATIO) -> Dict:
+    """Run every (or the selected) benchmark for every table size"""
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': [],
+    }
+
+    for n in sizes:
+        start = time.perf_counter()
+        columns = synthetic_columns(n, seed, dnssec_ratio)
+        df = synthetic_frame(columns)
+        print(f"✓ Generated {n:,} synthetic resolvers in {time.perf_counter() - start:.2f}s")
+
+        for name, func in benchmarks(columns, df).items():
+            if only and name not in only:
+                continue
+            timings = time_call(func, repeat)
+            best = min(timings)
+            report['results'].append({
+                'benchmark': name,
+                'rows': n,
+                'seconds': best,
+                'timings': timings,
+                'rows_per_second': n / best if best > 0 else None,
+            })
+            print(f"  {name:<38} {best * 1000:>10.2f} ms  ({n / best:,.0f} rows/s)")
+
+        del columns, df
+
+    return report
+
+
+def compare(report: Dict, baseline: Dict):
+    """Print the speed ratio of every benchmark against an earlier report"""
+    previous = {(r['benchmark'], r['rows']): r['seconds'] for r in baseline['results']}
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for result in report['results']:
+        before = previous.get((result['benchmark'], result['rows']))
+        if before:
+            ratio = result['seconds'] / before
+            flag = "  ⚠️ slower" if ratio > 1.1 else ""
+            print(f"  {result['benchmark']:<38} {result['rows']:>12,}  {ratio:>6.2f}x{flag}")
+
+
+def main():
+    """Generate synthetic tables, time the analyses and write a JSON report"""
+    parser = argparse.ArgumentParser(description="Benchmark the resolver analyses on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Table sizes (rows)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the fastest is reported")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dnssec-ratio', type=float, default=DNSSEC_RATIO)
+    parser.add_argument('--only', nargs='*', help="Benchmark names to run")
+    parser.add_argument('--output', help="JSON report path (default: data/benchmarks/<commit>_<time>.json)")
+    parser.add_argument('--compare', help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.repeat, args.seed, args.only, args.dnssec_ratio)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(BENCHMARK_DIR, f"{report['commit'] or 'benchmark'}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+N-way resolver cohort comparison
+
+Compares any number of resolver cohorts, each a row predicate such as
+DNSSEC support, validation, membership in an IP list (e.g. the
+dnsvalidator-confirmed resolvers) or a country. All cohorts are counted in
+one grouped pass (gini_resolvers.CohortAggregator), then every cohort gets
+the full inequality report for /8, /16, AS, owner and country and every
+dimension gets a ranking of its largest entities across all cohorts.
+
+Cohort specs:
+    all, dnssec, validated          built-in predicates (gini_resolvers.COHORTS)
+    dnsvalidator                    IPs in data/dns_resolvers_dnsvalidator.csv
+    ips:PATH                        IPs listed in a binary .ips file or a text/CSV file (IP first)
+    country:CC                      geo_location == CC
+    asn:ASN                         asn == ASN
+    rir:NAME                        /8 administered by an RIR (AFRINIC, APNIC, ARIN, LACNIC, RIPE)
+    status:STATUS                   IANA /8 status (ALLOCATED, LEGACY, RESERVED)
+
+Usage:
+    python3 cohorts.py all dnssec validated dnsvalidator country:US [--top 10] [--stream | --cache]
+        [--ips resolvers.ips] [--exclude-bogons] [--output-dir data/db_exports] [--name cohort_comparison] [--format csv json]
+
+Writes <name>_metrics.csv, <name>_rankings.csv and <name>.json.
+
+Requires: pip install numpy pandas
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from gini_resolvers import (COHORTS, DIMENSIONS, METRIC_FIELDS, METRIC_LABELS, aggregate_resolvers,
+                            aggregate_snapshot, print_metrics, stream_resolvers, without_bogons)
+from instrument import add_arguments as add_profile_arguments, from_arguments
+from ipfile import load_ips, open_snapshot
+from ipv4 import top_prefixes
+from registry import RIRS, STATUSES, load_registry
+from snapshot import SnapshotCache
+from storage import DEFAULT_DB_CONFIG, get_backend, resolve_source
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+EXPORT_DIR = os.path.join(DATA_DIR, 'db_exports')
+DNSVALIDATOR_FILE = os.path.join(DATA_DIR, 'dns_resolvers_dnsvalidator.csv')
+
+
+def ip_list_cohort(path: str) -> Callable:
+    """Rows whose IP is listed in a file (ipfile.load_ips: binary .ips, or text/CSV with the IP first)"""
+    listed = np.unique(load_ips(path))
+    return lambda rows: rows['ip_valid'] & np.isin(rows['ip'], listed)
+
+
+def label_cohort(column: str, value: str) -> Callable:
+    """Rows whose label column equals value (works on Categoricals and label arrays)"""
+    if column == 'asn':
+        def predicate(rows):
+            codes = np.asarray(rows['asn_codes'])
+            matches = np.flatnonzero(np.asarray(rows['asn_labels'], dtype=object) == value)
+            return np.isin(codes, matches) if len(matches) else np.zeros(len(codes), dtype=bool)
+        return predicate
+    return lambda rows: np.asarray(rows[column] == value, dtype=bool)
+
+
+def registry_cohort(kind: str, name: str) -> Callable:
+    """Rows whose /8 belongs to an RIR ('rir') or has an IANA status ('status'), by one lookup per row"""
+    table = load_registry()
+    labels, column = (RIRS, table.rir) if kind == 'rir' else (STATUSES, table.status)
+    matches = [i for i, label in enumerate(labels) if label.upper().startswith(name.upper())]
+    if len(matches) != 1:
+        raise ValueError(f"Unknown {kind}: {name} (expected one of {', '.join(labels)})")
+    selected = column == matches[0]
+    return lambda rows: rows['ip_valid'] & selected[rows['ip'] >> 24]
+
+
+# Parameterized cohorts: prefix -> factory taking the text after the colon
+COHORT_FACTORIES: Dict[str, Callable[[str], Callable]] = {
+    'ips': ip_list_cohort,
+    'country': lambda code: label_cohort('geo_location', code),
+    'asn': lambda asn: label_cohort('asn', asn),
+    'rir': lambda name: registry_cohort('rir', name),
+    'status': lambda name: registry_cohort('status', name),
+}
+
+
+def cohort_filters(specs: List[str]) -> Dict[str, Callable]:
+    """Resolve cohort specs (see the module docstring) into named row predicates"""
+    filters = {}
+    for spec in specs:
+        if spec in COHORTS:
+            filters[spec] = COHORTS[spec]
+        elif spec == 'dnsvalidator':
+            filters[spec] = ip_list_cohort(DNSVALIDATOR_FILE)
+        elif ':' in spec and spec.split(':', 1)[0] in COHORT_FACTORIES:
+            prefix, argument = spec.split(':', 1)
+            filters[spec] = COHORT_FACTORIES[prefix](argument)
+        else:
+            raise ValueError(f"Unknown cohort: {spec} (expected one of {sorted(COHORTS)}, dnsvalidator "
+                             f"or {', '.join(p + ':...' for p in COHORT_FACTORIES)})")
+    return filters
+
+
+def rank_entities(aggregator, dim: str, top: int = 10) -> List[Dict]:
+    """
+    Largest entities of one dimension across all cohorts
+
+    The union of every cohort's top entities (partial selection per cohort
+    column) is ranked by its count in the first cohort.
+    """
+    matrix = aggregator.count_matrix(dim)
+    keys = np.arange(len(matrix))
+    candidates = np.unique(np.concatenate([top_prefixes(keys[matrix[:, i] > 0], matrix[matrix[:, i] > 0, i], top)[0]
+                                           for i in range(matrix.shape[1])]))
+    counts = matrix[candidates]
+    order = np.lexsort((candidates, -counts[:, 0]))
+    candidates, counts = candidates[order], counts[order]
+
+    return [{'rank': rank, 'entity': label,
+             'counts': {name: int(count) for name, count in zip(aggregator.names, row)},
+             'shares': {name: float(count / total) if total else 0.0
+                        for name, count, total in zip(aggregator.names, row, aggregator.totals)}}
+            for rank, (label, row) in enumerate(zip(aggregator.entity_labels(dim, candidates), counts), 1)]
+
+
+def compare(aggregator, top: int = 10, dims=DIMENSIONS) -> Dict:
+    """Metrics of every cohort and entity rankings of every dimension"""
+    metrics = aggregator.metrics(dims)
+    reference = int(aggregator.totals[0])
+    return {
+        'cohorts': {name: {'total_resolvers': int(total),
+                           'share_of_first': float(total / reference) if reference else 0.0,
+                           'metrics': metrics[name]}
+                    for name, total in zip(aggregator.names, aggregator.totals)},
+        'rankings': {dim: rank_entities(aggregator, dim, top) for dim in dims},
+    }
+
+
+def print_report(report: Dict):
+    """Print the cohort summary, metric tables and entity rankings"""
+    names = list(report['cohorts'])
+    first = names[0]
+
+    print("=" * 80)
+    print(f"DNS RESOLVER COHORT COMPARISON: {', '.join(names).upper()}")
+    print("=" * 80)
+    print("\n📊 COHORTS")
+    print("-" * 50)
+    print(f"{'Cohort':<25} {'Resolvers':>14} {'% of ' + first:>14}")
+    for name, cohort in report['cohorts'].items():
+        print(f"{name:<25} {cohort['total_resolvers']:>14,} {cohort['share_of_first']:>14.1%}")
+
+    print_metrics({name: cohort['metrics'] for name, cohort in report['cohorts'].items()})
+
+    for dim, ranking in report['rankings'].items():
+        print(f"\n📈 TOP {METRIC_LABELS.get(dim, dim).upper()}")
+        print("-" * 50)
+        print(f"{'Rank':<5} {'Entity':<30}" + "".join(f" {name:>15}" for name in names))
+        print("-" * (36 + 16 * len(names)))
+        for entry in ranking:
+            cells = "".join(f" {entry['counts'][name]:>7,} {entry['shares'][name]:>6.1%}" for name in names)
+            print(f"{entry['rank']:<5} {str(entry['entity'])[:30]:<30}{cells}")
+
+
+def _jsonable(value):
+    """Lorenz arrays and NumPy scalars as plain JSON values"""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.round(6).tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_report(report: Dict, output_dir: str = EXPORT_DIR, name: str = 'cohort_comparison',
+                 formats=('csv', 'json'), source: str = None) -> List[str]:
+    """Write the report as <name>_metrics.csv / <name>_rankings.csv and <name>.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    names = list(report['cohorts'])
+    written = []
+
+    if 'csv' in formats:
+        path = os.path.join(output_dir, f"{name}_metrics.csv")
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cohort', 'total_resolvers', 'dimension'] + [key for key, _, _ in METRIC_FIELDS])
+            for cohort, entry in report['cohorts'].items():
+                for dim, metrics in entry['metrics'].items():
+                    writer.writerow([cohort, entry['total_resolvers'], dim] + [metrics[key] for key, _, _ in METRIC_FIELDS])
+        written.append(path)
+
+        path = os.path.join(output_dir, f"{name}_rankings.csv")
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['dimension', 'rank', 'entity'] + [f"{cohort}_{field}" for cohort in names
+                                                                for field in ('count', 'share')])
+            for dim, ranking in report['rankings'].items():
+                for entry in ranking:
+                    writer.writerow([dim, entry['rank'], entry['entity']] +
+                                    [value for cohort in names
+                                     for value in (entry['counts'][cohort], round(entry['shares'][cohort], 6))])
+        written.append(path)
+
+    if 'json' in formats:
+        path = os.path.join(output_dir, f"{name}.json")
+        with open(path, 'w') as f:
+            json.dump(_jsonable({'generated': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                                 'source': source, **report}), f, indent=2)
+        written.append(path)
+
+    return written
+
+
+def main():
+    """Compare the given cohorts and export the report"""
+    parser = argparse.ArgumentParser(description="Compare any number of resolver cohorts")
+    parser.add_argument('cohorts', nargs='*', default=['all', 'dnssec', 'validated'],
+                        help="Cohort specs: all, dnssec, validated, dnsvalidator, ips:PATH, country:CC, asn:ASN, "
+                             "rir:NAME, status:STATUS")
+    parser.add_argument('--db', help="Storage URL: mysql://..., sqlite:///file.db or parquet:///dir (default: $DNS_DB_URL)")
+    parser.add_argument('--cache', action='store_true', help="Read from the local columnar snapshot (built on first use)")
+    parser.add_argument('--refresh-cache', action='store_true', help="Rebuild the snapshot before analyzing")
+    parser.add_argument('--ips', help="Analyze a binary .ips file (see ipfile.py) instead of the database")
+    parser.add_argument('--stream', action='store_true', help="Stream rows in chunks with bounded memory")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per fetchmany() chunk in --stream mode")
+    parser.add_argument('--exclude-bogons', action='store_true',
+                        help="Drop resolvers in reserved or special-purpose address space from every cohort")
+    parser.add_argument('--top', type=int, default=10, help="Entities per cohort in the rankings")
+    parser.add_argument('--output-dir', default=EXPORT_DIR)
+    parser.add_argument('--name', default='cohort_comparison', help="Export file prefix")
+    parser.add_argument('--format', nargs='*', default=['csv', 'json'], choices=['csv', 'json'],
+                        help="Export formats (none to only print)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    stages = from_arguments(args, 'cohorts')
+
+    filters = cohort_filters(args.cohorts)
+    if args.exclude_bogons:
+        filters = without_bogons(filters)
+    backend = None if args.ips else get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG))
+
+    print(f"🔍 Counting {len(filters)} cohorts in one pass...")
+    if args.ips:
+        aggregator = aggregate_snapshot(open_snapshot(args.ips), filters, stages)
+    elif args.cache or args.refresh_cache:
+        aggregator = aggregate_snapshot(SnapshotCache().get(backend, refresh=args.refresh_cache), filters, stages)
+    elif args.stream:
+        aggregator = stream_resolvers(backend, filters, chunk_size=args.chunk_size, stages=stages)
+    else:
+        cursor = backend.cursor()
+        aggregator = aggregate_resolvers(cursor, filters, stages)
+        cursor.close()
+
+    with stages.stage('compare'):
+        report = compare(aggregator, args.top)
+    print_report(report)
+
+    if args.format:
+        source = args.ips if backend is None else backend.describe()
+        for path in write_report(report, args.output_dir, args.name, args.format, source):
+            print(f"✓ Saved {path}")
+    if backend is not None:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ DB_USER="root"
 DB_NAME="dns_servers"
 TABLE_NAME="dns_resolvers"
 AS_TABLE="as_ip_ranges"
+MYSQL_SOCKET="/var/run/mysqld/mysqld.sock"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+TRACKER_STATE="$SCRIPT_DIR/../data/db_exports/gini_tracker_state.json"
 
 # --- HELPER FUNCTION ---
 majority_vote() {
@@ -15,6 +18,30 @@ majority_vote() {
 echo "Fetching IPs from MySQL database..."
 ip_list=($(sudo mysql -u"$DB_USER" -N -e "SELECT ip FROM $DB_NAME.$TABLE_NAME WHERE ip IS NOT NULL;"))
 
+# --- ASN & AS NAME for all IPs in one pass (in-memory $AS_TABLE index) ---
+echo "Annotating IPs with ASN data..."
+declare -A asn_by_ip as_name_by_ip
+while IFS=$'\t' read -r a_ip a_asn a_name; do
+    asn_by_ip["$a_ip"]="$a_asn"
+    as_name_by_ip["$a_ip"]="$a_name"
+done < <(printf "%s\n" "${ip_list[@]}" | python3 "$SCRIPT_DIR/asn_index.py" annotate /dev/stdin)
+
+# --- DNSSEC PROBE for all IPs concurrently (replaces one dig per IP) ---
+echo "Probing resolvers for DNSSEC support..."
+declare -A dnssec_by_ip validated_by_ip dig_by_ip
+while IFS=$'\t' read -r p_ip p_dnssec p_validated p_dig; do
+    dnssec_by_ip["$p_ip"]="$p_dnssec"
+    validated_by_ip["$p_ip"]="$p_validated"
+    dig_by_ip["$p_ip"]="$p_dig"
+done < <(printf "%s\n" "${ip_list[@]}" | python3 "$SCRIPT_DIR/dnssec_probe.py" - --format tsv)
+
+# --- RESULT WRITER (batched upserts over one connection) ---
+# Rows are also teed into the live Gini tracker (resumes from $TRACKER_STATE)
+exec 3> >(tee >(python3 "$SCRIPT_DIR/gini_tracker.py" --state "$TRACKER_STATE" follow - --every 100) \
+    | sudo --preserve-env=DNS_DB_PASSWORD python3 "$SCRIPT_DIR/result_writer.py" --user "$DB_USER" --database "$DB_NAME" --unix-socket "$MYSQL_SOCKET" \
+    load - --format tsv --table "$TABLE_NAME")
+writer_pid=$!
+printf "ip\tdnssec_support\towner\tgeo_location\tasn\tas_name\tdnssec_validated\tdig_output\n" >&3
 
 # --- PROCESS IP LIST ---
 # while read -r ip; do
@@ -22,13 +49,10 @@ for ip in "${ip_list[@]}"; do
     echo "Processing $ip..."
 
     # --- DNS INFO ---
-    dig_output=$(dig +dnssec @"$ip")
-    dig_output_escaped=$(echo "$dig_output" | sed "s/'/\\\'/g")
+    dig_output="${dig_by_ip[$ip]}"
 
-    supports_dnssec="0"
-    if echo "$dig_output" | grep -q "RRSIG"; then
-        supports_dnssec="1"
-    fi
+    supports_dnssec="${dnssec_by_ip[$ip]:-0}"
+    dnssec_validated="${validated_by_ip[$ip]:-0}"
 
     # --- WHOIS for owner and RIR ---
     whois_output=$(whois "$ip")
@@ -38,15 +62,8 @@ for ip in "${ip_list[@]}"; do
     [ -z "$owner" ] && owner="Unknown"
 
     # --- ASN & AS NAME from local table ---
-    as_info=$(sudo mysql -u"$DB_USER" -N -e "
-        SELECT asn, as_name, start_ip, end_ip
-        FROM $DB_NAME.$AS_TABLE
-        WHERE INET_ATON('$ip') BETWEEN INET_ATON(start_ip) AND INET_ATON(end_ip)
-        LIMIT 1;
-    ")
-
-    asn=$(echo "$as_info" | awk '{print $1}')
-    as_name=$(echo "$as_info" | cut -d'	' -f2 | sed "s/'/''/g")
+    asn="${asn_by_ip[$ip]}"
+    as_name="${as_name_by_ip[$ip]}"
 
     # ASN, IP Range
     [ -z "$asn" ] && asn=$(echo "$whois_output" | grep -i 'origin' | head -n 1 | awk '{print $2}' | xargs)
@@ -62,26 +79,13 @@ for ip in "${ip_list[@]}"; do
 
     geo=$(majority_vote "$geo1" "$geo3")
 
-    # --- ESCAPE FOR SQL ---
-    owner_escaped=$(echo "$owner" | sed "s/'/''/g")
-    geo_escaped=$(echo "$geo" | sed "s/'/''/g")
-    as_name_escaped=$(echo "$as_name" | sed "s/'/''/g")
-
-    # --- INSERT / UPDATE ---
-    sudo mysql -u"$DB_USER" -D "$DB_NAME" -e "
-    INSERT INTO $TABLE_NAME (ip, dns_data, dnssec_support, owner, geo_location, asn, as_name, dnssec_validated)
-    VALUES ('$ip', '$dns_output_escaped', $supports_dnssec, '$owner_escaped', '$geo_escaped', '$asn', '$as_name_escaped', '$dnssec_validated')
-    ON DUPLICATE KEY UPDATE
-        dns_data = VALUES(dns_data),
-        dnssec_support = VALUES(dnssec_support),
-        owner = VALUES(owner),
-        geo_location = VALUES(geo_location),
-        asn = VALUES(asn),
-        as_name = VALUES(as_name),
-        dnssec_validated = VALUES(dnssec_validated);
-    "
-    sudo mysql -u"$DB_USER" -D "$DB_NAME" -e "
-    UPDATE $TABLE_NAME SET dig_output = '$dig_output_escaped', dnssec_support = $supports_dnssec WHERE ip = '$ip'
-    "
+    # --- INSERT / UPDATE (one merged upsert row per IP) ---
+    printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n" \
+        "$ip" "$supports_dnssec" "$owner" "$geo" "$asn" "$as_name" "$dnssec_validated" "$dig_output" \
+        | tr -d '\r' >&3
 
 done # < "$INPUT_FILE"
+
+# Flush the remaining rows and wait for the writer to finish
+exec 3>&-
+wait "$writer_pid"
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Asyncio DNSSEC prober
+
+Replacement for the serial `dig +dnssec @ip` loop in dns_scan.sh. Sends raw
+UDP DNS queries with the EDNS0 DO bit set to many resolvers concurrently from
+a single socket, and checks each response for RRSIG records and the AD flag.
+
+Concurrency is bounded by a fixed number of in-flight queries, every target
+gets a timeout and a number of retries, and a global token bucket caps the
+query rate. Results are written with the dns_resolvers column names
+(ip, dnssec_support, dnssec_validated, dig_output). Send errors are reported
+per target instead of surfacing as timeouts.
+
+A datagram only counts as the answer if it comes from the target, carries the
+query's txid, has QR set and echoes the question; anything else is ignored
+and counted. Truncated (TC) answers are retried over TCP like dig does, and
+flagged as truncated in dig_output if that fails too.
+
+test_dnssec_probe.py runs the prober against a local stand-in responder.
+
+Usage:
+    python3 dnssec_probe.py IP_FILE [--output results.csv] [--format csv|jsonl|tsv]
+                            [--in-flight 2000] [--rate 5000] [--timeout 2] [--retries 2]
+
+Requires: Python 3.8+ (standard library only)
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import random
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Columns written for every target, matching the dns_resolvers table
+RESULT_COLUMNS = ['ip', 'dnssec_support', 'dnssec_validated', 'dig_output']
+
+TYPE_NS = 2
+TYPE_OPT = 41
+TYPE_RRSIG = 46
+TYPE_NAMES = {1: 'A', 2: 'NS', 5: 'CNAME', 6: 'SOA', 15: 'MX', 16: 'TXT', 28: 'AAAA',
+              41: 'OPT', 43: 'DS', 46: 'RRSIG', 47: 'NSEC', 48: 'DNSKEY', 50: 'NSEC3'}
+RCODE_NAMES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+FLAG_AD = 0x0020
+FLAG_CD = 0x0010
+EDNS_DO = 0x8000
+
+
+def encode_name(name: str) -> bytes:
+    """Encode a domain name in DNS wire format"""
+    labels = [label for label in name.strip('.').split('.') if label]
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in labels) + b'\x00'
+
+
+def encode_question(qname: str = '.', qtype: int = TYPE_NS) -> bytes:
+    """Encode the question section (name, type, class IN)"""
+    return encode_name(qname) + struct.pack('!HH', qtype, 1)
+
+
+def build_query(txid: int, qname: str = '.', qtype: int = TYPE_NS, payload_size: int = 4096) -> bytes:
+    """Build a recursive query with an EDNS0 OPT record that has the DO bit set"""
+    header = struct.pack('!HHHHHH', txid, FLAG_RD, 1, 0, 0, 1)
+    opt = b'\x00' + struct.pack('!HHIH', TYPE_OPT, payload_size, EDNS_DO, 0)
+    return header + encode_question(qname, qtype) + opt
+
+
+def answers(data: bytes, txid: int, question: bytes) -> bool:
+    """Whether a message is a response (QR set) to query txid that echoes its question"""
+    if len(data) < 12 + len(question):
+        return False
+    response_txid, flags, qdcount = struct.unpack('!HHH', data[:6])
+    return (response_txid == txid and bool(flags & FLAG_QR) and qdcount == 1
+            and data[12:12 + len(question)].lower() == question.lower())
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    """Return the offset just past a (possibly compressed) name"""
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated name")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def parse_response(data: bytes) -> Dict:
+    """
+    Parse the parts of a DNS response needed for DNSSEC detection
+
+    Returns:
+        Dict with txid, rcode, flags, section counts, RR types per section and
+        whether any RRSIG record was present
+
+    Raises:
+        ValueError: If the message is malformed
+    """
+    if len(data) < 12:
+        raise ValueError("Short DNS message")
+    txid, flags, qdcount, ancount, nscount, arcount = struct.unpack('!HHHHHH', data[:12])
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+
+    sections = {'answer': [], 'authority': [], 'additional': []}
+    for section, count in zip(sections, (ancount, nscount, arcount)):
+        for _ in range(count):
+            offset = _skip_name(data, offset)
+            if offset + 10 > len(data):
+                raise ValueError("Truncated resource record")
+            rtype, _, _, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+            offset += 10 + rdlength
+            if offset > len(data):
+                raise ValueError("Truncated resource data")
+            sections[section].append(rtype)
+
+    return {
+        'txid': txid,
+        'rcode': flags & 0x000F,
+        'flags': flags,
+        'counts': (qdcount, ancount, nscount, arcount),
+        'sections': sections,
+        'has_rrsig': any(TYPE_RRSIG in types for types in sections.values()),
+        'ad': bool(flags & FLAG_AD),
+    }
+
+
+def summarize(response: Dict) -> str:
+    """Single-line, dig-style summary of a parsed response for the dig_output column"""
+    flag_names = [name for name, bit in (('qr', FLAG_QR), ('aa', FLAG_AA), ('tc', FLAG_TC), ('rd', FLAG_RD),
+                                         ('ra', FLAG_RA), ('ad', FLAG_AD), ('cd', FLAG_CD)) if response['flags'] & bit]
+    qd, an, ns, ar = response['counts']
+    types = {section: ','.join(TYPE_NAMES.get(t, str(t)) for t in rtypes)
+             for section, rtypes in response['sections'].items()}
+    return (f";; status: {RCODE_NAMES.get(response['rcode'], response['rcode'])}, "
+            f"flags: {' '.join(flag_names)}; QUERY: {qd}, ANSWER: {an}, AUTHORITY: {ns}, ADDITIONAL: {ar}; "
+            f"answer: {types['answer']}; authority: {types['authority']}; additional: {types['additional']}")
+
+
+def canonical_ipv4(ip: str) -> Optional[str]:
+    """
+    Dotted quad without leading zeros, or None if ip is not an IPv4 address
+
+    Octets are read as decimal like ipv4.parse_ipv4() does, so "010.001.002.003"
+    is 10.1.2.3 (the socket layer would read it as octal), and replies, which
+    carry the canonical source address, match their query.
+    """
+    parts = ip.strip().split('.')
+    if len(parts) != 4 or not all(part.isascii() and part.isdigit() and len(part) <= 3 for part in parts):
+        return None
+    octets = [int(part) for part in parts]
+    if max(octets) > 255:
+        return None
+    return '.'.join(map(str, octets))
+
+
+class RateLimiter:
+    """Global token bucket shared by all workers"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until one query may be sent"""
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    """Dispatch responses on the shared socket to the waiting query by (address, port, txid)"""
+
+    def __init__(self, question: bytes):
+        self.transport = None
+        self.question = question
+        self.pending: Dict[Tuple[str, int, int], asyncio.Future] = {}
+        self.sending: Optional[Tuple[str, int, int]] = None
+        self.errors: List[OSError] = []
+        self.ignored = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        txid = struct.unpack('!H', data[:2])[0]
+        key = (addr[0], addr[1], txid)
+        # Stray or spoofed packets (QR clear, other question) leave the query waiting
+        if key not in self.pending or not answers(data, txid, self.question):
+            self.ignored += 1
+            return
+        future = self.pending.pop(key)
+        if not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc):
+        # Errors raised by sendto() arrive while that query is being sent; anything
+        # later (ICMP errors, failed buffered sends) carries no address to match
+        future = self.pending.pop(self.sending, None) if self.sending else None
+        if future is not None and not future.done():
+            future.set_exception(exc)
+        else:
+            self.errors.append(exc)
+
+
+class DNSSECProber:
+    """Probe many resolvers concurrently for DNSSEC support"""
+
+    def __init__(self, in_flight: int = 2000, rate: float = 5000, timeout: float = 2.0, retries: int = 2,
+                 port: int = 53, qname: str = '.', qtype: int = TYPE_NS):
+        """
+        Args:
+            in_flight: Maximum number of outstanding queries
+            rate: Global query rate limit in queries per second (0 = unlimited)
+            timeout: Seconds to wait for each attempt
+            retries: Extra attempts after the first timeout
+            port: Destination port (53, or a local stand-in responder)
+            qname: Query name, "." matches `dig +dnssec @ip`
+            qtype: Query type, NS by default
+        """
+        self.in_flight = in_flight
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.port = port
+        self.qname = qname
+        self.qtype = qtype
+        self.question = encode_question(qname, qtype)
+        self.socket_errors: List[OSError] = []
+        self.ignored_responses = 0
+
+    async def _query(self, protocol: _ProbeProtocol, limiter: RateLimiter, ip: str) -> Optional[bytes]:
+        """
+        Send one query with retries and return the raw response, or None on timeout
+
+        Raises:
+            OSError: If the query could not be sent
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retries + 1):
+            txid = random.getrandbits(16)
+            while (ip, self.port, txid) in protocol.pending:
+                txid = random.getrandbits(16)
+            key = (ip, self.port, txid)
+            future = loop.create_future()
+            protocol.pending[key] = future
+
+            await limiter.acquire()
+            protocol.sending = key
+            try:
+                protocol.transport.sendto(build_query(txid, self.qname, self.qtype), (ip, self.port))
+            finally:
+                protocol.sending = None
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                protocol.pending.pop(key, None)
+        return None
+
+    async def _query_tcp(self, limiter: RateLimiter, ip: str) -> bytes:
+        """
+        Repeat a query over TCP (after a truncated UDP answer) and return the response
+
+        Raises:
+            OSError, EOFError, asyncio.TimeoutError: If the exchange fails
+            ValueError: If the response does not answer the query
+        """
+        txid = random.getrandbits(16)
+        query = build_query(txid, self.qname, self.qtype)
+
+        async def exchange():
+            reader, writer = await asyncio.open_connection(ip, self.port)
+            try:
+                writer.write(struct.pack('!H', len(query)) + query)
+                await writer.drain()
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+                return await reader.readexactly(length)
+            finally:
+                writer.close()
+
+        await limiter.acquire()
+        data = await asyncio.wait_for(exchange(), self.timeout)
+        if not answers(data, txid, self.question):
+            raise ValueError("TCP response does not answer the query")
+        return data
+
+    async def probe(self, protocol: _ProbeProtocol, limiter: RateLimiter, ip: str) -> Dict:
+        """Probe a single resolver and return its result row"""
+        target = canonical_ipv4(ip)
+        if target is None:
+            return {'ip': ip, 'dnssec_support': 0, 'dnssec_validated': 0, 'dig_output': ";; error: not an IPv4 address"}
+        try:
+            data = await self._query(protocol, limiter, target)
+        except OSError as e:
+            return {'ip': ip, 'dnssec_support': 0, 'dnssec_validated': 0, 'dig_output': f";; error: {e}"}
+
+        if data is None:
+            return {'ip': ip, 'dnssec_support': 0, 'dnssec_validated': 0,
+                    'dig_output': ";; connection timed out; no servers could be reached"}
+        try:
+            response = parse_response(data)
+        except ValueError as e:
+            return {'ip': ip, 'dnssec_support': 0, 'dnssec_validated': 0, 'dig_output': f";; malformed response: {e}"}
+
+        note = ''
+        if response['flags'] & FLAG_TC:
+            # Large DNSSEC answers do not fit into UDP; the truncated one may lack the RRSIGs
+            try:
+                response = parse_response(await self._query_tcp(limiter, target))
+                note = ";; Truncated, retried in TCP mode. "
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+                note = f";; truncated, TCP retry failed: {str(e) or type(e).__name__}. "
+
+        return {
+            'ip': ip,
+            'dnssec_support': int(response['has_rrsig']),
+            'dnssec_validated': int(response['ad']),
+            'dig_output': note + summarize(response),
+        }
+
+    async def run(self, ips: Iterable[str], on_result: Callable[[Dict], None]):
+        """
+        Probe every IP, calling on_result(row) as each one finishes
+
+        Targets are pulled lazily by a fixed pool of workers, so memory stays
+        bounded by the in-flight limit regardless of the number of IPs.
+        """
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(lambda: _ProbeProtocol(self.question),
+                                                                  local_addr=('0.0.0.0', 0))
+        limiter = RateLimiter(self.rate, burst=max(1, int(self.rate // 100)) if self.rate else 1)
+        targets = iter(ips)
+
+        async def worker():
+            for ip in targets:
+                on_result(await self.probe(protocol, limiter, ip))
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.in_flight)))
+        finally:
+            transport.close()
+            self.socket_errors = protocol.errors
+            self.ignored_responses = protocol.ignored
+
+    def scan(self, ips: Iterable[str]) -> List[Dict]:
+        """Synchronous helper returning all result rows"""
+        results = []
+        asyncio.run(self.run(ips, results.append))
+        return results
+
+
+def _read_ips(path: str) -> Iterable[str]:
+    """Yield one IP per non-empty line"""
+    with (sys.stdin if path == '-' else open(path)) as f:
+        for line in f:
+            ip = line.strip()
+            if ip:
+                yield ip
+
+
+def main():
+    """Main function with command line configuration"""
+    parser = argparse.ArgumentParser(description="Probe DNS resolvers for DNSSEC support (RRSIG / AD flag)")
+    parser.add_argument('ip_file', help="File with one IP per line ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="Output file ('-' for stdout)")
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'tsv'], default='csv')
+    parser.add_argument('--in-flight', type=int, default=2000, help="Maximum outstanding queries")
+    parser.add_argument('--rate', type=float, default=5000, help="Global queries per second (0 = unlimited)")
+    parser.add_argument('--timeout', type=float, default=2.0, help="Seconds per attempt")
+    parser.add_argument('--retries', type=int, default=2, help="Retries after a timeout")
+    parser.add_argument('--port', type=int, default=53)
+    parser.add_argument('--qname', default='.')
+    args = parser.parse_args()
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    if args.format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        write = writer.writerow
+    elif args.format == 'jsonl':
+        def write(row):
+            out.write(json.dumps(row) + '\n')
+    else:
+        def write(row):
+            out.write('\t'.join(str(row[column]) for column in RESULT_COLUMNS) + '\n')
+
+    counts = {'total': 0, 'dnssec': 0}
+
+    def on_result(row):
+        counts['total'] += 1
+        counts['dnssec'] += row['dnssec_support']
+        write(row)
+
+    prober = DNSSECProber(in_flight=args.in_flight, rate=args.rate, timeout=args.timeout,
+                          retries=args.retries, port=args.port, qname=args.qname)
+    start = time.monotonic()
+    try:
+        asyncio.run(prober.run(_read_ips(args.ip_file), on_result))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - start
+    print(f"✓ Probed {counts['total']:,} resolvers in {elapsed:.1f}s "
+          f"({counts['dnssec']:,} with RRSIG)", file=sys.stderr)
+    if prober.socket_errors:
+        print(f"! {len(prober.socket_errors):,} socket errors could not be matched to a resolver "
+              f"(first: {prober.socket_errors[0]})", file=sys.stderr)
+    if prober.ignored_responses:
+        print(f"! Ignored {prober.ignored_responses:,} datagrams that did not answer a pending query",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Vectorized Gini coefficient engine
+
+Shared by gini_coefficient.py and gini_resolvers.py. Accepts NumPy arrays,
+pandas Series or plain lists of counts and computes the Gini coefficient with
+a vectorized sort and weighted cumulative sums instead of Python-level loops.
+
+Several distributions (e.g. /8, /16 and AS) can be evaluated in one call with
+gini_many(), which sorts all of them together in a single lexsort, and many
+resampled versions of one distribution with gini_rows() (one row each).
+
+metrics_many() uses the same single sort to derive a full inequality report
+per distribution: Gini, HHI, Theil index, top-1/5/10 shares, the Nakamoto
+coefficient (entities needed to reach 50%) and Lorenz curve points.
+
+Requires: pip install numpy
+"""
+
+import numpy as np
+from typing import Dict, Mapping, Optional, Sequence, Union
+
+ArrayLike = Union[np.ndarray, Sequence[int]]
+
+
+def _as_counts(values) -> np.ndarray:
+    """Convert a list/array/Series of counts to a 1-D float64 array of positive values"""
+    if values is None:
+        return np.empty(0, dtype=np.float64)
+    arr = np.asarray(getattr(values, 'values', values), dtype=np.float64).ravel()
+    return arr[arr > 0]
+
+
+def gini(values: ArrayLike) -> float:
+    """
+    Calculate Gini coefficient for a distribution of counts
+
+    Zero (empty) buckets are ignored, matching the original implementation.
+
+    Args:
+        values: Counts per entity (list, NumPy array or pandas Series)
+
+    Returns:
+        Gini coefficient (0 = perfect equality, 1 = maximum inequality)
+    """
+    counts = np.sort(_as_counts(values))
+    n = counts.size
+    if n <= 1:
+        return 0.0
+
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+
+    ranks = np.arange(1, n + 1, dtype=np.float64)
+    weighted_sum = np.dot(ranks, counts)
+    result = (2 * weighted_sum) / (n * total) - (n + 1) / n
+
+    return float(min(1.0, max(0.0, result)))  # Clamp between 0 and 1
+
+
+def gini_many(distributions: Mapping[str, ArrayLike]) -> Dict[str, float]:
+    """
+    Calculate Gini coefficients for several distributions at once
+
+    All distributions are concatenated and sorted together with a single
+    lexsort (by distribution, then by value), so the per-distribution ranks and
+    weighted sums fall out of one vectorized pass.
+
+    Args:
+        distributions: Mapping of name -> counts, e.g. {'/8': ..., '/16': ..., 'AS': ...}
+
+    Returns:
+        Mapping of name -> Gini coefficient
+    """
+    names = list(distributions)
+    if not names:
+        return {}
+
+    arrays = [_as_counts(distributions[name]) for name in names]
+    sizes = np.array([a.size for a in arrays], dtype=np.int64)
+    if sizes.sum() == 0:
+        return {name: 0.0 for name in names}
+
+    values = np.concatenate(arrays)
+    groups = np.repeat(np.arange(len(names)), sizes)
+
+    order = np.lexsort((values, groups))
+    values = values[order]
+    groups = groups[order]
+
+    # Rank of each value inside its own distribution (1-based)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    ranks = np.arange(values.size, dtype=np.float64) - starts[groups] + 1
+
+    totals = np.bincount(groups, weights=values, minlength=len(names))
+    weighted = np.bincount(groups, weights=ranks * values, minlength=len(names))
+
+    results = {}
+    for i, name in enumerate(names):
+        n = sizes[i]
+        if n <= 1 or totals[i] == 0:
+            results[name] = 0.0
+            continue
+        result = (2 * weighted[i]) / (n * totals[i]) - (n + 1) / n
+        results[name] = float(min(1.0, max(0.0, result)))
+
+    return results
+
+
+def gini_rows(matrix) -> np.ndarray:
+    """
+    Calculate the Gini coefficient of every row of a 2-D array of counts
+
+    Used for bootstrap and permutation resamples, which share one set of
+    buckets. Empty buckets are ignored per row, like gini().
+
+    Args:
+        matrix: Array of shape (rows, buckets)
+
+    Returns:
+        Array of Gini coefficients, one per row
+    """
+    values = np.sort(np.asarray(matrix, dtype=np.float64), axis=1)
+    width = values.shape[1]
+    n = (values > 0).sum(axis=1)
+    total = values.sum(axis=1)
+
+    # Zeros sort first, so the non-empty buckets of each row are ranked 1..n
+    ranks = np.arange(1, width + 1, dtype=np.float64) - (width - n)[:, None]
+    weighted = (ranks * values).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = (2 * weighted) / (n * total) - (n + 1) / n
+    result[(n <= 1) | (total == 0)] = 0.0
+    return np.clip(result, 0.0, 1.0)
+
+
+def metrics_many(distributions: Mapping[str, ArrayLike], top=(1, 5, 10), threshold: float = 0.5,
+                 lorenz_points: Optional[int] = 101) -> Dict[str, Dict]:
+    """
+    Calculate inequality metrics for several distributions from one lexsort
+
+    Args:
+        distributions: Mapping of name -> counts
+        top: Entity counts k for the top-k shares
+        threshold: Share the Nakamoto coefficient counts entities up to
+        lorenz_points: Lorenz curve points per distribution (None keeps one per entity)
+
+    Returns:
+        Mapping of name -> {'entities', 'total', 'gini', 'hhi', 'theil',
+        'top_<k>_share', 'nakamoto', 'lorenz': (x, y)}; empty buckets are ignored
+    """
+    names = list(distributions)
+    arrays = [_as_counts(distributions[name]) for name in names]
+    sizes = np.array([a.size for a in arrays], dtype=np.int64)
+    values = np.concatenate(arrays) if arrays else np.empty(0)
+    groups = np.repeat(np.arange(len(names)), sizes)
+
+    order = np.lexsort((values, groups))
+    values = values[order]
+    groups = groups[order]
+
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    ends = starts + sizes
+    position = np.arange(values.size, dtype=np.int64)
+    ranks = (position - starts[groups] + 1).astype(np.float64)  # 1 = smallest
+    descending = ends[groups] - position                         # 1 = largest
+
+    n = sizes.astype(np.float64)
+    totals = np.bincount(groups, weights=values, minlength=len(names))
+    weighted = np.bincount(groups, weights=ranks * values, minlength=len(names))
+
+    # Per-entity shares for HHI and Theil
+    shares = values / totals[groups] if values.size else values
+    hhi = np.bincount(groups, weights=shares ** 2, minlength=len(names))
+    theil = np.bincount(groups, weights=shares * np.log(shares * n[groups]), minlength=len(names)) if values.size \
+        else np.zeros(len(names))
+
+    top_shares = {k: np.bincount(groups, weights=values * (descending <= k), minlength=len(names)) for k in top}
+
+    # Entities (largest first) needed to reach the threshold: 1 + those whose top-r sum stays below it
+    cumulative = np.cumsum(values) - np.concatenate(([0.0], np.cumsum(values)))[starts[groups]]
+    top_sum = totals[groups] - cumulative + values
+    nakamoto = np.bincount(groups, weights=top_sum < threshold * totals[groups], minlength=len(names))
+
+    results = {}
+    for i, name in enumerate(names):
+        if sizes[i] == 0 or totals[i] == 0:
+            results[name] = {'entities': 0, 'total': 0, 'gini': 0.0, 'hhi': 0.0, 'theil': 0.0,
+                             **{f"top_{k}_share": 0.0 for k in top}, 'nakamoto': 0,
+                             'lorenz': (np.array([0.0, 1.0]), np.array([0.0, 1.0]))}
+            continue
+
+        gini_value = (2 * weighted[i]) / (n[i] * totals[i]) - (n[i] + 1) / n[i] if sizes[i] > 1 else 0.0
+        x = np.arange(sizes[i] + 1) / n[i]
+        y = np.concatenate(([0.0], cumulative[starts[i]:ends[i]] / totals[i]))
+        if lorenz_points is not None and len(x) > lorenz_points:
+            grid = np.linspace(0.0, 1.0, lorenz_points)
+            x, y = grid, np.interp(grid, x, y)
+
+        results[name] = {
+            'entities': int(sizes[i]),
+            'total': int(totals[i]),
+            'gini': float(min(1.0, max(0.0, gini_value))),
+            'hhi': float(hhi[i]),
+            'theil': float(max(0.0, theil[i])),
+            **{f"top_{k}_share": float(top_shares[k][i] / totals[i]) for k in top},
+            'nakamoto': int(nakamoto[i]) + 1,
+            'lorenz': (x, y),
+        }
+
+    return results
+
+
+def inequality_metrics(values: ArrayLike, **kwargs) -> Dict:
+    """Inequality metrics of a single distribution (see metrics_many())"""
+    return metrics_many({'values': values}, **kwargs)['values']
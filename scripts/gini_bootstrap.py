@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Bootstrap confidence intervals and permutation tests for Gini coefficients
+
+Resamples are drawn directly over bucket counts instead of over resolver
+rows: a bootstrap resample of N resolvers spread over K buckets is one
+multinomial(N, counts / N) draw, and a random subset of n of them (the null
+model for "the DNSSEC resolvers are just a random sample of all resolvers")
+is one multivariate hypergeometric draw. The cost therefore depends on the
+number of buckets, not on the number of IPs. Because a cohort is nested in
+the population, their Gini difference is bootstrapped jointly: one
+multinomial draw over (bucket, in cohort or not) cells yields both.
+
+Batches of resamples are spread over a process pool and evaluated with the
+row-wise Gini engine (gini.gini_rows).
+
+The Gini coefficient over non-empty buckets is biased in resamples of sparse
+distributions (buckets with one or two resolvers vanish, which inflates the
+inequality), so intervals are shifted by the bootstrap bias estimate.
+
+Usage (library):
+    intervals = bootstrap_intervals({'/8': counts_8, 'AS': as_counts}, n_resamples=10000)
+    comparison = compare_cohorts(aggregator.distributions(), n_resamples=10000)
+
+Requires: pip install numpy
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from gini import gini, gini_rows
+
+MAX_BATCH_CELLS = 1 << 24  # Resample matrix entries per task (128 MiB of int64)
+
+
+def _seed_sequence(seed) -> np.random.SeedSequence:
+    """A SeedSequence from an int, None or an already spawned SeedSequence"""
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def _resample_batch(kind: str, counts: np.ndarray, draws: int, size: int, seed) -> np.ndarray:
+    """Gini coefficients of one batch of multinomial or hypergeometric resamples (runs in workers)"""
+    rng = np.random.default_rng(seed)
+    if kind == 'joint':
+        # counts is (sample, rest of the population) per bucket; resample both from one draw
+        cells = counts.ravel()
+        matrix = rng.multinomial(draws, cells / cells.sum(), size=size).reshape(size, 2, -1)
+        return gini_rows(matrix[:, 0]) - gini_rows(matrix.sum(axis=1))
+    if kind == 'bootstrap':
+        matrix = rng.multinomial(draws, counts / counts.sum(), size=size)
+    else:
+        matrix = rng.multivariate_hypergeometric(counts, draws, size=size)
+    return gini_rows(matrix)
+
+
+def _resample(kind: str, counts, draws: int, n_resamples: int, seed=None, workers: Optional[int] = None,
+              pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+    """Gini coefficients of n_resamples resamples, computed in batches across a process pool"""
+    counts = np.asarray(counts, dtype=np.int64)
+    counts = counts[..., counts.reshape(-1, counts.shape[-1]).sum(axis=0) > 0]
+    if counts.shape[-1] <= 1 or n_resamples <= 0:
+        return np.zeros(max(n_resamples, 0))
+
+    batch = max(1, min(n_resamples, MAX_BATCH_CELLS // counts.size))
+    sizes = [min(batch, n_resamples - start) for start in range(0, n_resamples, batch)]
+    seeds = _seed_sequence(seed).spawn(len(sizes))
+
+    if pool is None and len(sizes) == 1:
+        return _resample_batch(kind, counts, draws, sizes[0], seeds[0])
+
+    executor = pool or ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_resample_batch, kind, counts, draws, size, s) for size, s in zip(sizes, seeds)]
+        return np.concatenate([future.result() for future in futures])
+    finally:
+        if pool is None:
+            executor.shutdown()
+
+
+def bootstrap_gini(counts, n_resamples: int = 10000, seed=None, workers: Optional[int] = None,
+                   pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+    """Gini coefficients of bootstrap resamples (same number of resolvers, drawn with replacement)"""
+    counts = np.asarray(counts, dtype=np.int64)
+    return _resample('bootstrap', counts, int(counts.sum()), n_resamples, seed, workers, pool)
+
+
+def subsample_gini(population_counts, sample_size: int, n_resamples: int = 10000, seed=None,
+                   workers: Optional[int] = None, pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+    """Gini coefficients of random subsets of sample_size resolvers drawn without replacement"""
+    return _resample('permutation', population_counts, int(sample_size), n_resamples, seed, workers, pool)
+
+
+def bootstrap_difference(population_counts, sample_counts, n_resamples: int = 10000, seed=None,
+                         workers: Optional[int] = None, pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+    """
+    Gini(sample) - Gini(population) of joint bootstrap resamples, for a sample nested in the population
+
+    Resolvers are drawn with replacement from the population and keep their
+    sample membership, so both Gini coefficients come from the same resample
+    and the difference reflects their correlation.
+    """
+    population_counts = np.asarray(population_counts, dtype=np.int64)
+    sample_counts = np.asarray(sample_counts, dtype=np.int64)
+    cells = np.stack((sample_counts, population_counts - sample_counts))
+    return _resample('joint', cells, int(population_counts.sum()), n_resamples, seed, workers, pool)
+
+
+def percentile_interval(samples: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    """Percentile confidence interval of resampled values"""
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(samples, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def bias_corrected_interval(samples: np.ndarray, observed: float, confidence: float = 0.95) -> Tuple[float, float]:
+    """Percentile interval shifted by the bootstrap bias (mean of the resamples - observed value)"""
+    return percentile_interval(samples - (samples.mean() - observed), confidence)
+
+
+def aligned_counts(population: Tuple[np.ndarray, np.ndarray], sample: Tuple[np.ndarray, np.ndarray]):
+    """Population and sample counts over the population's buckets ((keys, counts) pairs, keys sorted)"""
+    population_keys, population_counts = population
+    sample_keys, sample_counts = sample
+    aligned = np.zeros(len(population_keys), dtype=np.int64)
+    aligned[np.searchsorted(population_keys, sample_keys)] = sample_counts
+    return np.asarray(population_counts, dtype=np.int64), aligned
+
+
+def bootstrap_intervals(distributions: Mapping[str, np.ndarray], n_resamples: int = 10000,
+                        confidence: float = 0.95, seed=None, workers: Optional[int] = None) -> Dict[str, Tuple[float, float]]:
+    """Bootstrap confidence interval of the Gini coefficient of every distribution"""
+    seeds = _seed_sequence(seed).spawn(len(distributions))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return {name: bias_corrected_interval(bootstrap_gini(counts, n_resamples, s, pool=pool), gini(counts),
+                                              confidence)
+                for (name, counts), s in zip(distributions.items(), seeds)}
+
+
+def compare_cohorts(distributions: Mapping[str, Mapping[str, Tuple[np.ndarray, np.ndarray]]],
+                    population: str = 'all', sample: str = 'dnssec', n_resamples: int = 10000,
+                    confidence: float = 0.95, seed=None, workers: Optional[int] = None,
+                    dims=('8', '16', 'as')) -> Dict[str, Dict]:
+    """
+    Confidence intervals and a permutation test for a cohort vs the population it is drawn from
+
+    Args:
+        distributions: CohortAggregator.distributions() output,
+            {cohort: {'8' | '16' | 'as': (keys, counts)}}
+        population: Cohort containing the sample (e.g. 'all')
+        sample: Cohort to test (e.g. 'dnssec')
+        dims: Distributions to compare
+
+    Returns:
+        Per distribution: both Gini coefficients with bootstrap intervals, the
+        difference with its interval from a joint bootstrap of the nested pair, the Gini range expected of a random
+        subset of the same size and the two-sided permutation p-value.
+    """
+    seeds = _seed_sequence(seed).spawn(4 * len(dims))
+    report = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, dim in enumerate(dims):
+            population_counts, sample_counts = aligned_counts(distributions[population][dim],
+                                                              distributions[sample][dim])
+            observed = {population: gini(population_counts), sample: gini(sample_counts)}
+
+            boot_population = bootstrap_gini(population_counts, n_resamples, seeds[4 * i], pool=pool)
+            boot_sample = bootstrap_gini(sample_counts, n_resamples, seeds[4 * i + 1], pool=pool)
+            boot_difference = bootstrap_difference(population_counts, sample_counts, n_resamples, seeds[4 * i + 2],
+                                                   pool=pool)
+            null = subsample_gini(population_counts, sample_counts.sum(), n_resamples, seeds[4 * i + 3], pool=pool)
+
+            # Two-sided: how often a random subset is at least as far from the expected subset Gini
+            expected = float(null.mean())
+            extreme = np.abs(null - expected) >= abs(observed[sample] - expected)
+            p_value = (1 + int(extreme.sum())) / (1 + len(null))
+
+            difference = observed[sample] - observed[population]
+            report[dim] = {
+                population: {'gini': observed[population],
+                             'interval': bias_corrected_interval(boot_population, observed[population], confidence)},
+                sample: {'gini': observed[sample],
+                         'interval': bias_corrected_interval(boot_sample, observed[sample], confidence)},
+                'difference': {'gini': difference,
+                               'interval': bias_corrected_interval(boot_difference, difference, confidence)},
+                'random_subset': {'gini': expected, 'interval': percentile_interval(null, confidence)},
+                'p_value': p_value,
+                'confidence': confidence,
+                'resamples': n_resamples,
+            }
+
+    return report
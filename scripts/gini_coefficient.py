@@ -7,41 +7,142 @@ This script calculates Gini coefficients for DNS resolver distributions across:
 - /16 address spaces (Class B networks)
 - AS (Autonomous System) ownership
 
+Plots can be rendered headless (--batch) from the distributions the analysis
+already computed, as PNG/SVG/PDF files drawn concurrently in worker processes.
+
 Requires: pip install mysql-connector-python pandas numpy matplotlib
 """
 
-import mysql.connector
+import argparse
+import os
 import pandas as pd
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import sys
 from typing import List, Tuple, Dict
 
+from gini import gini as vectorized_gini, gini_many, inequality_metrics
+from gini_bootstrap import bootstrap_intervals
+from ipv4 import parse_ipv4, prefix_keys, count_keys, top_prefixes, format_prefix, prefix_hierarchy
+from gini_resolvers import stream_resolvers, without_bogons
+from instrument import NO_STAGES, Stages, add_arguments as add_profile_arguments, from_arguments
+from ipfile import open_snapshot
+from registry import load_registry
+from snapshot import SnapshotCache
+from storage import DEFAULT_DB_CONFIG, DatabaseErrors, get_backend, resolve_source
+
+# Panels of the distribution figure: (distribution key, title, x label); None draws the /8 Lorenz curve
+DISTRIBUTION_PANELS = {
+    'prefix_8': ('/8', '/8 Address Space Distribution (Top 20)', 'Address Space Rank'),
+    'prefix_16': ('/16', '/16 Address Space Distribution (Top 20)', 'Address Space Rank'),
+    'as': ('AS', 'AS Distribution (Top 20)', 'AS Rank'),
+    'lorenz_8': ('/8', None, None),
+}
+
+
+def draw_panel(ax, panel: str, distributions: Dict[str, np.ndarray], ginis: Dict[str, float]):
+    """Draw one panel of the distribution figure onto ax"""
+    key, title, xlabel = DISTRIBUTION_PANELS[panel]
+    values = np.asarray(distributions[key])
+
+    if title is None:
+        # Lorenz curve for /8 distribution
+        x, cumsum_norm = inequality_metrics(values, lorenz_points=None)['lorenz']
+
+        ax.plot(x, cumsum_norm, 'b-', label='Lorenz Curve (/8)')
+        ax.plot([0, 1], [0, 1], 'r--', label='Perfect Equality')
+        ax.set_title('Lorenz Curve for /8 Distribution')
+        ax.set_xlabel('Cumulative Share of Address Spaces')
+        ax.set_ylabel('Cumulative Share of Resolvers')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+        return
+
+    if len(values) == 0:
+        return
+    top = np.sort(values)[::-1][:20]
+    ax.bar(range(len(top)), top)
+    ax.set_title(f'{title}\nGini: {ginis[key]:.3f}')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('Resolver Count')
+
+
+def distribution_figure(distributions: Dict[str, np.ndarray], ginis: Dict[str, float], panels=None):
+    """The 2x2 distribution figure, or a single figure when one panel is requested"""
+    panels = panels or list(DISTRIBUTION_PANELS)
+    if len(panels) == 1:
+        fig, ax = plt.subplots(figsize=(8, 6))
+        draw_panel(ax, panels[0], distributions, ginis)
+    else:
+        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+        fig.suptitle('DNS Resolver Distribution Analysis', fontsize=16)
+        for ax, panel in zip(axes.flat, panels):
+            draw_panel(ax, panel, distributions, ginis)
+    fig.tight_layout()
+    return fig
+
+
+def render_distribution_figure(distributions: Dict[str, np.ndarray], ginis: Dict[str, float], output_path: str,
+                               panels=None, dpi: int = 300) -> str:
+    """Render and save a distribution figure without a display (runs in batch workers)"""
+    matplotlib.use('Agg')
+    fig = distribution_figure(distributions, ginis, panels)
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return output_path
+
+
+# Result names of the /8, /16 and AS distributions
+RESULT_NAMES = {'/8': "/8 Address Space", '/16': "/16 Address Space", 'AS': "AS"}
+
+
 class DNSGiniCalculator:
-    def __init__(self, host='localhost', user='root', password='', database='dns_db'):
-        """Initialize database connection"""
+    def __init__(self, host='localhost', user='root', password='', database='dns_db', db_url=None,
+                 snapshot_cache: SnapshotCache = None, refresh_cache: bool = False, stages: Stages = NO_STAGES,
+                 exclude_bogons: bool = False, ip_file: str = None):
+        """
+        Initialize database connection (db_url selects a MySQL, SQLite or Parquet backend)
+
+        With a snapshot_cache, resolver data is read from a local columnar
+        snapshot that is only re-materialized when the table changes. stages
+        records per-stage timings and memory (see instrument.py). exclude_bogons
+        drops resolvers in reserved or special-purpose address space (see
+        registry.py) before any analysis. ip_file analyzes a binary .ips file
+        (see ipfile.py) instead of the database.
+        """
         self.config = {
             'host': host,
             'user': user,
             'password': password,
             'database': database
         }
+        self.db_url = db_url
+        self.snapshot_cache = snapshot_cache
+        self.refresh_cache = refresh_cache
+        self.stages = stages
+        self.exclude_bogons = exclude_bogons
+        self.ip_file = ip_file
+        self.backend = None
         self.connection = None
 
     def connect(self):
         """Establish database connection"""
         try:
-            self.connection = mysql.connector.connect(**self.config)
-            print(f"✓ Connected to MySQL database: {self.config['database']}")
-        except mysql.connector.Error as err:
+            self.backend = get_backend(resolve_source(self.db_url, self.config))
+            self.connection = self.backend.connection
+            print(f"✓ Connected to {self.backend.name} storage: {self.backend.describe()}")
+        except DatabaseErrors as err:
             print(f"✗ Database connection failed: {err}")
             sys.exit(1)
 
     def disconnect(self):
         """Close database connection"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        if self.backend is not None:
+            self.backend.close()
+            self.connection = None
             print("✓ Database connection closed")
 
     def calculate_gini(self, values: List[int]) -> float:
@@ -49,31 +150,12 @@ class DNSGiniCalculator:
         Calculate Gini coefficient for a list of values
 
         Args:
-            values: List of counts/values
+            values: List, NumPy array or pandas Series of counts/values
 
         Returns:
             Gini coefficient (0 = perfect equality, 1 = maximum inequality)
         """
-        if not values or len(values) == 0:
-            return 0.0
-
-        # Remove zeros and sort
-        values = [v for v in values if v > 0]
-        if len(values) <= 1:
-            return 0.0
-
-        values = sorted(values)
-        n = len(values)
-        total = sum(values)
-
-        if total == 0:
-            return 0.0
-
-        # Calculate Gini using the standard formula
-        weighted_sum = sum((i + 1) * value for i, value in enumerate(values))
-        gini = (2 * weighted_sum) / (n * total) - (n + 1) / n
-
-        return max(0.0, min(1.0, gini))  # Clamp between 0 and 1
+        return vectorized_gini(values)
 
     def get_resolver_data(self) -> pd.DataFrame:
         """Fetch all DNS resolver data from database"""
@@ -84,161 +166,347 @@ class DNSGiniCalculator:
         """
 
         try:
-            df = pd.read_sql(query, self.connection)
+            with self.stages.stage('fetch') as record:
+                if self.ip_file is not None:
+                    df = open_snapshot(self.ip_file).to_frame(['asn', 'as_name'])
+                elif self.snapshot_cache is not None:
+                    snapshot = self.snapshot_cache.get(self.backend, refresh=self.refresh_cache)
+                    df = snapshot.to_frame(['asn', 'as_name'])
+                else:
+                    df = self.encode_categories(self.backend.read_sql(query))
+                record['rows'] = len(df)
             print(f"✓ Loaded {len(df)} DNS resolver records")
+            with self.stages.stage('parse_ips', rows=len(df)):
+                self.load_ips(df)
+            if self.exclude_bogons:
+                df = self.drop_bogons(df)
             return df
         except Exception as e:
             print(f"✗ Error fetching resolver data: {e}")
             return pd.DataFrame()
 
-    def extract_address_space(self, ip: str, prefix_length: int) -> str:
-        """Extract /8 or /16 address space from IP"""
-        try:
-            octets = ip.split('.')
-            if len(octets) < 4:
-                return None
-
-            if prefix_length == 8:
-                return f"{octets[0]}.0.0.0/8"
-            elif prefix_length == 16:
-                return f"{octets[0]}.{octets[1]}.0.0/16"
-            else:
-                return None
-        except:
-            return None
+    def encode_categories(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Dictionary-encode the label columns (asn, as_name, owner, geo_location)
 
-    def analyze_address_space_distribution(self, df: pd.DataFrame, prefix_length: int) -> Tuple[float, Dict]:
-        """Analyze distribution across /8 or /16 address spaces"""
-        print(f"\nAnalyzing /{prefix_length} address space distribution...")
+        Each becomes a pandas Categorical: integer codes per row plus a small
+        table of distinct labels, the same layout snapshots are read in.
+        """
+        for column in ('asn', 'as_name', 'owner', 'geo_location'):
+            if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        return df
+
+    def load_ips(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Parse the 'ip' column into packed uint32 addresses once
 
-        # Extract address spaces
-        df[f'addr_space_{prefix_length}'] = df['ip'].apply(
-            lambda x: self.extract_address_space(x, prefix_length)
-        )
+        Adds 'ip_int' (uint32) and 'ip_valid' (bool) columns to the DataFrame;
+        later calls reuse them instead of re-parsing the strings.
 
-        # Remove invalid entries
-        valid_df = df[df[f'addr_space_{prefix_length}'].notna()]
-        print(f"✓ {len(valid_df)} valid IP addresses for /{prefix_length} analysis")
+        Returns:
+            uint32 array of all valid IPs
+        """
+        if 'ip_int' not in df.columns:
+            ips, valid = parse_ipv4(df['ip'])
+            df['ip_int'] = ips
+            df['ip_valid'] = valid
+        return df['ip_int'].to_numpy()[df['ip_valid'].to_numpy()]
+
+    def drop_bogons(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Remove rows whose IP lies in reserved or special-purpose address space (one /8 table lookup per row)"""
+        bogons = load_registry().bogon_mask(df['ip_int'].to_numpy(), df['ip_valid'].to_numpy())
+        print(f"✓ Excluded {int(bogons.sum())} bogon addresses")
+        return df[~bogons].reset_index(drop=True)
+
+    def extract_address_space(self, ips: np.ndarray, prefix_length: int) -> np.ndarray:
+        """Extract the /N address space (as integer prefix keys) from uint32 IPs"""
+        return prefix_keys(ips, prefix_length)
+
+    def address_space_distribution(self, df: pd.DataFrame, prefix_length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Count resolvers per /N address space, returning (prefix keys, counts)"""
+        ips = self.load_ips(df)
+        keys = self.extract_address_space(ips, prefix_length)
+        return count_keys(keys, prefix_length)
+
+    def analyze_address_space_distribution(self, df: pd.DataFrame, prefix_length: int) -> Tuple[float, Dict]:
+        """Analyze distribution across /N address spaces"""
+        print(f"\nAnalyzing /{prefix_length} address space distribution...")
 
         # Count resolvers per address space
-        distribution = valid_df[f'addr_space_{prefix_length}'].value_counts()
+        keys, counts = self.address_space_distribution(df, prefix_length)
+        return self.address_space_stats(keys, counts, prefix_length)
+
+    def address_space_stats(self, keys: np.ndarray, counts: np.ndarray, prefix_length: int) -> Tuple[float, Dict]:
+        """Gini coefficient and summary statistics of a /N (prefix key, count) distribution"""
+        total = int(counts.sum())
+        print(f"✓ {total} valid IP addresses for /{prefix_length} analysis")
 
         # Calculate Gini coefficient
-        gini = self.calculate_gini(distribution.values.tolist())
+        gini = self.calculate_gini(counts)
+
+        # Only the printed top 5 get formatted labels
+        top_keys, top_counts = top_prefixes(keys, counts, 5)
 
         # Create summary statistics
         stats = {
-            'total_resolvers': len(valid_df),
-            'unique_address_spaces': len(distribution),
+            'total_resolvers': total,
+            'unique_address_spaces': len(counts),
             'gini_coefficient': gini,
-            'top_5_spaces': distribution.head(5).to_dict(),
-            'min_resolvers': distribution.min(),
-            'max_resolvers': distribution.max(),
-            'mean_resolvers': distribution.mean(),
-            'median_resolvers': distribution.median()
+            'top_5_spaces': {format_prefix(k, prefix_length): int(c) for k, c in zip(top_keys, top_counts)},
+            'min_resolvers': int(counts.min()) if len(counts) else 0,
+            'max_resolvers': int(counts.max()) if len(counts) else 0,
+            'mean_resolvers': float(counts.mean()) if len(counts) else 0.0,
+            'median_resolvers': float(np.median(counts)) if len(counts) else 0.0
         }
 
         return gini, stats
 
-    def analyze_as_distribution(self, df: pd.DataFrame) -> Tuple[float, Dict]:
-        """Analyze distribution across Autonomous Systems"""
+    def as_codes(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Integer ASN code per resolver (-1 for missing or empty ASNs) and the ASN label table"""
+        asn = self.encode_categories(df[['asn']])['asn']
+        labels = asn.cat.categories.to_numpy(dtype=object)
+        codes = asn.cat.codes.to_numpy().astype(np.int64)
+        empty = np.flatnonzero(labels == '')
+        if len(empty):
+            codes[np.isin(codes, empty)] = -1
+        return codes, labels
+
+    def as_distribution(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Count resolvers per AS with one bincount, returning (ASN labels, counts) of non-empty ASes"""
+        codes, labels = self.as_codes(df)
+        counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        present = np.flatnonzero(counts)
+        return labels[present], counts[present]
+
+    def as_names(self, df: pd.DataFrame, asns) -> Dict:
+        """Name of each given AS as recorded on its first row, found in one pass over the codes"""
+        if 'as_name' not in df or len(asns) == 0:
+            return {}
+        codes, labels = self.as_codes(df)
+        wanted = np.zeros(len(labels) + 1, dtype=bool)  # Last slot catches code -1
+        wanted[pd.Index(labels).get_indexer(asns)] = True
+        rows = np.flatnonzero(wanted[codes])
+        first = pd.Series(codes[rows]).drop_duplicates()  # Hash-based, keeps each AS's first row
+
+        as_name = self.encode_categories(df[['as_name']])['as_name']
+        name_codes = as_name.cat.codes.to_numpy()[rows[first.index.to_numpy()]]
+        names = np.append(as_name.cat.categories.to_numpy(dtype=object), None)[name_codes]  # -1 -> None
+        return dict(zip(labels[first.to_numpy()], names))
+
+    def analyze_as_distribution(self, df: pd.DataFrame,
+                                as_distribution: Tuple[np.ndarray, np.ndarray] = None) -> Tuple[float, Dict]:
+        """
+        Analyze distribution across Autonomous Systems
+
+        Counts come from a bincount over integer ASN codes, the top 5 from a
+        partial selection and their names from one pass over the codes, so
+        the frame is never rescanned per entity.
+        """
         print("\nAnalyzing AS distribution...")
 
-        # Filter valid ASN entries
-        valid_df = df[df['asn'].notna() & (df['asn'] != '')]
-        print(f"✓ {len(valid_df)} resolvers with valid ASN data")
+        # Count resolvers per AS
+        asns, counts = as_distribution if as_distribution is not None else self.as_distribution(df)
 
-        if len(valid_df) == 0:
-            return 0.0, {'error': 'No valid ASN data found'}
+        # Names are only looked up for the top 5
+        top_asns = asns[top_prefixes(np.arange(len(counts)), counts, 5)[0]]
+        return self.as_stats(asns, counts, self.as_names(df, top_asns))
 
-        # Count resolvers per AS
-        as_distribution = valid_df['asn'].value_counts()
+    def as_stats(self, asns: np.ndarray, counts: np.ndarray, as_names: Dict) -> Tuple[float, Dict]:
+        """Gini coefficient and summary statistics of an AS distribution given as parallel arrays"""
+        total = int(counts.sum())
+        print(f"✓ {total} resolvers with valid ASN data")
+        if total == 0:
+            return 0.0, {'error': 'No valid ASN data found'}
 
-        # Calculate Gini coefficient
-        gini = self.calculate_gini(as_distribution.values.tolist())
-
-        # Get top AS names
-        top_as_details = []
-        for asn in as_distribution.head(5).index:
-            as_name = valid_df[valid_df['asn'] == asn]['as_name'].iloc[0]
-            resolver_count = as_distribution[asn]
-            top_as_details.append({
-                'asn': asn,
-                'as_name': as_name,
-                'resolver_count': resolver_count,
-                'percentage': (resolver_count / len(valid_df)) * 100
-            })
+        gini = self.calculate_gini(counts)
+        top_codes, top_counts = top_prefixes(np.arange(len(counts)), counts, 5)
+        top_as_details = [{
+            'asn': asns[i],
+            'as_name': as_names.get(asns[i]) or 'Unknown',
+            'resolver_count': int(count),
+            'percentage': float(count / total * 100)
+        } for i, count in zip(top_codes, top_counts)]
 
         stats = {
-            'total_resolvers': len(valid_df),
-            'unique_as': len(as_distribution),
+            'total_resolvers': total,
+            'unique_as': len(counts),
             'gini_coefficient': gini,
             'top_5_as': top_as_details,
-            'min_resolvers': as_distribution.min(),
-            'max_resolvers': as_distribution.max(),
-            'mean_resolvers': as_distribution.mean(),
-            'median_resolvers': as_distribution.median()
+            'min_resolvers': int(counts.min()),
+            'max_resolvers': int(counts.max()),
+            'mean_resolvers': float(counts.mean()),
+            'median_resolvers': float(np.median(counts))
         }
 
         return gini, stats
 
+    def stream_analysis(self, chunk_size: int = 50000) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """
+        Compute the /8, /16 and AS results from fetchmany() chunks
+
+        Memory stays bounded by the chunk size and the number of distinct ASes,
+        so this works for tables that do not fit in a DataFrame. The prefix
+        sweep needs every address and is not available in this mode.
+
+        Returns:
+            (results, distributions) where distributions holds the /8, /16 and
+            AS counts for render_distributions()
+        """
+        with self.stages.stage('stream') as record:
+            cohorts = without_bogons(('all',)) if self.exclude_bogons else ('all',)
+            aggregator = stream_resolvers(self.backend, cohorts=cohorts, chunk_size=chunk_size,
+                                          where="ip IS NOT NULL AND ip != ''")
+            record['rows'] = int(aggregator.totals[0])
+        print(f"✓ Streamed {int(aggregator.totals[0])} DNS resolver records")
+        dists = aggregator.distributions()['all']
+
+        results = {}
+        for prefix_length in (8, 16):
+            print(f"\nAnalyzing /{prefix_length} address space distribution...")
+            results[f"/{prefix_length} Address Space"] = self.address_space_stats(*dists[str(prefix_length)], prefix_length)
+
+        print("\nAnalyzing AS distribution...")
+        codes, counts = dists['as']
+        results["AS"] = self.as_stats(np.asarray(aggregator.asn_labels, dtype=object)[codes], counts, aggregator.as_names)
+
+        distributions = {'/8': dists['8'][1], '/16': dists['16'][1], 'AS': counts}
+        return results, distributions
+
+    def result_ginis(self, results: Dict) -> Dict[str, float]:
+        """Gini coefficients of the /8, /16 and AS results, keyed like the distributions"""
+        return {key: results[name][0] for key, name in RESULT_NAMES.items()}
+
+    def gini_intervals(self, distributions: Dict[str, np.ndarray], n_resamples: int, confidence: float = 0.95,
+                       workers: int = None) -> Dict[str, Tuple[float, float]]:
+        """Bootstrap confidence intervals of the /8, /16 and AS Gini coefficients, keyed like the results"""
+        with self.stages.stage('bootstrap'):
+            intervals = bootstrap_intervals(distributions, n_resamples, confidence, workers=workers)
+        return {RESULT_NAMES[key]: interval for key, interval in intervals.items()}
+
+    def distribution_data(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Resolver counts per /8, /16 and AS (the inputs of the distribution plots)"""
+        return {
+            '/8': self.address_space_distribution(df, 8)[1],
+            '/16': self.address_space_distribution(df, 16)[1],
+            'AS': self.as_distribution(df)[1],
+        }
+
     def plot_distributions(self, df: pd.DataFrame, save_plots: bool = True):
         """Create visualizations of the distributions"""
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle('DNS Resolver Distribution Analysis', fontsize=16)
-
-        # /8 distribution
-        df['addr_space_8'] = df['ip'].apply(lambda x: self.extract_address_space(x, 8))
-        dist_8 = df[df['addr_space_8'].notna()]['addr_space_8'].value_counts()
+        distributions = self.distribution_data(df)
 
-        axes[0, 0].bar(range(len(dist_8.head(20))), dist_8.head(20).values)
-        axes[0, 0].set_title(f'/8 Address Space Distribution (Top 20)\nGini: {self.calculate_gini(dist_8.values.tolist()):.3f}')
-        axes[0, 0].set_xlabel('Address Space Rank')
-        axes[0, 0].set_ylabel('Resolver Count')
+        # Gini coefficients for all three distributions in one call
+        ginis = gini_many(distributions)
 
-        # /16 distribution
-        df['addr_space_16'] = df['ip'].apply(lambda x: self.extract_address_space(x, 16))
-        dist_16 = df[df['addr_space_16'].notna()]['addr_space_16'].value_counts()
+        distribution_figure(distributions, ginis)
 
-        axes[0, 1].bar(range(len(dist_16.head(20))), dist_16.head(20).values)
-        axes[0, 1].set_title(f'/16 Address Space Distribution (Top 20)\nGini: {self.calculate_gini(dist_16.values.tolist()):.3f}')
-        axes[0, 1].set_xlabel('Address Space Rank')
-        axes[0, 1].set_ylabel('Resolver Count')
+        if save_plots:
+            plt.savefig('dns_resolver_gini_analysis.png', dpi=300, bbox_inches='tight')
+            print("✓ Plots saved as 'dns_resolver_gini_analysis.png'")
 
-        # AS distribution
-        valid_as_df = df[df['asn'].notna() & (df['asn'] != '')]
-        if len(valid_as_df) > 0:
-            as_dist = valid_as_df['asn'].value_counts()
+        plt.show()
 
-            axes[1, 0].bar(range(len(as_dist.head(20))), as_dist.head(20).values)
-            axes[1, 0].set_title(f'AS Distribution (Top 20)\nGini: {self.calculate_gini(as_dist.values.tolist()):.3f}')
-            axes[1, 0].set_xlabel('AS Rank')
-            axes[1, 0].set_ylabel('Resolver Count')
+    def render_distributions(self, distributions: Dict[str, np.ndarray], ginis: Dict[str, float],
+                             output_dir: str = '.', formats=('png',), dpi: int = 300, separate: bool = False,
+                             workers: int = None) -> List[str]:
+        """
+        Render the distribution plots headless from already computed distributions
+
+        Writes dns_resolver_gini_analysis.<format> for every format and, with
+        separate, one figure per panel (dns_resolver_gini_<panel>.<format>).
+        Figures are drawn concurrently in worker processes; the parallelism is
+        per figure, since the panels of one figure share its canvas and are
+        rasterized together by savefig(). A single figure (the default: one
+        format, no separate panels) is therefore rendered in-process without
+        starting a pool.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = []
+        for fmt in formats:
+            jobs.append((os.path.join(output_dir, f'dns_resolver_gini_analysis.{fmt}'), None))
+            if separate:
+                jobs += [(os.path.join(output_dir, f'dns_resolver_gini_{panel}.{fmt}'), [panel])
+                         for panel in DISTRIBUTION_PANELS]
+
+        if len(jobs) == 1:
+            paths = [render_distribution_figure(distributions, ginis, jobs[0][0], jobs[0][1], dpi)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(render_distribution_figure, distributions, ginis, path, panels, dpi)
+                           for path, panels in jobs]
+                paths = [future.result() for future in futures]
+
+        print(f"✓ Rendered {len(paths)} plots to '{output_dir}'")
+        return paths
+
+    def analyze_prefix_sweep(self, df: pd.DataFrame, min_length: int = 1, max_length: int = 32) -> pd.DataFrame:
+        """
+        Analyze concentration across every prefix length in one hierarchical pass
 
-        # Lorenz curve for /8 distribution
-        sorted_values = sorted(dist_8.values)
-        cumsum = np.cumsum(sorted_values)
-        cumsum_norm = cumsum / cumsum[-1]
-        x = np.arange(1, len(sorted_values) + 1) / len(sorted_values)
-
-        axes[1, 1].plot(x, cumsum_norm, 'b-', label='Lorenz Curve (/8)')
-        axes[1, 1].plot([0, 1], [0, 1], 'r--', label='Perfect Equality')
-        axes[1, 1].set_title('Lorenz Curve for /8 Distribution')
-        axes[1, 1].set_xlabel('Cumulative Share of Address Spaces')
-        axes[1, 1].set_ylabel('Cumulative Share of Resolvers')
-        axes[1, 1].legend()
-        axes[1, 1].grid(True, alpha=0.3)
+        The IP set is sorted once and the bucket counts for all prefix lengths
+        are derived from it (see ipv4.prefix_hierarchy), then all Gini
+        coefficients are computed in a single gini_many() call.
 
+        Returns:
+            DataFrame with prefix_length, gini, buckets and max_bucket columns
+        """
+        print(f"\nAnalyzing /{min_length} to /{max_length} prefix sweep...")
+
+        ips = self.load_ips(df)
+        hierarchy = prefix_hierarchy(ips, min_length, max_length)
+        ginis = gini_many({str(length): counts for length, counts in hierarchy.items()})
+        print(f"✓ {len(ips)} valid IP addresses across {len(hierarchy)} prefix lengths")
+
+        return pd.DataFrame({
+            'prefix_length': list(hierarchy),
+            'gini': [ginis[str(length)] for length in hierarchy],
+            'buckets': [len(counts) for counts in hierarchy.values()],
+            'max_bucket': [int(counts.max()) if len(counts) else 0 for counts in hierarchy.values()],
+        })
+
+    def plot_prefix_sweep(self, sweep: pd.DataFrame, save_plots: bool = True,
+                          output_path: str = 'dns_resolver_prefix_sweep.png', dpi: int = 300, show: bool = True):
+        """Plot Gini coefficient and bucket count against prefix length"""
+        fig, ax = plt.subplots(figsize=(12, 6))
+        ax.plot(sweep['prefix_length'], sweep['gini'], 'b-o', markersize=4, label='Gini Coefficient')
+        ax.set_title('DNS Resolver Concentration by Prefix Length')
+        ax.set_xlabel('Prefix Length')
+        ax.set_ylabel('Gini Coefficient')
+        ax.set_xticks(sweep['prefix_length'])
+        ax.set_ylim(0, 1)
+        ax.grid(True, alpha=0.3)
+
+        buckets_ax = ax.twinx()
+        buckets_ax.plot(sweep['prefix_length'], sweep['buckets'], 'g--', alpha=0.6, label='Non-empty Buckets')
+        buckets_ax.set_yscale('log')
+        buckets_ax.set_ylabel('Non-empty Buckets')
+
+        lines = ax.get_lines() + buckets_ax.get_lines()
+        ax.legend(lines, [line.get_label() for line in lines], loc='lower right')
         plt.tight_layout()
 
         if save_plots:
-            plt.savefig('dns_resolver_gini_analysis.png', dpi=300, bbox_inches='tight')
-            print("✓ Plots saved as 'dns_resolver_gini_analysis.png'")
+            plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
+            print(f"✓ Prefix sweep plot saved as '{output_path}'")
 
-        plt.show()
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
 
-    def print_results(self, results: Dict):
-        """Print formatted results"""
+    def print_prefix_sweep(self, sweep: pd.DataFrame):
+        """Print formatted prefix sweep results"""
+        print("\n" + "="*80)
+        print("PREFIX LENGTH SWEEP")
+        print("="*80)
+        print(f"{'Prefix':<10} {'Gini':>10} {'Buckets':>14} {'Max Bucket':>14}")
+        print("-" * 50)
+        for row in sweep.itertuples(index=False):
+            print(f"{'/' + str(row.prefix_length):<10} {row.gini:>10.4f} {row.buckets:>14,} {row.max_bucket:>14,}")
+
+    def print_results(self, results: Dict, intervals: Dict = None, confidence: float = 0.95):
+        """Print formatted results (with gini_intervals() confidence intervals, if given)"""
         print("\n" + "="*80)
         print("DNS RESOLVER GINI COEFFICIENT ANALYSIS")
         print("="*80)
@@ -252,6 +520,9 @@ class DNSGiniCalculator:
                 continue
 
             print(f"Gini Coefficient: {gini:.4f}")
+            if intervals and analysis_type in intervals:
+                low, high = intervals[analysis_type]
+                print(f"{confidence:.0%} Confidence Interval: [{low:.4f}, {high:.4f}] (bootstrap)")
             print(f"Total Resolvers: {stats['total_resolvers']:,}")
             print(f"Unique Entities: {stats['unique_entities' if 'unique_entities' in stats else 'unique_address_spaces' if 'unique_address_spaces' in stats else 'unique_as']:,}")
             print(f"Min Resolvers per Entity: {stats['min_resolvers']}")
@@ -283,14 +554,37 @@ class DNSGiniCalculator:
                     percentage = (count / stats['total_resolvers']) * 100
                     print(f"  {space}: {count:,} resolvers ({percentage:.1f}%)")
 
-    def run_analysis(self, create_plots: bool = True):
-        """Run complete Gini coefficient analysis"""
+    def run_analysis(self, create_plots: bool = True, prefix_sweep: bool = False, stream: bool = False,
+                     chunk_size: int = 50000, batch: Dict = None, bootstrap: int = 0, confidence: float = 0.95):
+        """
+        Run complete Gini coefficient analysis, optionally including the /1-/32 prefix sweep
+
+        batch holds render_distributions() options (output_dir, formats, dpi,
+        separate, workers); when given, plots are rendered headless from the
+        computed distributions instead of being shown. bootstrap > 0 adds
+        confidence intervals from that many resamples of the distributions.
+        """
         print("🔍 Starting DNS Resolver Gini Coefficient Analysis...")
 
         # Connect to database
-        self.connect()
+        if self.ip_file is None:
+            self.connect()
+        elif stream:
+            print("ℹ️  Streaming reads the database; analyzing the .ips file in memory")
+            stream = False
 
         try:
+            if stream:
+                results, distributions = self.stream_analysis(chunk_size)
+                intervals = self.gini_intervals(distributions, bootstrap, confidence) if bootstrap else None
+                self.print_results(results, intervals, confidence)
+                if batch is not None:
+                    with self.stages.stage('plots'):
+                        self.render_distributions(distributions, self.result_ginis(results), **batch)
+                elif create_plots or prefix_sweep:
+                    print("ℹ️  Interactive plots and the prefix sweep are skipped in streaming mode")
+                return
+
             # Get data
             df = self.get_resolver_data()
             if df.empty:
@@ -298,26 +592,49 @@ class DNSGiniCalculator:
                 return
 
             results = {}
+            distributions = {}
 
-            # Analyze /8 distribution
-            gini_8, stats_8 = self.analyze_address_space_distribution(df, 8)
-            results["/8 Address Space"] = (gini_8, stats_8)
-
-            # Analyze /16 distribution
-            gini_16, stats_16 = self.analyze_address_space_distribution(df, 16)
-            results["/16 Address Space"] = (gini_16, stats_16)
+            # Analyze /8 and /16 distributions (the counts are kept for batch plots)
+            for prefix_length in (8, 16):
+                print(f"\nAnalyzing /{prefix_length} address space distribution...")
+                with self.stages.stage(f'address_space_{prefix_length}', rows=len(df)):
+                    keys, counts = self.address_space_distribution(df, prefix_length)
+                    distributions[f"/{prefix_length}"] = counts
+                    results[f"/{prefix_length} Address Space"] = self.address_space_stats(keys, counts, prefix_length)
 
             # Analyze AS distribution
-            gini_as, stats_as = self.analyze_as_distribution(df)
-            results["AS"] = (gini_as, stats_as)
+            with self.stages.stage('as_distribution', rows=len(df)):
+                as_distribution = self.as_distribution(df)
+                distributions["AS"] = as_distribution[1]
+                gini_as, stats_as = self.analyze_as_distribution(df, as_distribution)
+                results["AS"] = (gini_as, stats_as)
 
             # Print results
-            self.print_results(results)
+            intervals = self.gini_intervals(distributions, bootstrap, confidence) if bootstrap else None
+            self.print_results(results, intervals, confidence)
+
+            # Analyze every prefix length
+            sweep = None
+            if prefix_sweep:
+                with self.stages.stage('prefix_sweep', rows=len(df)):
+                    sweep = self.analyze_prefix_sweep(df)
+                self.print_prefix_sweep(sweep)
 
             # Create visualizations
-            if create_plots:
+            if batch is not None:
+                with self.stages.stage('plots'):
+                    self.render_distributions(distributions, self.result_ginis(results), **batch)
+                if sweep is not None:
+                    for fmt in batch.get('formats', ('png',)):
+                        self.plot_prefix_sweep(sweep, output_path=os.path.join(batch.get('output_dir', '.'),
+                                                                               f'dns_resolver_prefix_sweep.{fmt}'),
+                                               dpi=batch.get('dpi', 300), show=False)
+            elif create_plots:
                 try:
-                    self.plot_distributions(df)
+                    with self.stages.stage('plots', rows=len(df)):
+                        self.plot_distributions(df)
+                    if sweep is not None:
+                        self.plot_prefix_sweep(sweep)
                 except Exception as e:
                     print(f"⚠️  Could not create plots: {e}")
 
@@ -329,19 +646,43 @@ class DNSGiniCalculator:
 
 def main():
     """Main function with configuration"""
-    # Database configuration - modify these values for your setup
-    DB_CONFIG = {
-        'host': 'localhost',
-        'user': 'pink',
-        'password': 'passw',  # Add your password here
-        'database': 'dns_servers'  # Replace with your database name
-    }
+    # Database configuration - modify storage.DEFAULT_DB_CONFIG for your setup
+    DB_CONFIG = dict(DEFAULT_DB_CONFIG)
+
+    parser = argparse.ArgumentParser(description="DNS Resolver Gini Coefficient Calculator")
+    parser.add_argument('--db', help="Storage URL: mysql://..., sqlite:///file.db or parquet:///dir (default: $DNS_DB_URL)")
+    parser.add_argument('--prefix-sweep', action='store_true', help="Also analyze every prefix length /1 to /32")
+    parser.add_argument('--cache', action='store_true', help="Read from the local columnar snapshot (built on first use)")
+    parser.add_argument('--refresh-cache', action='store_true', help="Rebuild the snapshot before analyzing")
+    parser.add_argument('--ips', help="Analyze a binary .ips file (see ipfile.py) instead of the database")
+    parser.add_argument('--stream', action='store_true', help="Stream rows in chunks with bounded memory (no plots)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per fetchmany() chunk in --stream mode")
+    parser.add_argument('--batch', action='store_true', help="Render plots headless to files (also with --stream)")
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'], help="Batch plot formats")
+    parser.add_argument('--dpi', type=int, default=300, help="Batch plot resolution for raster formats")
+    parser.add_argument('--separate', action='store_true', help="Also write every panel as its own figure")
+    parser.add_argument('--output-dir', default='.', help="Batch plot directory")
+    parser.add_argument('--workers', type=int, default=None, help="Batch render processes (default: CPU count)")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help="Add bootstrap confidence intervals from N resamples (e.g. 10000)")
+    parser.add_argument('--confidence', type=float, default=0.95, help="Bootstrap interval confidence level")
+    parser.add_argument('--exclude-bogons', action='store_true',
+                        help="Drop resolvers in reserved or special-purpose address space before analyzing")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    batch = None
+    if args.batch:
+        matplotlib.use('Agg')
+        batch = {'output_dir': args.output_dir, 'formats': args.format, 'dpi': args.dpi,
+                 'separate': args.separate, 'workers': args.workers}
 
     print("DNS Resolver Gini Coefficient Calculator")
     print("="*50)
 
     # Get database credentials from user if not configured
-    if not DB_CONFIG['password'] or DB_CONFIG['database'] == 'your_database_name':
+    db_url = resolve_source(args.db, {})
+    if not db_url and not args.ips and (not DB_CONFIG['password'] or DB_CONFIG['database'] == 'your_database_name'):
         print("Please configure database connection:")
         DB_CONFIG['host'] = input(f"Host [{DB_CONFIG['host']}]: ") or DB_CONFIG['host']
         DB_CONFIG['user'] = input(f"User [{DB_CONFIG['user']}]: ") or DB_CONFIG['user']
@@ -349,8 +690,14 @@ def main():
         DB_CONFIG['database'] = input("Database name: ")
 
     # Run analysis
-    calculator = DNSGiniCalculator(**DB_CONFIG)
-    calculator.run_analysis(create_plots=True)
+    cache = SnapshotCache() if args.cache or args.refresh_cache else None
+    calculator = DNSGiniCalculator(**DB_CONFIG, db_url=db_url or None,
+                                   snapshot_cache=cache, refresh_cache=args.refresh_cache,
+                                   stages=from_arguments(args, 'gini_coefficient'), exclude_bogons=args.exclude_bogons,
+                                   ip_file=args.ips)
+    calculator.run_analysis(create_plots=not args.stream, prefix_sweep=args.prefix_sweep and not args.stream,
+                            stream=args.stream, chunk_size=args.chunk_size, batch=batch,
+                            bootstrap=args.bootstrap, confidence=args.confidence)
 
 if __name__ == "__main__":
     main()
@@ -4,60 +4,422 @@ DNSSEC-enabled DNS Resolver Gini Calculator
 Compares distribution between all resolvers vs DNSSEC-enabled resolvers
 """
 
-import mysql.connector
-from collections import Counter
+import argparse
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from gini import gini, gini_many, metrics_many
+from gini_bootstrap import compare_cohorts
+from instrument import NO_STAGES, add_arguments as add_profile_arguments, from_arguments
+from ipfile import open_snapshot
+from ipv4 import format_prefix, parse_ipv4, top_prefixes, prefix_octets
+from registry import RIRS, load_registry
+from snapshot import SnapshotCache
+from storage import DEFAULT_DB_CONFIG, get_backend, resolve_source
 
 def calculate_gini(values):
     """Calculate Gini coefficient for a list of values"""
-    values = sorted([v for v in values if v > 0])
-    if len(values) <= 1:
-        return 0.0
+    return gini(values)
+
+def top_blocks(keys, counts, prefix_length, n=5):
+    """Return the n largest address blocks as (octet label, count) pairs"""
+    top_keys, top_counts = top_prefixes(keys, counts, n)
+    return [(prefix_octets(k, prefix_length), int(c)) for k, c in zip(top_keys, top_counts)]
+
+# Cohorts are row filters over the fetched columns; all of them are counted in the same pass
+COHORTS = {
+    'all': lambda rows: np.ones(len(rows['ip']), dtype=bool),
+    'dnssec': lambda rows: rows['dnssec_support'] == 1,
+    'validated': lambda rows: rows['dnssec_validated'] == 1,
+}
 
-    n = len(values)
-    total = sum(values)
-    weighted_sum = sum((i + 1) * value for i, value in enumerate(values))
+def resolve_cohorts(cohorts):
+    """Accept cohort names from COHORTS or a mapping of name -> row filter"""
+    if isinstance(cohorts, Mapping):
+        return dict(cohorts)
+    return {name: COHORTS[name] for name in cohorts}
 
-    return (2 * weighted_sum) / (n * total) - (n + 1) / n
+def without_bogons(cohorts):
+    """
+    Restrict every cohort to rows whose IP is not in reserved or special-purpose space (registry.py)
 
-def analyze_resolvers(cursor, dnssec_filter=""):
-    """Analyze resolver distribution with optional DNSSEC filter"""
-    query = f"SELECT ip, asn, as_name FROM dns_resolvers WHERE ip IS NOT NULL {dnssec_filter}"
-    cursor.execute(query)
-    results = cursor.fetchall()
+    All cohorts of a chunk are evaluated on the same rows, so the bogon mask
+    is computed once per chunk and shared.
+    """
+    table = load_registry()
+    last = {}
 
-    ips = [row[0] for row in results]
-    asns = [row[1] for row in results if row[1]]
-    as_names = {row[1]: row[2] for row in results if row[1] and row[2]}
+    def public(rows):
+        if last.get('rows') is not rows:
+            last.update(rows=rows, mask=~table.bogon_mask(rows['ip'], rows['ip_valid']))
+        return last['mask']
+
+    def restrict(predicate):
+        return lambda rows: predicate(rows) & public(rows)
+
+    return {name: restrict(predicate) for name, predicate in resolve_cohorts(cohorts).items()}
+
+RESOLVER_QUERY = """
+    SELECT ip, asn, as_name, dnssec_support, dnssec_validated, geo_location, owner
+    FROM dns_resolvers WHERE {where}
+"""
 
-    # /8 analysis
-    class_a_blocks = [ip.split('.')[0] for ip in ips if '.' in ip]
-    block_counts_8 = Counter(class_a_blocks)
-    gini_8 = calculate_gini(list(block_counts_8.values()))
+# Categorical distributions counted next to /8, /16 and AS: dimension -> column
+CATEGORY_COLUMNS = {'owner': 'owner', 'country': 'geo_location'}
+# 'rir' is derived from the /8 counts through the IANA registry table
+DIMENSIONS = ['8', '16', 'as', 'rir', *CATEGORY_COLUMNS]
 
-    # /16 analysis
-    class_b_blocks = ['.'.join(ip.split('.')[:2]) for ip in ips if '.' in ip and len(ip.split('.')) >= 2]
-    block_counts_16 = Counter(class_b_blocks)
-    gini_16 = calculate_gini(list(block_counts_16.values()))
+def as_name_table(asn_codes, asn_labels, name_codes, name_labels):
+    """Name of every AS as recorded on its last named row, from integer codes ({asn: name})"""
+    name_labels = np.asarray(name_labels, dtype=object)
+    named = (asn_codes >= 0) & (name_codes >= 0)
+    named[named] = name_labels[name_codes[named]] != ''
+    unique_asns, last = np.unique(asn_codes[named][::-1], return_index=True)
+    names = name_labels[name_codes[named][::-1][last]]
+    return dict(zip(np.asarray(asn_labels, dtype=object)[unique_asns], names))
 
-    # AS analysis
-    as_counts = Counter(asns)
-    gini_as = calculate_gini(list(as_counts.values()))
+def chunk_columns(results):
+    """
+    Turn fetched (ip, asn, as_name, dnssec_support, dnssec_validated, geo_location, owner) rows into arrays
+
+    Label columns are dictionary-encoded: asn as codes plus a label table,
+    geo_location and owner as pandas Categoricals.
+    """
+    ip, asn, as_name, dnssec_support, dnssec_validated, geo_location, owner = (
+        zip(*results) if results else ([] for _ in range(7)))
+
+    ips, valid = parse_ipv4(ip)
+    asn = pd.Series(asn, dtype=object)
+    asn_codes, asn_labels = pd.factorize(asn.mask(asn == ''))
+    name_codes, name_labels = pd.factorize(pd.Series(as_name, dtype=object))
 
     return {
-        'total_resolvers': len(ips),
-        'gini_8': gini_8,
-        'gini_16': gini_16,
-        'gini_as': gini_as,
-        'unique_8_blocks': len(block_counts_8),
-        'unique_16_blocks': len(block_counts_16),
-        'unique_as': len(as_counts),
-        'top_8_blocks': block_counts_8.most_common(5),
-        'top_16_blocks': block_counts_16.most_common(5),
-        'top_as': [(asn, count, as_names.get(asn, 'Unknown')) for asn, count in as_counts.most_common(5)]
+        'ip': ips,
+        'ip_valid': valid,
+        'asn_codes': asn_codes,
+        'asn_labels': np.asarray(asn_labels, dtype=object),
+        'as_names': as_name_table(asn_codes, asn_labels, name_codes, name_labels),
+        'dnssec_support': pd.to_numeric(pd.Series(dnssec_support, dtype=object)).fillna(0).to_numpy(),
+        'dnssec_validated': pd.to_numeric(pd.Series(dnssec_validated, dtype=object)).fillna(0).to_numpy(),
+        'geo_location': pd.Categorical(np.asarray(geo_location, dtype=object)),
+        'owner': pd.Categorical(np.asarray(owner, dtype=object)),
     }
 
-def print_comparison(all_results, dnssec_results):
-    """Print comparison between all resolvers and DNSSEC resolvers"""
+def fetch_resolvers(cursor, where="ip IS NOT NULL"):
+    """Fetch every resolver once and return its columns as arrays"""
+    cursor.execute(RESOLVER_QUERY.format(where=where))
+    return chunk_columns(cursor.fetchall())
+
+def snapshot_columns(snapshot):
+    """The same columns as fetch_resolvers(), read from a local snapshot"""
+    asn_codes = np.asarray(snapshot.codes('asn')).astype(np.int64)
+    asn_labels = snapshot.labels['asn'].astype(object)
+    asn_codes[np.isin(asn_codes, np.flatnonzero(asn_labels == ''))] = -1
+
+    def categorical(column):
+        return pd.Categorical.from_codes(np.asarray(snapshot.codes(column)), categories=snapshot.labels[column])
+
+    return {
+        'ip': np.asarray(snapshot.columns['ip']),
+        'ip_valid': np.asarray(snapshot.columns['ip_valid']),
+        'asn_codes': asn_codes,
+        'asn_labels': asn_labels,
+        'as_names': as_name_table(asn_codes, asn_labels, np.asarray(snapshot.codes('as_name')),
+                                  snapshot.labels['as_name']),
+        'dnssec_support': np.asarray(snapshot.columns['dnssec_support']),
+        'dnssec_validated': np.asarray(snapshot.columns['dnssec_validated']),
+        'geo_location': categorical('geo_location'),
+        'owner': categorical('owner'),
+    }
+
+def membership_patterns(masks):
+    """
+    Collapse per-row cohort membership into pattern ids
+
+    Returns:
+        (pattern id per row, membership matrix of shape (patterns, cohorts))
+    """
+    if masks.shape[1] > 62:
+        raise ValueError("At most 62 cohorts can be counted in one pass")
+    bits = masks.astype(np.int64) @ (np.int64(1) << np.arange(masks.shape[1], dtype=np.int64))
+    patterns, pattern = np.unique(bits, return_inverse=True)
+    membership = ((patterns[:, None] >> np.arange(masks.shape[1])) & 1).astype(np.int64)
+    return pattern.ravel(), membership
+
+def cohort_counts(keys, pattern, membership, n_keys=None):
+    """
+    Count rows per key for every cohort at once
+
+    Rows are binned by key * patterns + pattern, and the (keys, patterns) grid
+    is multiplied by the membership matrix to get (keys, cohorts) counts.
+
+    Returns:
+        (key values, counts of shape (len(key values), cohorts))
+    """
+    n_patterns = len(membership)
+    keys = np.asarray(keys, dtype=np.int64)
+    if n_keys is not None and n_keys * n_patterns <= 1 << 24:
+        key_values = np.arange(n_keys)
+    else:
+        key_values, keys = np.unique(keys, return_inverse=True)
+        keys = keys.ravel()
+    grid = np.bincount(keys * n_patterns + pattern, minlength=len(key_values) * n_patterns)
+    return key_values, grid.reshape(len(key_values), n_patterns) @ membership
+
+class CohortAggregator:
+    """
+    Incremental per-cohort counts of /8 blocks, /16 blocks, ASes, owners and countries
+
+    State is two fixed (256 x cohorts) and (65536 x cohorts) arrays plus one
+    row per distinct AS, owner and country, so feeding it chunk after chunk
+    keeps memory independent of the number of resolvers. Owners and countries
+    are only counted when the columns carry them. Per-RIR counts are derived
+    from the /8 counts on demand.
+    """
+
+    def __init__(self, cohorts=('all', 'dnssec')):
+        self.cohorts = resolve_cohorts(cohorts)
+        self.names = list(self.cohorts)
+        n = len(self.names)
+        self.totals = np.zeros(n, dtype=np.int64)
+        self.counts_8 = np.zeros((1 << 8, n), dtype=np.int64)
+        self.counts_16 = np.zeros((1 << 16, n), dtype=np.int64)
+        self.as_counts = np.zeros((0, n), dtype=np.int64)
+        self.asn_codes = {}
+        self.asn_labels = []
+        self.as_names = {}
+        self.category_codes = {dim: {} for dim in CATEGORY_COLUMNS}
+        self.category_labels = {dim: [] for dim in CATEGORY_COLUMNS}
+        self.category_counts = {dim: np.zeros((0, n), dtype=np.int64) for dim in CATEGORY_COLUMNS}
+
+    def _intern(self, code_map, label_list, counts, labels):
+        """Map a chunk's labels to codes shared across chunks, growing the count rows to fit"""
+        codes = np.empty(len(labels), dtype=np.int64)
+        for i, label in enumerate(labels):
+            if label not in code_map:
+                code_map[label] = len(label_list)
+                label_list.append(label)
+            codes[i] = code_map[label]
+        if len(label_list) > len(counts):
+            grown = np.zeros((max(len(label_list), 2 * len(counts)), len(self.names)), dtype=np.int64)
+            grown[:len(counts)] = counts
+            counts = grown
+        return codes, counts
+
+    def _global_codes(self, labels):
+        """Map a chunk's ASN labels to codes shared across chunks"""
+        codes, self.as_counts = self._intern(self.asn_codes, self.asn_labels, self.as_counts, labels)
+        return codes
+
+    def update(self, rows):
+        """Add one chunk of columns (from chunk_columns() or snapshot_columns())"""
+        if len(rows['ip']) == 0:
+            return
+        masks = np.column_stack([np.asarray(self.cohorts[name](rows), dtype=bool) for name in self.names])
+        pattern, membership = membership_patterns(masks)
+        self.totals += np.bincount(pattern, minlength=len(membership)) @ membership
+
+        # /8 and /16 analysis by shifting the packed addresses
+        valid = rows['ip_valid']
+        ips = rows['ip'][valid]
+        keys, counts = cohort_counts(ips >> 24, pattern[valid], membership, 1 << 8)
+        self.counts_8[keys] += counts
+        keys, counts = cohort_counts(ips >> 16, pattern[valid], membership, 1 << 16)
+        self.counts_16[keys] += counts
+
+        # AS analysis on integer codes
+        has_asn = rows['asn_codes'] >= 0
+        codes = self._global_codes(rows['asn_labels'])[rows['asn_codes'][has_asn]]
+        keys, counts = cohort_counts(codes, pattern[has_asn], membership, len(self.asn_labels))
+        self.as_counts[keys] += counts
+        self.as_names.update(rows['as_names'])
+
+        # Owner and country analysis on the chunk's dictionary codes
+        for dim, column in CATEGORY_COLUMNS.items():
+            if column not in rows:
+                continue
+            values = rows[column]
+            if not isinstance(values, pd.Categorical):
+                values = pd.Categorical(np.asarray(values, dtype=object))
+            chunk_codes = np.asarray(values.codes, dtype=np.int64)
+            labels = values.categories.to_numpy(dtype=object)
+            global_codes, self.category_counts[dim] = self._intern(
+                self.category_codes[dim], self.category_labels[dim], self.category_counts[dim], labels)
+            present = chunk_codes >= 0
+            present[present] = labels[chunk_codes[present]] != ''
+            keys, counts = cohort_counts(global_codes[chunk_codes[present]], pattern[present], membership,
+                                         len(self.category_labels[dim]))
+            self.category_counts[dim][keys] += counts
+
+    def distributions(self):
+        """Non-empty (keys, counts) per cohort for the '8', '16', 'as', 'rir', 'owner' and 'country' distributions"""
+        def nonzero(counts, i):
+            keys = np.flatnonzero(counts[:, i])
+            return keys, counts[keys, i]
+
+        rir_counts = self.count_matrix('rir')
+        return {name: {'8': nonzero(self.counts_8, i), '16': nonzero(self.counts_16, i),
+                       'as': nonzero(self.as_counts, i), 'rir': nonzero(rir_counts, i),
+                       **{dim: nonzero(counts, i) for dim, counts in self.category_counts.items()}}
+                for i, name in enumerate(self.names)}
+
+    def count_matrix(self, dim):
+        """Counts of every entity (rows, indexed by key) in every cohort (columns) for one dimension"""
+        if dim == '8':
+            return self.counts_8
+        if dim == '16':
+            return self.counts_16
+        if dim == 'as':
+            return self.as_counts[:len(self.asn_labels)]
+        if dim == 'rir':
+            return load_registry().rir_counts(self.counts_8)
+        return self.category_counts[dim][:len(self.category_labels[dim])]
+
+    def entity_labels(self, dim, keys):
+        """Labels of distribution keys: prefixes (e.g. 1.2.0.0/16), ASNs, RIRs, owners or countries"""
+        if dim in ('8', '16'):
+            return [format_prefix(k, int(dim)) for k in keys]
+        if dim == 'rir':
+            return [RIRS[k] for k in keys]
+        labels = self.asn_labels if dim == 'as' else self.category_labels[dim]
+        return [labels[k] for k in keys]
+
+    def metrics(self, dims=DIMENSIONS, lorenz_points=101):
+        """
+        Inequality metrics (see gini.metrics_many) of every cohort and dimension
+
+        All distributions are evaluated with one sort, so the report costs
+        about as much as the Gini coefficients alone.
+
+        Returns:
+            {cohort: {dimension: metrics}}
+        """
+        distributions = self.distributions()
+        metrics = metrics_many({(name, dim): distributions[name][dim][1] for name in self.names for dim in dims},
+                               lorenz_points=lorenz_points)
+        return {name: {dim: metrics[(name, dim)] for dim in dims} for name in self.names}
+
+    def results(self):
+        """Gini coefficients and top entities for every cohort"""
+        distributions = self.distributions()
+        asn_labels = np.asarray(self.asn_labels, dtype=object)
+
+        # Gini for every cohort and distribution in one vectorized call
+        ginis = gini_many({f"{name}/{dist}": dists[dist][1] for name, dists in distributions.items()
+                           for dist in ('8', '16', 'as')})
+
+        results = {}
+        for i, name in enumerate(self.names):
+            dists = distributions[name]
+            top_codes, top_counts = top_prefixes(*dists['as'], 5)
+            results[name] = {
+                'total_resolvers': int(self.totals[i]),
+                'gini_8': ginis[f"{name}/8"],
+                'gini_16': ginis[f"{name}/16"],
+                'gini_as': ginis[f"{name}/as"],
+                'unique_8_blocks': len(dists['8'][1]),
+                'unique_16_blocks': len(dists['16'][1]),
+                'unique_as': len(dists['as'][1]),
+                'top_8_blocks': top_blocks(*dists['8'], 8),
+                'top_16_blocks': top_blocks(*dists['16'], 16),
+                'top_as': [(asn, int(count), self.as_names.get(asn, 'Unknown'))
+                           for asn, count in zip(asn_labels[top_codes], top_counts)]
+            }
+        return results
+
+def aggregate_columns(rows, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Count every cohort's resolvers per /8, /16 and AS in a single pass over the columns"""
+    aggregator = CohortAggregator(cohorts)
+    with stages.stage('aggregate', rows=len(rows['ip'])):
+        aggregator.update(rows)
+    return aggregator
+
+def analyze_columns(rows, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Analyze every cohort's resolver distribution in a single pass over the columns"""
+    aggregator = aggregate_columns(rows, cohorts, stages)
+    with stages.stage('gini'):
+        return aggregator.results()
+
+def stream_resolvers(backend, cohorts=('all', 'dnssec'), chunk_size=50000, where="ip IS NOT NULL",
+                     stages=NO_STAGES):
+    """
+    Feed the resolver table through a CohortAggregator in fetchmany() chunks
+
+    Uses an unbuffered server-side cursor, so memory stays bounded by the
+    chunk size and the number of distinct ASes rather than the row count.
+    """
+    aggregator = CohortAggregator(cohorts)
+    with stages.stage('stream', rows=0) as record:
+        for chunk in backend.iter_chunks(RESOLVER_QUERY.format(where=where), chunk_size):
+            aggregator.update(chunk_columns(chunk))
+            record['rows'] = record.get('rows', 0) + len(chunk)
+    return aggregator
+
+def aggregate_resolvers(cursor, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Count resolvers for several cohorts with one query"""
+    with stages.stage('fetch') as record:
+        rows = fetch_resolvers(cursor)
+        record['rows'] = len(rows['ip'])
+    return aggregate_columns(rows, cohorts, stages)
+
+def aggregate_snapshot(snapshot, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Count resolvers for several cohorts from a local snapshot"""
+    with stages.stage('fetch', rows=len(snapshot)):
+        rows = snapshot_columns(snapshot)
+    return aggregate_columns(rows, cohorts, stages)
+
+def analyze_resolvers(cursor, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Analyze resolver distributions for several cohorts with one query"""
+    aggregator = aggregate_resolvers(cursor, cohorts, stages)
+    with stages.stage('gini'):
+        return aggregator.results()
+
+def analyze_snapshot(snapshot, cohorts=('all', 'dnssec'), stages=NO_STAGES):
+    """Analyze resolver distributions for several cohorts from a local snapshot"""
+    aggregator = aggregate_snapshot(snapshot, cohorts, stages)
+    with stages.stage('gini'):
+        return aggregator.results()
+
+METRIC_LABELS = {'8': "/8 Address Spaces", '16': "/16 Address Spaces", 'as': "Autonomous Systems",
+                 'rir': "Regional Internet Registries", 'owner': "Owners", 'country': "Countries"}
+METRIC_FIELDS = [('entities', 'Entities', ',d'), ('gini', 'Gini', '.4f'), ('hhi', 'HHI', '.4f'),
+                 ('theil', 'Theil', '.4f'), ('top_1_share', 'Top-1 share', '.1%'), ('top_5_share', 'Top-5 share', '.1%'),
+                 ('top_10_share', 'Top-10 share', '.1%'), ('nakamoto', 'Entities to 50%', ',d')]
+
+def print_metrics(metrics):
+    """Print the inequality metrics of every dimension side by side for all cohorts"""
+    names = list(metrics)
+    for dim in next(iter(metrics.values())):
+        print(f"\n📐 INEQUALITY METRICS: {METRIC_LABELS.get(dim, dim).upper()}")
+        print("-" * 50)
+        print(f"{'Metric':<25}" + "".join(f" {name:>14}" for name in names))
+        print("-" * (25 + 15 * len(names)))
+        for key, label, fmt in METRIC_FIELDS:
+            print(f"{label:<25}" + "".join(f" {metrics[name][dim][key]:>14{fmt}}" for name in names))
+
+def print_uncertainty(uncertainty):
+    """Print bootstrap intervals and permutation p-values of the DNSSEC vs all Gini coefficients"""
+    first = next(iter(uncertainty.values()))
+    print(f"\n🎲 UNCERTAINTY ({first['confidence']:.0%} bootstrap intervals, {first['resamples']:,} resamples)")
+    print("-" * 119)
+    print(f"{'Metric':<10} {'All Resolvers':<24} {'DNSSEC Only':<24} {'Difference':<24} {'Random subset':<24} {'p':>8}")
+    print("-" * 119)
+
+    def cell(entry):
+        low, high = entry['interval']
+        return f"{entry['gini']:.3f} [{low:.3f}, {high:.3f}]"
+
+    for dim, label in (('8', 'Gini /8'), ('16', 'Gini /16'), ('as', 'Gini AS')):
+        entry = uncertainty[dim]
+        print(f"{label:<10} {cell(entry['all']):<24} {cell(entry['dnssec']):<24} {cell(entry['difference']):<24} "
+              f"{cell(entry['random_subset']):<24} {entry['p_value']:>8.4f}")
+    print("Random subset: Gini of random resolver samples as large as the DNSSEC cohort; "
+          "p tests whether DNSSEC resolvers differ from such a sample")
+
+def print_comparison(all_results, dnssec_results, uncertainty=None):
+    """Print comparison between all resolvers and DNSSEC resolvers (plus compare_cohorts() intervals, if given)"""
     print("="*80)
     print("DNS RESOLVER DISTRIBUTION: ALL vs DNSSEC-ENABLED")
     print("="*80)
@@ -102,30 +464,65 @@ def print_comparison(all_results, dnssec_results):
             dnssec_pct = (dnssec_count / all_count * 100) if all_count > 0 else 0
             print(f"{i:<5} {entity_name:<25} {all_count:>11,} {dnssec_count:>14,} {dnssec_pct:>9.1f}%")
 
+    if uncertainty:
+        print_uncertainty(uncertainty)
+
 def main():
-    # Database config - update these
-    config = {
-        'host': 'localhost',
-        'user': 'pink',
-        'password': 'passw',
-        'database': 'dns_servers'
-    }
+    parser = argparse.ArgumentParser(description="Compare all vs DNSSEC-enabled resolver distributions")
+    parser.add_argument('--db', help="Storage URL: mysql://..., sqlite:///file.db or parquet:///dir (default: $DNS_DB_URL)")
+    parser.add_argument('--cache', action='store_true', help="Read from the local columnar snapshot (built on first use)")
+    parser.add_argument('--refresh-cache', action='store_true', help="Rebuild the snapshot before analyzing")
+    parser.add_argument('--ips', help="Analyze a binary .ips file (see ipfile.py) instead of the database")
+    parser.add_argument('--stream', action='store_true', help="Stream rows in chunks with bounded memory")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per fetchmany() chunk in --stream mode")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help="Add bootstrap intervals and a permutation test from N resamples (e.g. 10000)")
+    parser.add_argument('--confidence', type=float, default=0.95, help="Bootstrap interval confidence level")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for --bootstrap")
+    parser.add_argument('--workers', type=int, default=None, help="Resampling processes (default: CPU count)")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Also print HHI, Theil, top-k shares and entities-to-50%% for /8, /16, AS, RIR, owner and country")
+    parser.add_argument('--exclude-bogons', action='store_true',
+                        help="Drop resolvers in reserved or special-purpose address space before analyzing")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    stages = from_arguments(args, 'gini_resolvers')
 
-    conn = mysql.connector.connect(**config)
-    cursor = conn.cursor()
+    backend = None if args.ips else get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG))
 
     print("🔍 Analyzing DNS resolver distributions...")
 
-    # Analyze all resolvers
-    print("Analyzing all DNS resolvers...")
-    all_results = analyze_resolvers(cursor)
+    # All and DNSSEC-enabled resolvers in one scan
+    print("Analyzing all and DNSSEC-enabled DNS resolvers...")
+    cohorts = without_bogons(('all', 'dnssec')) if args.exclude_bogons else ('all', 'dnssec')
+    if args.ips:
+        aggregator = aggregate_snapshot(open_snapshot(args.ips), cohorts, stages=stages)
+    elif args.cache or args.refresh_cache:
+        snapshot = SnapshotCache().get(backend, refresh=args.refresh_cache)
+        aggregator = aggregate_snapshot(snapshot, cohorts, stages=stages)
+    elif args.stream:
+        aggregator = stream_resolvers(backend, cohorts, chunk_size=args.chunk_size, stages=stages)
+    else:
+        cursor = backend.cursor()
+        aggregator = aggregate_resolvers(cursor, cohorts, stages=stages)
+        cursor.close()
+    with stages.stage('gini'):
+        results = aggregator.results()
+    all_results, dnssec_results = results['all'], results['dnssec']
 
-    # Analyze DNSSEC-enabled resolvers
-    print("Analyzing DNSSEC-enabled resolvers...")
-    dnssec_results = analyze_resolvers(cursor, "AND dnssec_support = 1")
+    # Bootstrap intervals and permutation test over the bucket counts
+    uncertainty = None
+    if args.bootstrap:
+        with stages.stage('bootstrap'):
+            uncertainty = compare_cohorts(aggregator.distributions(), n_resamples=args.bootstrap,
+                                          confidence=args.confidence, seed=args.seed, workers=args.workers)
 
     # Print comparison
-    print_comparison(all_results, dnssec_results)
+    print_comparison(all_results, dnssec_results, uncertainty)
+    if args.metrics:
+        with stages.stage('metrics'):
+            metrics = aggregator.metrics()
+        print_metrics(metrics)
 
     # DNSSEC adoption insights
     dnssec_rate = dnssec_results['total_resolvers'] / all_results['total_resolvers'] * 100
@@ -137,8 +534,13 @@ def main():
         print("DNSSEC resolvers are MORE concentrated by AS than general population")
     else:
         print("DNSSEC resolvers are LESS concentrated by AS than general population")
+    if uncertainty:
+        p_value = uncertainty['as']['p_value']
+        verdict = "significant" if p_value < 1 - args.confidence else "not significant"
+        print(f"  ...compared with random samples of the same size: p = {p_value:.4f} ({verdict})")
 
-    conn.close()
+    if backend is not None:
+        backend.close()
 
 if __name__ == "__main__":
     main()
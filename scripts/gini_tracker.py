@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained Gini coefficient for live scans
+
+Keeps the concentration of DNSSEC-capable resolvers by AS and by /16 current
+while dns_scan.sh is running, instead of re-running
+DNSGiniCalculator.run_analysis() from scratch.
+
+For buckets sorted by count x_(1) <= ... <= x_(n) the Gini coefficient is
+
+    G = 2 * sum(i * x_(i)) / (n * S) - (n + 1) / n
+
+Adding one resolver to a bucket with count c moves it past every other
+bucket with count c, so sum(i * x_(i)) grows by the number of buckets with
+count <= c. A Fenwick tree over count values answers that in O(log max count),
+and the same tree gives order statistics for top-k entities and Lorenz points.
+
+Usage:
+    python3 gini_tracker.py follow RESULTS_TSV|- [--state tracker.json] [--every 1000] [--all]
+    python3 gini_tracker.py show [--state tracker.json] [--top 5] [--lorenz 10]
+
+Requires: pip install numpy
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ipv4 import parse_ipv4, prefix_octets
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'db_exports',
+                                  'gini_tracker_state.json')
+
+
+class FenwickTree:
+    """Binary indexed tree over positions 1..size with prefix sums and order statistics"""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_values(cls, values: List[int]) -> 'FenwickTree':
+        """Build in O(size) from values for positions 1..len(values)"""
+        fenwick = cls(len(values))
+        tree = fenwick.tree
+        for i, value in enumerate(values, 1):
+            tree[i] += value
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, position: int, delta: int):
+        while position <= self.size:
+            self.tree[position] += delta
+            position += position & -position
+
+    def prefix(self, position: int) -> int:
+        """Sum of positions 1..position"""
+        position = min(position, self.size)
+        total = 0
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+    def find(self, order: int) -> int:
+        """Smallest position whose prefix sum reaches order (size + 1 if none)"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < order:
+                position = nxt
+                order -= self.tree[nxt]
+            step >>= 1
+        return position + 1
+
+
+class IncrementalGini:
+    """Gini coefficient, top-k and Lorenz curve of per-key counts under +/-1 updates"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.members: Dict[int, set] = {}  # count value -> keys with that count
+        self.n = 0          # Non-empty buckets
+        self.total = 0      # Sum of all counts
+        self.weighted = 0   # Sum of rank * count over buckets sorted ascending
+        self._buckets = FenwickTree()   # Buckets per count value
+        self._mass = FenwickTree()      # Count mass per count value
+
+    def _grow(self, count: int):
+        """Double the Fenwick trees until they cover count"""
+        size = self._buckets.size
+        while size < count:
+            size *= 2
+        freq = [0] * size
+        for value, keys in self.members.items():
+            freq[value - 1] = len(keys)
+        self._buckets = FenwickTree.from_values(freq)
+        self._mass = FenwickTree.from_values([(i + 1) * f for i, f in enumerate(freq)])
+
+    def _move(self, key: str, old: int, new: int):
+        """Update the per-count bookkeeping for a bucket going from old to new"""
+        if new > self._buckets.size:
+            self._grow(new)
+        if old:
+            self.members[old].discard(key)
+            if not self.members[old]:
+                del self.members[old]
+            self._buckets.add(old, -1)
+            self._mass.add(old, -old)
+        if new:
+            self.members.setdefault(new, set()).add(key)
+            self._buckets.add(new, 1)
+            self._mass.add(new, new)
+            self.counts[key] = new
+        else:
+            del self.counts[key]
+
+    def increment(self, key: str):
+        """Add one to a bucket in O(log max count)"""
+        old = self.counts.get(key, 0)
+        if old == 0:
+            # A new bucket enters at rank 1 and pushes every other bucket up one rank
+            self.n += 1
+            self.weighted += self.total
+        # It then moves past every bucket with the same count before growing
+        self.weighted += self._buckets.prefix(old) + (1 if old == 0 else 0)
+        self.total += 1
+        self._move(key, old, old + 1)
+
+    def decrement(self, key: str):
+        """Remove one from a bucket in O(log max count)"""
+        old = self.counts.get(key, 0)
+        if old == 0:
+            raise KeyError(key)
+        # The bucket moves in front of every bucket with the same count before shrinking
+        self.weighted -= self._buckets.prefix(old - 1) + 1
+        self.total -= 1
+        self._move(key, old, old - 1)
+        if old == 1:
+            # An empty bucket at rank 1 leaves and every other bucket moves down one rank
+            self.n -= 1
+            self.weighted -= self.total
+
+    def gini(self) -> float:
+        """Current Gini coefficient (same definition as gini.gini)"""
+        if self.n <= 1 or self.total == 0:
+            return 0.0
+        result = (2 * self.weighted) / (self.n * self.total) - (self.n + 1) / self.n
+        return float(min(1.0, max(0.0, result)))
+
+    def top(self, k: int = 5) -> List[Tuple[str, int]]:
+        """
+        The k largest buckets (descending count, ties by key)
+
+        Count levels come from the Fenwick tree in O(log max count) each. Only
+        the level that crosses k is cut, by partitioning its keys around the
+        ones still needed (linear in the level), so flat distributions with
+        huge tie sets are never fully sorted.
+        """
+        result = []
+        remaining = self.n
+        while remaining > 0 and len(result) < k:
+            count = self._buckets.find(remaining)
+            members = self.members[count]
+            need = k - len(result)
+            if len(members) > need:
+                keys = np.array(list(members))
+                keys = keys[np.argpartition(keys, need - 1)[:need]]
+            else:
+                keys = list(members)
+            result.extend((str(key), count) for key in sorted(keys))
+            remaining -= len(members)
+        return result
+
+    def bottom_mass(self, m: int) -> int:
+        """Sum of the m smallest bucket counts"""
+        if m <= 0:
+            return 0
+        count = self._buckets.find(m)
+        below = self._buckets.prefix(count - 1)
+        return self._mass.prefix(count - 1) + (m - below) * count
+
+    def lorenz(self, points: int = 10) -> List[Tuple[float, float]]:
+        """Lorenz curve as (population share, resolver share) at points + 1 evenly spaced quantiles"""
+        if self.n == 0:
+            return [(0.0, 0.0), (1.0, 1.0)]
+        curve = []
+        for j in range(points + 1):
+            m = round(j * self.n / points)
+            curve.append((m / self.n, self.bottom_mass(m) / self.total))
+        return curve
+
+    def to_dict(self) -> Dict:
+        return {'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'IncrementalGini':
+        """Rebuild the tracker from saved bucket counts"""
+        tracker = cls()
+        counts = {key: int(c) for key, c in state.get('counts', {}).items() if int(c) > 0}
+        values = np.sort(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+
+        tracker.counts = counts
+        for key, count in counts.items():
+            tracker.members.setdefault(count, set()).add(key)
+        tracker.n = len(values)
+        tracker.total = int(values.sum())
+        tracker.weighted = int(np.dot(np.arange(1, len(values) + 1, dtype=np.int64), values))
+        tracker._grow(int(values[-1]) if len(values) else 1)
+        return tracker
+
+
+class ConcentrationTracker:
+    """Live AS and /16 concentration of (DNSSEC-capable) resolvers from scan result rows"""
+
+    DIMENSIONS = ('as', '16')
+
+    def __init__(self, dnssec_only: bool = True):
+        self.dnssec_only = dnssec_only
+        self.trackers = {dimension: IncrementalGini() for dimension in self.DIMENSIONS}
+        self.assigned: Dict[str, Tuple[str, str]] = {}  # ip -> (asn, /16) it is counted under
+        self.rows = 0
+
+    def _keys(self, row: Dict) -> Optional[Tuple[str, str]]:
+        """Bucket keys a result row contributes to, or None if it is not tracked"""
+        if self.dnssec_only and str(row.get('dnssec_support', '0')).strip() != '1':
+            return None
+        ips, valid = parse_ipv4([row.get('ip', '')])
+        if not valid[0]:
+            return None
+        asn = (row.get('asn') or '').strip()
+        return (asn if asn and asn != 'Unknown' else ''), prefix_octets(int(ips[0]) >> 16, 16)
+
+    def update(self, row: Dict):
+        """
+        Apply one scan result
+
+        Rows are upserts keyed by IP: a re-scanned resolver first leaves the
+        buckets it was counted in, so resumed or repeated scans do not double count.
+        """
+        self.rows += 1
+        ip = (row.get('ip') or '').strip()
+        new = self._keys(row)
+        old = self.assigned.pop(ip, None)
+        if old == new:
+            if new is not None:
+                self.assigned[ip] = new
+            return
+        if old is not None:
+            for dimension, key in zip(self.DIMENSIONS, old):
+                if key:
+                    self.trackers[dimension].decrement(key)
+        if new is not None:
+            for dimension, key in zip(self.DIMENSIONS, new):
+                if key:
+                    self.trackers[dimension].increment(key)
+            self.assigned[ip] = new
+
+    def summary(self) -> str:
+        """One dashboard line"""
+        return (f"rows={self.rows:,} resolvers={len(self.assigned):,} "
+                f"gini_as={self.trackers['as'].gini():.4f} (n={self.trackers['as'].n:,}) "
+                f"gini_16={self.trackers['16'].gini():.4f} (n={self.trackers['16'].n:,})")
+
+    def to_dict(self) -> Dict:
+        ips = list(self.assigned)
+        return {
+            'rows': self.rows,
+            'dnssec_only': self.dnssec_only,
+            'ips': ips,
+            'asns': [self.assigned[ip][0] for ip in ips],
+            'prefixes': [self.assigned[ip][1] for ip in ips],
+            'trackers': {dimension: tracker.to_dict() for dimension, tracker in self.trackers.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'ConcentrationTracker':
+        tracker = cls(dnssec_only=state.get('dnssec_only', True))
+        tracker.rows = state.get('rows', 0)
+        tracker.assigned = dict(zip(state['ips'], zip(state['asns'], state['prefixes'])))
+        tracker.trackers = {dimension: IncrementalGini.from_dict(state['trackers'][dimension])
+                            for dimension in cls.DIMENSIONS}
+        return tracker
+
+    def save(self, path: str):
+        """Write the state atomically so a restarted scan can resume"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, dnssec_only: bool = True) -> 'ConcentrationTracker':
+        """Resume from a saved state, or start fresh if there is none"""
+        if not os.path.exists(path):
+            return cls(dnssec_only)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def read_results(f) -> Iterable[Dict]:
+    """Scan result rows from the tab separated stream dns_scan.sh writes (with header)"""
+    header = None
+    for line in f:
+        fields = line.rstrip('\n').split('\t')
+        if header is None:
+            header = fields
+            continue
+        yield dict(zip(header, fields))
+
+
+def print_state(tracker: ConcentrationTracker, top: int = 5, lorenz: int = 10):
+    """Print Gini, top entities and Lorenz points for both dimensions"""
+    print(tracker.summary())
+    for dimension, label in (('as', 'Autonomous Systems'), ('16', '/16 Address Spaces')):
+        gini = tracker.trackers[dimension]
+        print(f"\n📊 {label.upper()}  Gini: {gini.gini():.4f}")
+        for i, (key, count) in enumerate(gini.top(top), 1):
+            share = count / gini.total * 100 if gini.total else 0.0
+            print(f"  {i}. {key}: {count:,} resolvers ({share:.1f}%)")
+        points = ', '.join(f"{p:.2f}:{s:.3f}" for p, s in gini.lorenz(lorenz))
+        print(f"  Lorenz: {points}")
+
+
+def main():
+    """Follow a live scan or show the saved tracker state"""
+    parser = argparse.ArgumentParser(description="Incremental Gini tracker for live scans")
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH, help="State file to resume from and save to")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    follow = sub.add_parser('follow', help="Update the tracker from scan result rows")
+    follow.add_argument('results_file', help="Tab separated results with header ('-' for stdin)")
+    follow.add_argument('--every', type=int, default=1000, help="Print and save every N rows")
+    follow.add_argument('--all', action='store_true',
+                        help="Track all resolvers, not just DNSSEC-capable ones (must match a resumed state)")
+    follow.add_argument('--reset', action='store_true', help="Ignore any saved state")
+
+    show = sub.add_parser('show', help="Print the saved tracker state")
+    show.add_argument('--top', type=int, default=5)
+    show.add_argument('--lorenz', type=int, default=10, help="Number of Lorenz curve intervals")
+
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print_state(ConcentrationTracker.load(args.state), args.top, args.lorenz)
+        return
+
+    if args.reset or not os.path.exists(args.state):
+        tracker = ConcentrationTracker(dnssec_only=not args.all)
+    else:
+        tracker = ConcentrationTracker.load(args.state)
+        if tracker.dnssec_only == args.all:
+            saved = 'DNSSEC-capable' if tracker.dnssec_only else 'all'
+            parser.error(f"{args.state} tracks {saved} resolvers; pass --reset to start over "
+                         f"{'with' if args.all else 'without'} --all")
+        print(f"✓ Resumed tracker: {tracker.summary()}", file=sys.stderr)
+
+    f = sys.stdin if args.results_file == '-' else open(args.results_file)
+    try:
+        for row in read_results(f):
+            tracker.update(row)
+            if tracker.rows % args.every == 0:
+                print(tracker.summary(), file=sys.stderr)
+                tracker.save(args.state)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+        tracker.save(args.state)
+
+    print(tracker.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
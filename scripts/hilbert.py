@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Vectorized IPv4 Hilbert curve mapping and density rasters
+
+Maps uint32 addresses onto a Hilbert curve with whole-array bit operations
+instead of one HilbertCurve.coordinates_from_distance() call per IP. The
+orientation is identical to the hilbertcurve package (Skilling's transpose
+algorithm), so maps stay comparable with the ones already in data/plots.
+
+A map at level L (an even prefix length) has one pixel per /L block and a
+side of 2^(L/2) pixels, e.g. level 24 -> 4096 x 4096 pixels of /24 blocks.
+Addresses are first counted per /L block with a chunked bincount, and only
+the occupied blocks are mapped to (x, y), so memory is bounded by the raster
+size rather than the number of addresses.
+
+For overlays of several IP sets, full-resolution coordinates of each input
+file are cached on disk under the SHA-1 of its contents, so re-rendering with
+new styling never repeats the curve mapping.
+
+Requires: pip install numpy matplotlib
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+from itertools import islice
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from ipfile import is_ip_file, read_ips
+from ipv4 import parse_ipv4
+
+MAX_RASTER_LEVEL = 26  # 8192 x 8192 pixels
+DEFAULT_CACHE_DIR = os.environ.get('HILBERT_CACHE_DIR', os.path.expanduser('~/.cache/hilbert_coordinates'))
+
+
+def _check_level(level: int):
+    if level % 2 or not 2 <= level <= 32:
+        raise ValueError(f"Hilbert map level must be an even prefix length between 2 and 32, got {level}")
+
+
+def _compact_bits(v: np.ndarray) -> np.ndarray:
+    """Gather the even bits of each uint32 into its low 16 bits"""
+    v = v & np.uint32(0x55555555)
+    v = (v | (v >> np.uint32(1))) & np.uint32(0x33333333)
+    v = (v | (v >> np.uint32(2))) & np.uint32(0x0F0F0F0F)
+    v = (v | (v >> np.uint32(4))) & np.uint32(0x00FF00FF)
+    v = (v | (v >> np.uint32(8))) & np.uint32(0x0000FFFF)
+    return v
+
+
+def _d2xy_bitwise(d, order: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Skilling's transpose-to-axes algorithm with every branch turned into bit masks"""
+    d = np.asarray(d, dtype=np.uint32)
+
+    # De-interleave into Skilling's transposed form
+    x = _compact_bits(d >> np.uint32(1))
+    y = _compact_bits(d)
+
+    # Gray decode
+    t = y >> np.uint32(1)
+    y = y ^ x
+    x = x ^ t
+
+    # Undo excess work, one bit level at a time. Branches become masks:
+    # all-ones where the level bit is set (invert the low bits of x),
+    # zero where it is not (exchange the low bits of x and y)
+    zero = np.uint32(0)
+    for level in range(1, order):
+        low = np.uint32((1 << level) - 1)
+        shift = np.uint32(level)
+
+        invert = zero - ((y >> shift) & np.uint32(1))
+        t = (x ^ y) & low & ~invert
+        x ^= (low & invert) ^ t
+        y ^= t
+
+        invert = zero - ((x >> shift) & np.uint32(1))
+        x ^= low & invert
+
+    return x, y
+
+
+@lru_cache(maxsize=None)
+def _base_curve(order: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(x, y) of every distance on an order-`order` curve"""
+    return _d2xy_bitwise(np.arange(1 << (2 * order), dtype=np.uint32), order)
+
+
+@lru_cache(maxsize=None)
+def _block_table(order: int, low_order: int):
+    """
+    Placement of every 2^low_order sub-square of an order-`order` curve
+
+    Each sub-square holds a copy of the base curve of order low_order under one
+    of the 8 symmetries of the square. The symmetry is identified from where the
+    sub-curve starts and ends.
+
+    Returns:
+        (origin x, origin y, swap axes, flip x, flip y) per high part of the distance
+    """
+    side = 1 << low_order
+    corner = np.uint32(side - 1)
+    highs = np.arange(1 << (2 * (order - low_order)), dtype=np.uint32) << np.uint32(2 * low_order)
+    start_x, start_y = _d2xy_bitwise(highs, order)
+    end_x, end_y = _d2xy_bitwise(highs + np.uint32(side * side - 1), order)
+    origin_x, origin_y = start_x & ~corner, start_y & ~corner
+
+    base_x, base_y = _base_curve(low_order)
+    swap = np.zeros(highs.size, dtype=bool)
+    flip_x = np.zeros(highs.size, dtype=bool)
+    flip_y = np.zeros(highs.size, dtype=bool)
+    for sw in (False, True):
+        for fx in (False, True):
+            for fy in (False, True):
+                def transform(u, v):
+                    u, v = (v, u) if sw else (u, v)
+                    return (corner - u if fx else u), (corner - v if fy else v)
+                sx, sy = transform(base_x[0], base_y[0])
+                ex, ey = transform(base_x[-1], base_y[-1])
+                match = ((start_x - origin_x == sx) & (start_y - origin_y == sy)
+                         & (end_x - origin_x == ex) & (end_y - origin_y == ey))
+                swap[match], flip_x[match], flip_y[match] = sw, fx, fy
+
+    return origin_x, origin_y, swap, flip_x, flip_y
+
+
+def hilbert_d2xy(d, order: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Map Hilbert distances to (x, y) on a 2^order x 2^order grid
+
+    Large orders are split into a high and a low half: the low half is a
+    table lookup into a small base curve and the high half selects where
+    (and under which symmetry) that base curve is placed.
+
+    Args:
+        d: Distances along the curve (array of integers < 4^order)
+        order: Curve order (bits per coordinate, at most 16)
+
+    Returns:
+        (x, y) uint32 arrays, equal to HilbertCurve(order, 2).coordinates_from_distance(d)
+    """
+    d = np.asarray(d, dtype=np.uint32)
+    if order <= 4:
+        return _d2xy_bitwise(d, order)
+
+    low_order = (order + 1) // 2
+    origin_x, origin_y, swap, flip_x, flip_y = _block_table(order, low_order)
+    base_x, base_y = _base_curve(low_order)
+
+    high = d >> np.uint32(2 * low_order)
+    low = d & np.uint32((1 << (2 * low_order)) - 1)
+    u, v = base_x[low], base_y[low]
+
+    swapped = swap[high]
+    u, v = np.where(swapped, v, u), np.where(swapped, u, v)
+    corner = np.uint32((1 << low_order) - 1)
+    u ^= corner * flip_x[high].astype(np.uint32)
+    v ^= corner * flip_y[high].astype(np.uint32)
+    return origin_x[high] + u, origin_y[high] + v
+
+
+def ip_to_xy(ips, level: int = 32) -> Tuple[np.ndarray, np.ndarray]:
+    """Map uint32 IPs to pixel coordinates of a level-L Hilbert map"""
+    _check_level(level)
+    ips = np.asarray(ips, dtype=np.uint32)
+    return hilbert_d2xy(ips >> np.uint32(32 - level), level // 2)
+
+
+def iter_ip_chunks(path: str, chunk_size: int = 1 << 22) -> Iterator[np.ndarray]:
+    """Read a one-IP-per-line text file (skipping invalid lines) or a binary .ips file as uint32 chunks"""
+    if is_ip_file(path):
+        ips = read_ips(path)
+        for start in range(0, ips.size, chunk_size):
+            yield ips[start:start + chunk_size]
+        return
+    with open(path) as f:
+        while True:
+            lines = [line.strip() for line in islice(f, chunk_size)]
+            if not lines:
+                break
+            ips, valid = parse_ipv4(lines)
+            yield ips[valid]
+
+
+def block_counts(chunks, level: int) -> np.ndarray:
+    """Count addresses per /level block over an iterable of uint32 chunks"""
+    _check_level(level)
+    counts = np.zeros(1 << level, dtype=np.uint32)
+    shift = np.uint32(32 - level)
+    for ips in chunks:
+        ips = np.asarray(ips, dtype=np.uint32)
+        if ips.size:
+            counts += np.bincount(ips >> shift, minlength=counts.size).astype(np.uint32)
+    return counts
+
+
+def blocks_to_raster(counts: np.ndarray, level: int) -> np.ndarray:
+    """Lay out per-block counts (indexed by /level prefix) on the Hilbert curve as a 2-D raster"""
+    side = 1 << (level // 2)
+    raster = np.zeros((side, side), dtype=counts.dtype)
+    occupied = np.flatnonzero(counts)
+    x, y = hilbert_d2xy(occupied, level // 2)
+    raster[y, x] = counts[occupied]
+    return raster
+
+
+def density_raster(ips, level: int = 24, chunk_size: int = 1 << 24) -> np.ndarray:
+    """
+    Density raster of addresses on a level-L Hilbert map
+
+    Args:
+        ips: uint32 array, or an iterable of uint32 chunks (e.g. iter_ip_chunks())
+        level: Even prefix length; the raster has 2^(L/2) x 2^(L/2) pixels
+        chunk_size: Addresses per bincount when ips is a single array
+
+    Returns:
+        uint32 array indexed [y, x] with the number of addresses per pixel
+    """
+    _check_level(level)
+    if level > MAX_RASTER_LEVEL:
+        raise ValueError(f"Rasters above level {MAX_RASTER_LEVEL} do not fit in memory; use ip_to_xy() for points")
+    if isinstance(ips, np.ndarray):
+        addresses = ips
+        ips = (addresses[i:i + chunk_size] for i in range(0, len(addresses), chunk_size))
+    return blocks_to_raster(block_counts(ips, level), level)
+
+
+def downsample(raster: np.ndarray) -> np.ndarray:
+    """
+    Halve a Hilbert raster's resolution by summing 2x2 blocks
+
+    The four /L blocks of a /(L-2) block always form an aligned 2x2 square,
+    so this yields exactly the level L-2 raster.
+    """
+    side = raster.shape[0] // 2
+    return raster.reshape(side, 2, side, 2).sum(axis=(1, 3), dtype=np.uint64)
+
+
+def build_pyramid(raster: np.ndarray, level: int, levels) -> dict:
+    """
+    Derive rasters for every requested level from the finest one
+
+    Args:
+        raster: Density raster at `level`
+        level: Level of the raster
+        levels: Even levels <= level to produce
+
+    Returns:
+        Mapping of level -> raster
+    """
+    levels = sorted(set(levels), reverse=True)
+    if levels and levels[0] > level:
+        raise ValueError(f"Cannot derive level {levels[0]} from a level {level} raster")
+    pyramid = {}
+    current, current_level = raster, level
+    for target in levels:
+        _check_level(target)
+        while current_level > target:
+            current, current_level = downsample(current), current_level - 2
+        pyramid[target] = current
+    return pyramid
+
+
+def iter_tiles(raster: np.ndarray, tile_size: int = 1024) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """Yield (row, column, tile) squares of a raster, row 0 at the bottom like the rendered map"""
+    side = raster.shape[0]
+    for row in range(0, side, tile_size):
+        for column in range(0, side, tile_size):
+            yield row // tile_size, column // tile_size, raster[row:row + tile_size, column:column + tile_size]
+
+
+def prefix8_positions(level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pixel centre of every /8 block (indexed by first octet) on a level-L map"""
+    _check_level(level)
+    if level < 8:
+        raise ValueError("/8 labels need a map of level 8 or finer")
+    side = 1 << ((level - 8) // 2)
+    x, y = hilbert_d2xy(np.arange(256), 4)
+    return x * side + (side - 1) / 2, y * side + (side - 1) / 2
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_coordinates(path: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Full-resolution (level 32) Hilbert coordinates of every IP in a file
+
+    The (x, y) pairs are stored as a uint16 array named after the SHA-1 of the
+    file contents, so re-rendering an unchanged file skips both parsing and
+    the curve mapping; a changed file simply gets a new cache entry.
+    Coordinates at a coarser level L are these shifted right by 16 - L/2.
+    """
+    cache_path = os.path.join(cache_dir, f"{file_digest(path)}.npy") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        coords = np.load(cache_path, mmap_mode='r')
+        return coords[:, 0], coords[:, 1]
+
+    parts = [np.stack(ip_to_xy(ips, 32), axis=1).astype(np.uint16) for ips in iter_ip_chunks(path)]
+    coords = np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.uint16)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, coords)
+        os.replace(tmp, cache_path)
+    return coords[:, 0], coords[:, 1]
+
+
+def coordinates_raster(x: np.ndarray, y: np.ndarray, level: int = 24, chunk_size: int = 1 << 24) -> np.ndarray:
+    """Density raster at `level` from full-resolution coordinates"""
+    _check_level(level)
+    if level > MAX_RASTER_LEVEL:
+        raise ValueError(f"Rasters above level {MAX_RASTER_LEVEL} do not fit in memory")
+    shift = np.uint32(16 - level // 2)
+    side = 1 << (level // 2)
+    counts = np.zeros(side * side, dtype=np.uint32)
+    for i in range(0, len(x), chunk_size):
+        cx = np.asarray(x[i:i + chunk_size], dtype=np.uint32) >> shift
+        cy = np.asarray(y[i:i + chunk_size], dtype=np.uint32) >> shift
+        counts += np.bincount(cy * np.uint32(side) + cx, minlength=counts.size).astype(np.uint32)
+    return counts.reshape(side, side)
+
+
+def composite_channels(rasters) -> np.ndarray:
+    """
+    Stack up to three rasters as the red, green and blue channels of one image
+
+    Each channel is log-scaled to its own maximum (with a floor for occupied
+    pixels) so sparse and dense sets stay visible together; pixels empty in every set are transparent.
+    """
+    if not 1 <= len(rasters) <= 3:
+        raise ValueError("Channel composites take one to three datasets")
+    side = rasters[0].shape[0]
+    image = np.zeros((side, side, 4), dtype=np.float32)
+    for channel, raster in enumerate(rasters):
+        scaled = np.log1p(raster.astype(np.float32))
+        scaled /= max(float(scaled.max()), 1e-9)
+        image[..., channel] = np.where(raster > 0, 0.35 + 0.65 * scaled, 0)  # Any presence stays visible
+    image[..., 3] = np.any([raster > 0 for raster in rasters], axis=0)
+    return image
+
+
+def difference_map(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Per-pixel share of dataset a minus share of dataset b (NaN where both are empty)"""
+    share_a = a / max(float(a.sum()), 1.0)
+    share_b = b / max(float(b.sum()), 1.0)
+    diff = share_a - share_b
+    diff[(a == 0) & (b == 0)] = np.nan
+    return diff
+
+
+def render_overlay(rasters, names, output_path: Optional[str] = None, mode: str = 'channels', title: str = '',
+                   dpi: int = 300, show: bool = False, level: Optional[int] = None, labels: bool = False):
+    """Render several datasets in one image, as colour channels or as a difference map of two"""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import TwoSlopeNorm
+    from matplotlib.patches import Patch
+
+    fig, ax = plt.subplots(figsize=(10, 10))
+    if mode == 'channels':
+        ax.imshow(composite_channels(rasters), origin='lower', interpolation='nearest')
+        colours = ['red', 'green', 'blue']
+        ax.legend(handles=[Patch(color=colours[i], label=name) for i, name in enumerate(names)],
+                  loc='upper left', bbox_to_anchor=(1.01, 1))
+    elif mode == 'difference':
+        if len(rasters) != 2:
+            raise ValueError("Difference maps take exactly two datasets")
+        diff = difference_map(*rasters)
+        limit = max(float(np.nanmax(np.abs(diff))) if np.isfinite(diff).any() else 0.0, 1e-12)
+        image = ax.imshow(np.ma.masked_invalid(diff), origin='lower', interpolation='nearest', cmap='RdBu_r',
+                          norm=TwoSlopeNorm(vcenter=0, vmin=-limit, vmax=limit))
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04, label=f"Share of {names[0]} - share of {names[1]}")
+    else:
+        raise ValueError(f"Unknown overlay mode: {mode}")
+
+    if labels:
+        xs, ys = prefix8_positions(level)
+        for octet, (x, y) in enumerate(zip(xs, ys)):
+            ax.text(x, y, str(octet), ha='center', va='center', fontsize=5, color='grey', alpha=0.8)
+
+    ax.set_title(title)
+    ax.axis('off')
+    if output_path:
+        fig.savefig(output_path, dpi=dpi, bbox_inches='tight', pad_inches=0.1)
+    if show:
+        plt.show()
+    plt.close(fig)  # Close to free memory
+
+
+def color_norm(raster: np.ndarray, log_scale: bool):
+    from matplotlib.colors import LogNorm, Normalize
+
+    vmax = max(int(raster.max()), 1)
+    return LogNorm(vmin=1, vmax=max(vmax, 2)) if log_scale else Normalize(vmin=0, vmax=vmax)
+
+
+def save_tile(tile: np.ndarray, output_path: str, norm, cmap: str = 'viridis'):
+    """Write one raster tile as a plain image, one pixel per block (transparent where empty)"""
+    import matplotlib.pyplot as plt
+
+    plt.imsave(output_path, plt.get_cmap(cmap)(norm(np.ma.masked_equal(tile, 0))), origin='lower')
+
+
+def render_density(raster: np.ndarray, output_path: Optional[str] = None, title: str = '', cmap: str = 'viridis',
+                   log_scale: bool = True, dpi: int = 300, show: bool = False, ax=None, level: Optional[int] = None,
+                   labels: bool = False):
+    """
+    Render a density raster as an image (empty pixels stay transparent)
+
+    Args:
+        level: Level of the raster, needed for /8 labels
+        labels: Write the first octet of every /8 block onto the map
+
+    Returns:
+        The matplotlib AxesImage
+    """
+    import matplotlib.pyplot as plt
+
+    own_figure = ax is None
+    if own_figure:
+        fig, ax = plt.subplots(figsize=(10, 10))
+    image = ax.imshow(np.ma.masked_equal(raster, 0), origin='lower', interpolation='nearest', cmap=cmap,
+                      norm=color_norm(raster, log_scale))
+    ax.set_title(title)
+    ax.axis('off')
+
+    if labels:
+        xs, ys = prefix8_positions(level)
+        for octet, (x, y) in enumerate(zip(xs, ys)):
+            ax.text(x, y, str(octet), ha='center', va='center', fontsize=5, color='grey', alpha=0.8)
+
+    if own_figure:
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04, label='Addresses per pixel')
+        if output_path:
+            fig.savefig(output_path, dpi=dpi, bbox_inches='tight', pad_inches=0.1)
+        if show:
+            plt.show()
+        plt.close(fig)  # Close to free memory
+    return image
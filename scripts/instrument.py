@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Stage-level timing and memory instrumentation
+
+Wrap the stages of an analysis (SQL fetch, IP parsing, counting, plotting...)
+in `with stages.stage('name', rows=n):` blocks. Every finished stage records
+its wall time, CPU time, rows processed and memory high-water mark and is
+emitted as a JSON line or a log line.
+
+A disabled Stages object (the default everywhere) hands out one shared no-op
+context manager, so instrumented code costs a method call per stage.
+
+Memory is reported as the process peak RSS (getrusage, cheap but monotonic
+over the process lifetime) and, with trace_memory, as the peak of Python and
+NumPy allocations inside the stage (tracemalloc, accurate but slow).
+
+Usage:
+    stages = Stages(enabled=True, fmt='json', output='stages.jsonl')
+    with stages.stage('fetch') as record:
+        df = read()
+        record['rows'] = len(df)
+"""
+
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('dns_analysis.stages')
+
+
+class _NoStage:
+    """Shared do-nothing stage for disabled instrumentation"""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+class Stages:
+    """Collects one record per analysis stage and emits it when the stage ends"""
+
+    def __init__(self, enabled: bool = False, fmt: str = 'json', output: Optional[str] = None,
+                 trace_memory: bool = False, context: Optional[Dict] = None):
+        """
+        Args:
+            enabled: Record stages at all
+            fmt: 'json' (one JSON object per line) or 'log' (key=value lines via logging)
+            output: File to append JSON lines to (default: stderr)
+            trace_memory: Also measure the per-stage allocation peak with tracemalloc
+            context: Fields added to every record (e.g. the script name)
+        """
+        if fmt not in ('json', 'log'):
+            raise ValueError(f"Unknown stage format: {fmt}")
+        self.enabled = enabled
+        self.fmt = fmt
+        self.output = output
+        self.trace_memory = trace_memory and enabled
+        self.context = context or {}
+        self.records: List[Dict] = []
+
+    def stage(self, name: str, rows: Optional[int] = None):
+        """Context manager timing one stage; set record['rows'] inside if not known up front"""
+        if not self.enabled:
+            return _NO_STAGE
+        return self._stage(name, rows)
+
+    @contextmanager
+    def _stage(self, name: str, rows: Optional[int]):
+        record = {'stage': name, 'rows': rows}
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(time.process_time() - cpu, 6)
+            record['peak_rss_mb'] = peak_rss_mb()
+            if self.trace_memory:
+                record['peak_traced_mb'] = round((tracemalloc.get_traced_memory()[1] - traced_before) / 1024 ** 2, 3)
+            self.emit(record)
+
+    def emit(self, record: Dict):
+        """Store a finished stage record and write it out"""
+        record = {**self.context, **record}
+        self.records.append(record)
+
+        if self.fmt == 'log':
+            logger.info(' '.join(f"{key}={value}" for key, value in record.items()))
+            return
+
+        line = json.dumps(record)
+        if self.output:
+            with open(self.output, 'a') as f:
+                f.write(line + '\n')
+        else:
+            print(line, file=sys.stderr)
+
+    def summary(self) -> List[Dict]:
+        """All stage records so far"""
+        return list(self.records)
+
+
+NO_STAGES = Stages()
+
+
+def add_arguments(parser):
+    """The shared --profile options of the analysis scripts"""
+    parser.add_argument('--profile', action='store_true', help="Record wall/CPU time, rows and memory per stage")
+    parser.add_argument('--profile-format', choices=['json', 'log'], default='json',
+                        help="Stage records as JSON lines or key=value log lines")
+    parser.add_argument('--profile-output', help="Append JSON stage records to this file (default: stderr)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Also trace per-stage allocation peaks (tracemalloc, slower)")
+
+
+def from_arguments(args, script: str) -> Stages:
+    """Stages configured from the --profile options"""
+    if args.profile and args.profile_format == 'log':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    return Stages(enabled=args.profile, fmt=args.profile_format, output=args.profile_output,
+                  trace_memory=args.profile_memory, context={'script': script})
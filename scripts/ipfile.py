@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Binary IPv4 set files
+
+A compact on-disk format for IP lists and resolver snapshots, read without
+parsing any text:
+
+- <name>.ips                 32-byte header + the sorted, deduplicated
+                             addresses, either as raw little-endian uint32
+                             (memory-mapped with zero copies) or as LEB128
+                             varints of the gaps between them (delta+varint,
+                             about 1-2 bytes per address in dense lists)
+- <name>.ips.attrs/          optional sidecar with one value per address, in
+                             the snapshot layout (see snapshot.py):
+                             <column>.codes.npy, <flag>.npy, labels.npz
+
+Header (little-endian): magic b'IPV4SETS', version uint16, flags uint16
+(bit 0 = delta+varint payload), reserved uint32, count uint64, payload
+bytes uint64.
+
+The Hilbert maps (hilbert.iter_ip_chunks), the set algebra (ipset.IPSet)
+and the Gini analyses (--ips, via open_snapshot()) accept .ips files
+wherever they accept text lists.
+
+Usage:
+    python3 ipfile.py convert data/db_exports/rrsig_ips_uniq.txt [--compress] [--output rrsig.ips]
+    python3 ipfile.py snapshot [--db URL] [--output resolvers.ips] [--compress]
+    python3 ipfile.py info rrsig.ips
+
+Requires: pip install numpy pandas
+"""
+
+import argparse
+import os
+import shutil
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ipv4 import parse_ipv4
+from snapshot import CATEGORICAL_COLUMNS, FLAG_COLUMNS, ResolverSnapshot, SnapshotCache
+from storage import DEFAULT_DB_CONFIG, get_backend, resolve_source
+
+MAGIC = b'IPV4SETS'
+VERSION = 1
+FLAG_VARINT = 1
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u2'), ('flags', '<u2'), ('reserved', '<u4'),
+                   ('count', '<u8'), ('payload', '<u8')])
+
+SIDECAR_SUFFIX = '.attrs'
+
+
+def encode_deltas(ips: np.ndarray) -> np.ndarray:
+    """LEB128 varints of the gaps between sorted addresses (the first gap is from 0)"""
+    deltas = np.diff(np.asarray(ips, dtype=np.uint32), prepend=np.uint32(0)).astype(np.uint32)
+    lengths = np.ones(deltas.size, dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        lengths += deltas >= np.uint32(1 << bits)
+
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+    for k in range(5):
+        has = lengths > k
+        byte = (deltas[has] >> np.uint32(7 * k)) & np.uint32(0x7F)
+        more = np.where(lengths[has] > k + 1, 0x80, 0).astype(np.uint32)
+        out[starts[has] + k] = (byte | more).astype(np.uint8)
+    return out
+
+
+def decode_deltas(payload: np.ndarray, count: int) -> np.ndarray:
+    """Sorted uint32 addresses from encode_deltas() output"""
+    payload = np.asarray(payload, dtype=np.uint8)
+    ends = np.flatnonzero(payload < 0x80)
+    if ends.size != count:
+        raise ValueError(f"Corrupt varint payload: {ends.size} values, expected {count}")
+    if count == 0:
+        return np.empty(0, dtype=np.uint32)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(payload.size) - np.repeat(starts, ends - starts + 1)
+    parts = (payload & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.cumsum(np.add.reduceat(parts, starts)).astype(np.uint32)
+
+
+def is_ip_file(path: str) -> bool:
+    """Whether path is a binary IP set file (by its magic bytes)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_header(path: str) -> Dict:
+    """Header fields of a binary IP set file"""
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if header.size != 1 or header['magic'][0] != MAGIC:
+        raise ValueError(f"Not an IP set file: {path}")
+    if header['version'][0] > VERSION:
+        raise ValueError(f"Unsupported IP set file version {header['version'][0]}: {path}")
+    return {name: int(header[name][0]) for name in ('version', 'flags', 'count', 'payload')}
+
+
+def read_ips(path: str) -> np.ndarray:
+    """
+    Sorted, deduplicated uint32 addresses of a binary IP set file
+
+    Raw files are memory-mapped (no copy, pages load on access); varint files
+    are decoded into memory.
+    """
+    header = read_header(path)
+    if header['count'] == 0:
+        return np.empty(0, dtype=np.uint32)
+    if header['flags'] & FLAG_VARINT:
+        payload = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.itemsize, shape=(header['payload'],))
+        return decode_deltas(payload, header['count'])
+    return np.memmap(path, dtype='<u4', mode='r', offset=HEADER.itemsize, shape=(header['count'],))
+
+
+def load_ips(path: str) -> np.ndarray:
+    """Addresses of a binary IP set file, or the valid IPs of a one-per-line text file"""
+    if is_ip_file(path):
+        return read_ips(path)
+    with open(path) as f:
+        ips, valid = parse_ipv4([line.split(',', 1)[0].strip() for line in f if line.strip()])
+    return ips[valid]
+
+
+def read_attributes(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """Memory-mapped per-address columns and dictionary labels of the sidecar (empty without one)"""
+    sidecar = path + SIDECAR_SUFFIX
+    if not os.path.isdir(sidecar):
+        return {}, {}
+    columns = {name[:-4]: np.load(os.path.join(sidecar, name), mmap_mode='r')
+               for name in os.listdir(sidecar) if name.endswith('.npy')}
+    labels = {}
+    if os.path.exists(os.path.join(sidecar, 'labels.npz')):
+        with np.load(os.path.join(sidecar, 'labels.npz'), allow_pickle=True) as data:
+            labels = {column: data[column] for column in data.files}
+    return columns, labels
+
+
+def write_ips(path: str, ips, compress: bool = False, attributes: Optional[Dict[str, np.ndarray]] = None,
+              labels: Optional[Dict[str, np.ndarray]] = None):
+    """
+    Write addresses (any order, duplicates allowed) as a binary IP set file
+
+    Args:
+        path: Output file (written atomically)
+        ips: uint32 addresses
+        compress: Store delta+varint instead of raw uint32
+        attributes: Per-address columns, aligned with ips; the first row of a
+            repeated address is kept
+        labels: Dictionary labels of code columns, stored in the sidecar
+    """
+    ips, first = np.unique(np.asarray(ips, dtype=np.uint32), return_index=True)
+    payload = encode_deltas(ips) if compress else ips.astype('<u4')
+
+    header = np.zeros(1, dtype=HEADER)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['flags'] = FLAG_VARINT if compress else 0
+    header['count'] = ips.size
+    header['payload'] = payload.nbytes
+
+    sidecar = path + SIDECAR_SUFFIX
+    if os.path.isdir(sidecar):
+        shutil.rmtree(sidecar)
+    if attributes:
+        tmp = f"{sidecar}.{os.getpid()}.tmp"
+        os.makedirs(tmp)
+        for column, values in attributes.items():
+            np.save(os.path.join(tmp, f"{column}.npy"), np.asarray(values)[first])
+        if labels:
+            np.savez_compressed(os.path.join(tmp, 'labels.npz'), **labels)
+        os.replace(tmp, sidecar)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(payload.tobytes())
+    os.replace(tmp, path)
+
+
+def open_snapshot(path: str) -> ResolverSnapshot:
+    """
+    A binary IP set file as a ResolverSnapshot (one row per address)
+
+    Attributes missing from the sidecar read as NULL codes and zero flags, so
+    plain IP lists go through the same analyses as resolver snapshots.
+    """
+    ips = read_ips(path)
+    columns, labels = read_attributes(path)
+    columns = dict(columns, ip=ips, ip_valid=np.ones(ips.size, dtype=bool))
+    for column in CATEGORICAL_COLUMNS:
+        if f"{column}.codes" not in columns:
+            columns[f"{column}.codes"] = np.full(ips.size, -1, dtype=np.int8)
+            labels[column] = np.empty(0, dtype=object)
+    for column in FLAG_COLUMNS:
+        columns.setdefault(column, np.zeros(ips.size, dtype=np.int8))
+    return ResolverSnapshot(path, columns, labels, {'source': path, 'rows': int(ips.size)})
+
+
+def convert_text(source: str, output: str, compress: bool = False) -> int:
+    """Convert a one-IP-per-line text file; returns the number of addresses written"""
+    write_ips(output, load_ips(source), compress)
+    return read_header(output)['count']
+
+
+def convert_snapshot(snapshot: ResolverSnapshot, output: str, compress: bool = False) -> int:
+    """Convert a resolver snapshot into an IP set file with its columns in the sidecar"""
+    valid = np.asarray(snapshot.columns['ip_valid'])
+    attributes = {f"{column}.codes": np.asarray(snapshot.codes(column))[valid] for column in CATEGORICAL_COLUMNS}
+    attributes.update({column: np.asarray(snapshot.columns[column])[valid] for column in FLAG_COLUMNS})
+    write_ips(output, np.asarray(snapshot.columns['ip'])[valid], compress, attributes, snapshot.labels)
+    return read_header(output)['count']
+
+
+def main():
+    """Convert text lists or the resolver snapshot to binary IP set files, or describe one"""
+    parser = argparse.ArgumentParser(description="Binary IPv4 set files")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help="Convert one-IP-per-line text files")
+    convert.add_argument('files', nargs='+')
+    convert.add_argument('--output', help="Output file (single input only; default: <input stem>.ips)")
+    convert.add_argument('--compress', action='store_true', help="Delta+varint payload instead of raw uint32")
+
+    snapshot = commands.add_parser('snapshot', help="Convert the dns_resolvers snapshot, with its columns")
+    snapshot.add_argument('--db', help="Storage URL (default: $DNS_DB_URL)")
+    snapshot.add_argument('--output', default='dns_resolvers.ips')
+    snapshot.add_argument('--compress', action='store_true', help="Delta+varint payload instead of raw uint32")
+
+    info = commands.add_parser('info', help="Describe an IP set file")
+    info.add_argument('file')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        if args.output and len(args.files) > 1:
+            parser.error("--output needs a single input file")
+        for source in args.files:
+            output = args.output or os.path.splitext(source)[0] + '.ips'
+            count = convert_text(source, output, args.compress)
+            print(f"✓ {source} -> {output}: {count:,} addresses, "
+                  f"{os.path.getsize(output):,} bytes (text: {os.path.getsize(source):,})")
+    elif args.command == 'snapshot':
+        resolvers = SnapshotCache().get(get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG)))
+        count = convert_snapshot(resolvers, args.output, args.compress)
+        print(f"✓ Wrote {count:,} resolvers to {args.output} ({os.path.getsize(args.output):,} bytes)")
+    else:
+        header = read_header(args.file)
+        columns, labels = read_attributes(args.file)
+        print(f"{args.file}: {header['count']:,} addresses, "
+              f"{'delta+varint' if header['flags'] & FLAG_VARINT else 'raw uint32'} payload of {header['payload']:,} bytes")
+        if columns:
+            print(f"  attributes: {', '.join(sorted(columns))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+IPv4 set algebra over the IP lists
+
+Loads IP lists (dns_resolvers.csv, dnssec_resolvers.csv, nameservers.csv,
+rrsig_ips_uniq.txt, dns_resolvers_dnsvalidator.csv, ...) into IPSets and
+computes intersections, unions, differences and a pairwise overlap / Jaccard
+matrix without per-address Python work.
+
+An IPSet holds either a sorted, deduplicated uint32 array (sparse sets) or a
+bitmap over the /16 blocks it occupies: one 65536-bit row (8 KiB) per block,
+which is smaller than the array once a block holds more than 2048 addresses.
+Set operations on arrays are binary searches and merges of sorted runs; on
+bitmaps they are word-wise AND/OR over the aligned blocks.
+
+The overlap matrix of k sparse sets comes from one sort: every address is
+tagged with its set id, the k sorted runs are merged (timsort), and each
+address' membership bits are OR-reduced into a pattern. Pairwise
+intersections are sums over the distinct patterns. Beyond MERGE_LIMIT
+addresses in total, sets are intersected pair by pair to bound memory.
+
+Usage:
+    python3 ipset.py matrix [LIST ...] [--csv jaccard.csv]
+    python3 ipset.py derive intersection dnssec nameservers [--output overlap.txt]
+    python3 ipset.py derive difference resolvers rrsig extra=path/to/ips.txt --output rest.txt
+
+LIST is a name from IP_LISTS, a file path or NAME=PATH; files may be text lists
+or binary .ips files (ipfile.py), and derived sets ending in .ips are written
+in that format.
+
+Requires: pip install numpy
+"""
+
+import argparse
+import csv
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ipfile import is_ip_file, read_ips, write_ips
+from ipv4 import parse_ipv4
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+IP_LISTS = {
+    'resolvers': os.path.join(DATA_DIR, 'db_exports', 'dns_resolvers.csv'),
+    'dnssec': os.path.join(DATA_DIR, 'db_exports', 'dnssec_resolvers.csv'),
+    'nameservers': os.path.join(DATA_DIR, 'db_exports', 'nameservers.csv'),
+    'rrsig': os.path.join(DATA_DIR, 'db_exports', 'rrsig_ips_uniq.txt'),
+    'dnsvalidator': os.path.join(DATA_DIR, 'dns_resolvers_dnsvalidator.csv'),
+}
+
+BLOCK_SIZE = 1 << 16           # Addresses per bitmap block (one /16)
+BLOCK_WORDS = BLOCK_SIZE // 64  # uint64 words per block
+DENSE_PER_BLOCK = 2048          # Addresses per block above which a bitmap row beats a uint32 array
+WRITE_CHUNK = 1 << 20           # Addresses formatted per write
+MERGE_LIMIT = 1 << 25           # Total addresses up to which overlap_matrix() tags and merges all sets at once
+
+_OCTETS = np.array([str(i) for i in range(256)], dtype=object)
+
+
+def _popcount(words: np.ndarray) -> int:
+    """Number of set bits in a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(np.unpackbits(words.view(np.uint8)).sum(dtype=np.int64))
+
+
+def _dedupe_sorted(ips: np.ndarray) -> np.ndarray:
+    """Drop repeated values from a sorted array"""
+    if ips.size <= 1:
+        return ips
+    keep = np.empty(ips.size, dtype=bool)
+    keep[0] = True
+    np.not_equal(ips[1:], ips[:-1], out=keep[1:])
+    return ips[keep]
+
+
+def _found(values: np.ndarray, sorted_set: np.ndarray) -> np.ndarray:
+    """Membership of values in a sorted uint32 array by binary search"""
+    if sorted_set.size == 0:
+        return np.zeros(values.size, dtype=bool)
+    index = np.minimum(np.searchsorted(sorted_set, values), sorted_set.size - 1)
+    return sorted_set[index] == values
+
+
+class IPSet:
+    """Immutable set of IPv4 addresses as a sorted uint32 array or a /16-block bitmap"""
+
+    def __init__(self, ips: np.ndarray = None, blocks: np.ndarray = None, words: np.ndarray = None,
+                 invalid: int = 0):
+        """
+        Args:
+            ips: Sorted, deduplicated uint32 addresses (sparse form)
+            blocks: Sorted /16 keys of the bitmap rows (dense form)
+            words: (len(blocks), 1024) uint64 bitmap rows, bit i of word w = address w * 64 + i
+            invalid: Entries of the source list that were not IPv4 addresses
+        """
+        self.ips = ips
+        self.blocks = blocks
+        self.words = words
+        self.invalid = invalid
+        self._size = None
+
+    @classmethod
+    def from_ips(cls, ips, invalid: int = 0) -> 'IPSet':
+        """Build a set from any uint32 addresses (unsorted, with duplicates)"""
+        ips = _dedupe_sorted(np.sort(np.asarray(ips, dtype=np.uint32)))
+        return cls(ips=ips, invalid=invalid).compact()
+
+    @classmethod
+    def from_strings(cls, values) -> 'IPSet':
+        """Build a set from dotted-quad strings; anything else (IPv6, headers) is counted as invalid"""
+        ips, valid = parse_ipv4(values)
+        return cls.from_ips(ips[valid], invalid=int((~valid).sum()))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'IPSet':
+        """Load a binary .ips file (memory-mapped) or a list with one IP per line (first CSV column)"""
+        if is_ip_file(path):
+            return cls(ips=read_ips(path)).compact()
+        with open(path) as f:
+            return cls.from_strings([line.split(',', 1)[0].strip() for line in f if line.strip()])
+
+    @classmethod
+    def from_bitmap(cls, blocks: np.ndarray, words: np.ndarray) -> 'IPSet':
+        """Build a set from bitmap rows, dropping empty blocks"""
+        nonempty = words.any(axis=1)
+        if not nonempty.any():
+            return cls(ips=np.empty(0, dtype=np.uint32))
+        return cls(blocks=blocks[nonempty], words=words[nonempty]).compact()
+
+    @property
+    def is_dense(self) -> bool:
+        """Whether the set is held as a bitmap"""
+        return self.ips is None
+
+    def __len__(self) -> int:
+        if self._size is None:
+            self._size = self.ips.size if self.ips is not None else _popcount(self.words)
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"IPSet({len(self):,} addresses, {'bitmap' if self.is_dense else 'array'})"
+
+    def compact(self) -> 'IPSet':
+        """Switch to whichever form is smaller for the current density (empty sets are arrays)"""
+        if self.is_dense and (len(self) == 0 or len(self) < DENSE_PER_BLOCK * len(self.blocks)):
+            return IPSet(ips=self.to_array(), invalid=self.invalid)
+        if not self.is_dense and self.ips.size:
+            blocks = _dedupe_sorted(self.ips >> 16)
+            if self.ips.size > DENSE_PER_BLOCK * blocks.size:
+                return IPSet(blocks=blocks, words=self.bitmap_rows(blocks), invalid=self.invalid)
+        return self
+
+    def to_array(self) -> np.ndarray:
+        """Sorted uint32 addresses"""
+        if not self.is_dense:
+            return self.ips
+        bits = np.flatnonzero(np.unpackbits(self.words.view(np.uint8), bitorder='little'))
+        return (self.blocks[bits >> 16].astype(np.uint32) << 16) | (bits & 0xFFFF).astype(np.uint32)
+
+    def bitmap_rows(self, blocks: np.ndarray) -> np.ndarray:
+        """Bitmap rows of this set over the given sorted /16 keys (addresses outside them are dropped)"""
+        if self.is_dense:
+            rows = np.zeros((len(blocks), BLOCK_WORDS), dtype=np.uint64)
+            common, ours, theirs = np.intersect1d(self.blocks, blocks, assume_unique=True, return_indices=True)
+            rows[theirs] = self.words[ours]
+            return rows
+
+        # Sorted addresses give sorted word indices: OR the bits of each word's run and scatter once
+        ips = self.ips[_found(self.ips >> 16, blocks)]
+        rows = np.zeros(len(blocks) * BLOCK_WORDS, dtype=np.uint64)
+        if ips.size:
+            low = (ips & 0xFFFF).astype(np.int64)
+            word = np.searchsorted(blocks, ips >> 16).astype(np.int64) * BLOCK_WORDS + (low >> 6)
+            starts = np.concatenate(([0], np.flatnonzero(word[1:] != word[:-1]) + 1))
+            rows[word[starts]] = np.bitwise_or.reduceat(np.uint64(1) << (low & 63).astype(np.uint64), starts)
+        return rows.reshape(len(blocks), BLOCK_WORDS)
+
+    def contains(self, ips) -> np.ndarray:
+        """Vectorized membership test of uint32 addresses"""
+        ips = np.asarray(ips, dtype=np.uint32)
+        if not self.is_dense:
+            return _found(ips, self.ips)
+        if len(self.blocks) == 0:
+            return np.zeros(ips.size, dtype=bool)
+        row = np.searchsorted(self.blocks, ips >> 16)
+        present = _found(ips >> 16, self.blocks)
+        row = np.minimum(row, len(self.blocks) - 1)
+        low = (ips & 0xFFFF).astype(np.int64)
+        bit = (self.words[row, low >> 6] >> (low & 63).astype(np.uint64)) & np.uint64(1)
+        return present & (bit == 1)
+
+    def _aligned(self, other: 'IPSet', blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Bitmap rows of both sets over the same blocks"""
+        return self.bitmap_rows(blocks), other.bitmap_rows(blocks)
+
+    def intersection(self, other: 'IPSet') -> 'IPSet':
+        if self.is_dense and other.is_dense:
+            blocks = np.intersect1d(self.blocks, other.blocks, assume_unique=True)
+            ours, theirs = self._aligned(other, blocks)
+            return IPSet.from_bitmap(blocks, ours & theirs)
+        if self.is_dense or other.is_dense:
+            sparse, dense = (other, self) if self.is_dense else (self, other)
+            return IPSet(ips=sparse.ips[dense.contains(sparse.ips)])
+        small, large = sorted((self.ips, other.ips), key=len)
+        return IPSet(ips=small[_found(small, large)])
+
+    def union(self, other: 'IPSet') -> 'IPSet':
+        if self.is_dense and other.is_dense:
+            blocks = np.union1d(self.blocks, other.blocks)
+            ours, theirs = self._aligned(other, blocks)
+            return IPSet.from_bitmap(blocks, ours | theirs)
+        # A sparse operand may span every /16, so mixed unions merge arrays instead of widening bitmaps
+        merged = np.concatenate((self.to_array(), other.to_array()))
+        merged.sort(kind='stable')  # timsort: merges the two sorted runs
+        return IPSet(ips=_dedupe_sorted(merged)).compact()
+
+    def difference(self, other: 'IPSet') -> 'IPSet':
+        if self.is_dense:
+            ours, theirs = self._aligned(other, self.blocks)
+            return IPSet.from_bitmap(self.blocks, ours & ~theirs)
+        if other.is_dense or other.ips.size >= self.ips.size:
+            return IPSet(ips=self.ips[~other.contains(self.ips)])
+        # Look the smaller operand up in this set rather than the other way round
+        keep = np.ones(self.ips.size, dtype=bool)
+        index = np.minimum(np.searchsorted(self.ips, other.ips), self.ips.size - 1)
+        keep[index[self.ips[index] == other.ips]] = False
+        return IPSet(ips=self.ips[keep])
+
+    def symmetric_difference(self, other: 'IPSet') -> 'IPSet':
+        return self.difference(other).union(other.difference(self))
+
+    __and__ = intersection
+    __or__ = union
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+    def intersection_size(self, other: 'IPSet') -> int:
+        """|self & other| without materializing the intersection"""
+        if not (self.is_dense or other.is_dense):
+            small, large = sorted((self.ips, other.ips), key=len)
+            return int(_found(small, large).sum())
+        if not self.is_dense:
+            return int(other.contains(self.ips).sum())
+        if not other.is_dense:
+            return int(self.contains(other.ips).sum())
+        common, ours, theirs = np.intersect1d(self.blocks, other.blocks, assume_unique=True, return_indices=True)
+        return _popcount(self.words[ours] & other.words[theirs])
+
+    def save(self, path: str, compress: bool = False):
+        """Write the set as a binary .ips file (see ipfile.py)"""
+        write_ips(path, self.to_array(), compress)
+
+    def write(self, path: str):
+        """Write the addresses as dotted quads, one per line, in ascending order"""
+        ips = self.to_array()
+        with open(path, 'w') as f:
+            for start in range(0, ips.size, WRITE_CHUNK):
+                chunk = ips[start:start + WRITE_CHUNK]
+                lines = (_OCTETS[chunk >> 24] + '.' + _OCTETS[chunk >> 16 & 255] + '.' +
+                         _OCTETS[chunk >> 8 & 255] + '.' + _OCTETS[chunk & 255])
+                f.write('\n'.join(lines) + '\n')
+
+
+def membership_regions(sets: List[IPSet]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Venn regions of up to 58 sets from one merge of their sorted arrays
+
+    Returns:
+        (membership matrix of shape (regions, sets), addresses per region)
+    """
+    if len(sets) > 58:
+        raise ValueError("At most 58 sets can be compared in one pass")
+    tagged = np.concatenate([(s.to_array().astype(np.uint64) << np.uint64(6)) | np.uint64(i)
+                             for i, s in enumerate(sets)])
+    if tagged.size == 0:
+        return np.zeros((0, len(sets)), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    tagged.sort(kind='stable')  # timsort merges the per-set sorted runs
+
+    # Split off the set ids and reuse the buffer for the addresses
+    ids = (tagged & np.uint64(63)).astype(np.uint8)
+    tagged >>= np.uint64(6)
+    boundary = np.empty(tagged.size, dtype=bool)
+    boundary[0] = True
+    np.not_equal(tagged[1:], tagged[:-1], out=boundary[1:])
+    del tagged
+
+    bits = np.bitwise_or.reduceat(np.left_shift(np.uint64(1), ids.astype(np.uint64)), np.flatnonzero(boundary))
+    patterns, counts = np.unique(bits, return_counts=True)
+    membership = ((patterns[:, None] >> np.arange(len(sets), dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+    return membership, counts.astype(np.int64)
+
+
+def overlap_matrix(sets: List[IPSet]) -> np.ndarray:
+    """
+    Pairwise intersection sizes (sizes on the diagonal)
+
+    Sparse sets up to MERGE_LIMIT addresses in total share one tagged merge
+    (membership_regions()); bitmaps and larger inputs are intersected pair by
+    pair without materializing the intersections.
+    """
+    if not any(s.is_dense for s in sets) and sum(len(s) for s in sets) <= MERGE_LIMIT:
+        membership, counts = membership_regions(sets)
+        return membership.T @ (membership * counts[:, None])
+    matrix = np.diag([len(s) for s in sets]).astype(np.int64)
+    for i in range(len(sets)):
+        for j in range(i + 1, len(sets)):
+            matrix[i, j] = matrix[j, i] = sets[i].intersection_size(sets[j])
+    return matrix
+
+
+def jaccard_matrix(overlaps: np.ndarray) -> np.ndarray:
+    """Jaccard index |A & B| / |A | B| from an overlap_matrix()"""
+    sizes = np.diag(overlaps)
+    unions = sizes[:, None] + sizes[None, :] - overlaps
+    return np.divide(overlaps, unions, out=np.zeros(overlaps.shape), where=unions > 0)
+
+
+def load_lists(specs: List[str]) -> Dict[str, IPSet]:
+    """Load IP lists given as IP_LISTS names, paths or NAME=PATH"""
+    sets = {}
+    for spec in specs:
+        if '=' in spec:
+            name, path = spec.split('=', 1)
+        elif spec in IP_LISTS:
+            name, path = spec, IP_LISTS[spec]
+        else:
+            name, path = os.path.splitext(os.path.basename(spec))[0], spec
+        sets[name] = IPSet.from_file(path)
+    return sets
+
+
+def print_matrix(names: List[str], matrix: np.ndarray, fmt: str, title: str):
+    """Print a square matrix labelled with the list names"""
+    width = max(12, max(len(name) for name in names) + 1)
+    print(f"\n{title}")
+    print("-" * (width + (width + 1) * len(names)))
+    print(f"{'':<{width}}" + "".join(f" {name:>{width}}" for name in names))
+    for name, row in zip(names, matrix):
+        print(f"{name:<{width}}" + "".join(f" {value:>{width}{fmt}}" for value in row))
+
+
+def main():
+    """Overlap matrix of IP lists, or write a set derived from them"""
+    parser = argparse.ArgumentParser(description="Set algebra across IPv4 lists")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    matrix = commands.add_parser('matrix', help="Pairwise overlaps and Jaccard indices")
+    matrix.add_argument('lists', nargs='*', default=list(IP_LISTS), help="IP_LISTS names, paths or NAME=PATH")
+    matrix.add_argument('--csv', help="Write the Jaccard matrix to this CSV file")
+
+    derive = commands.add_parser('derive', help="Fold an operation over lists from left to right and write the result")
+    derive.add_argument('operation', choices=['union', 'intersection', 'difference', 'symmetric_difference'])
+    derive.add_argument('lists', nargs='+', help="IP_LISTS names, paths or NAME=PATH")
+    derive.add_argument('--output', help="Output file, binary if it ends in .ips (default: print the size only)")
+    derive.add_argument('--compress', action='store_true', help="Delta+varint payload for .ips output")
+    args = parser.parse_args()
+
+    sets = load_lists(args.lists)
+    for name, ip_set in sets.items():
+        skipped = f" ({ip_set.invalid:,} non-IPv4 entries skipped)" if ip_set.invalid else ""
+        print(f"✓ {name}: {ip_set!r}{skipped}")
+
+    if args.command == 'matrix':
+        names = list(sets)
+        overlaps = overlap_matrix(list(sets.values()))
+        jaccard = jaccard_matrix(overlaps)
+        print_matrix(names, overlaps, ',d', "OVERLAP (|A ∩ B|)")
+        print_matrix(names, jaccard, '.4f', "JACCARD (|A ∩ B| / |A ∪ B|)")
+        if args.csv:
+            with open(args.csv, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow([''] + names)
+                for name, row in zip(names, jaccard):
+                    writer.writerow([name] + [round(value, 6) for value in row])
+            print(f"✓ Saved {args.csv}")
+        return
+
+    operands = list(sets.values())
+    result = operands[0]
+    for operand in operands[1:]:
+        result = getattr(result, args.operation)(operand)
+    print(f"\n{args.operation}: {len(result):,} addresses")
+    if args.output and args.output.endswith('.ips'):
+        result.save(args.output, args.compress)
+        print(f"✓ Saved {args.output}")
+    elif args.output:
+        result.write(args.output)
+        print(f"✓ Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
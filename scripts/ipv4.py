@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Vectorized IPv4 helpers
+
+Parses dotted-quad strings into packed uint32 NumPy arrays once, so that any
+prefix bucketing (/8, /16, /24, any /N) becomes a bit shift followed by
+bincount/unique. Labels such as "1.2.0.0/16" are only formatted for the rows
+that are actually printed.
+
+Requires: pip install numpy
+"""
+
+import numpy as np
+from typing import Dict, Tuple
+
+# Longest dotted quad is "255.255.255.255" (15 bytes); one extra byte detects overlong input
+_WIDTH = 16
+_DOT = ord('.')
+_ZERO = ord('0')
+
+
+def parse_ipv4(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse dotted-quad IPv4 strings into a uint32 array
+
+    Args:
+        values: Iterable, NumPy array or pandas Series of IP strings
+
+    Returns:
+        (ips, valid) where ips is a uint32 array (0 for invalid entries) and
+        valid is a boolean mask of successfully parsed addresses
+    """
+    values = getattr(values, 'values', values)
+    strings = np.asarray(values, dtype=object)
+    n = strings.size
+    if n == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=bool)
+
+    try:
+        raw = strings.astype(f'S{_WIDTH}')
+    except (UnicodeEncodeError, ValueError):
+        raw = np.array([str(v).encode('ascii', 'replace')[:_WIDTH] for v in strings], dtype=f'S{_WIDTH}')
+
+    # One contiguous row per byte column, so every step below is a 1-D vector op
+    columns = np.ascontiguousarray(raw.view(np.uint8).reshape(n, _WIDTH).T)
+
+    valid = np.ones(n, dtype=bool)
+    ended = np.zeros(n, dtype=bool)
+    field = np.zeros(n, dtype=np.int8)
+    current = np.zeros(n, dtype=np.int32)
+    digits = np.zeros(n, dtype=np.int8)
+    octets = np.zeros((4, n), dtype=np.int32)
+
+    for column in columns:
+        value = column.astype(np.int32) - _ZERO
+        is_digit = (value >= 0) & (value <= 9)
+        is_dot = column == _DOT
+        is_end = column == 0
+
+        # Only digits and dots, and nothing after the terminating NUL
+        valid &= is_digit | is_dot | is_end
+        valid &= ~ended | is_end
+
+        current = np.where(is_digit, np.minimum(current * 10 + value, 1000), current)
+        digits += is_digit
+
+        # A dot or the first NUL closes the current octet
+        close = is_dot | (is_end & ~ended)
+        valid &= ~close | ((digits >= 1) & (digits <= 3))
+        for i in range(4):
+            octets[i] = np.where(close & (field == i), current, octets[i])
+        field += is_dot
+        current[close] = 0
+        digits[close] = 0
+        ended |= is_end
+
+    valid &= ended & (columns[-1] == 0)
+    valid &= field == 3
+    valid &= (octets <= 255).all(axis=0)
+
+    octets = octets.astype(np.uint32)
+    ips = (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+    ips[~valid] = 0
+    return ips, valid
+
+
+def prefix_keys(ips: np.ndarray, prefix_length: int) -> np.ndarray:
+    """Return the /N prefix of every IP as an integer key (the top N bits)"""
+    if not 0 <= prefix_length <= 32:
+        raise ValueError(f"Invalid prefix length: /{prefix_length}")
+    ips = np.asarray(ips, dtype=np.uint32)
+    if prefix_length == 0:
+        return np.zeros(ips.size, dtype=np.uint32)
+    return ips >> np.uint32(32 - prefix_length)
+
+
+def count_keys(keys: np.ndarray, prefix_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count occurrences of /N prefix keys
+
+    Short prefixes use a dense bincount over all 2^N keys, longer ones use
+    np.unique on the keys.
+
+    Returns:
+        (keys, counts) of the non-empty prefixes, ordered by key
+    """
+    if prefix_length <= 16:
+        counts = np.bincount(keys, minlength=1 << prefix_length)
+        present = np.flatnonzero(counts)
+        return present.astype(np.uint32), counts[present]
+
+    unique, counts = np.unique(keys, return_counts=True)
+    return unique, counts
+
+
+def prefix_counts(ips: np.ndarray, prefix_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Count IPs per /N prefix, returning (keys, counts) ordered by key"""
+    return count_keys(prefix_keys(ips, prefix_length), prefix_length)
+
+
+def top_prefixes(keys: np.ndarray, counts: np.ndarray, n: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the n largest buckets (descending count, ties by key) without sorting everything"""
+    if counts.size > n:
+        idx = np.argpartition(-counts, n - 1)[:n]
+    else:
+        idx = np.arange(counts.size)
+    idx = idx[np.lexsort((keys[idx], -counts[idx]))]
+    return keys[idx], counts[idx]
+
+
+def format_ipv4(ip: int) -> str:
+    """Format a single integer IPv4 address as a dotted quad"""
+    ip = int(ip)
+    return f"{ip >> 24 & 255}.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}"
+
+
+def format_prefix(key: int, prefix_length: int) -> str:
+    """Format a prefix key from prefix_keys() as CIDR notation, e.g. "1.2.0.0/16" """
+    network = (int(key) << (32 - prefix_length)) & 0xFFFFFFFF if prefix_length else 0
+    return f"{format_ipv4(network)}/{prefix_length}"
+
+
+def prefix_octets(key: int, prefix_length: int) -> str:
+    """Format the leading octets of an octet-aligned prefix key, e.g. "1.2" for a /16"""
+    key = int(key)
+    octets = prefix_length // 8
+    return '.'.join(str(key >> (8 * (octets - i - 1)) & 255) for i in range(octets))
+
+
+def prefix_hierarchy(ips: np.ndarray, min_length: int = 1, max_length: int = 32) -> Dict[int, np.ndarray]:
+    """
+    Bucket counts for every prefix length from a single sort
+
+    Adjacent sorted addresses are compared once: the highest differing bit of
+    their XOR is the shortest prefix length at which they fall into different
+    buckets. Starting from /32, every coarser level is derived by merging the
+    neighbouring buckets whose boundary disappears at that level, so the work
+    shrinks with the number of buckets instead of re-scanning all IPs.
+
+    Args:
+        ips: uint32 addresses (duplicates allowed)
+        min_length: Shortest prefix length to report
+        max_length: Longest prefix length to report
+
+    Returns:
+        Mapping of prefix length -> counts of the non-empty buckets (ordered by key)
+    """
+    if not 1 <= min_length <= max_length <= 32:
+        raise ValueError(f"Invalid prefix range: /{min_length} to /{max_length}")
+
+    ips = np.sort(np.asarray(ips, dtype=np.uint32))
+    if ips.size == 0:
+        return {length: np.empty(0, dtype=np.int64) for length in range(min_length, max_length + 1)}
+
+    # Prefix length at which each adjacent pair splits (33 for duplicates)
+    _, bit_length = np.frexp((ips[1:] ^ ips[:-1]).astype(np.float64))
+    split = 33 - bit_length
+
+    # /32 buckets, and the split level of the boundary in front of each bucket
+    starts = np.concatenate(([0], np.flatnonzero(split <= 32) + 1))
+    counts = np.diff(np.append(starts, ips.size))
+    boundary = split[starts[1:] - 1]
+
+    hierarchy = {}
+    for length in range(32, min_length - 1, -1):
+        keep = boundary <= length
+        if not keep.all():
+            counts = np.add.reduceat(counts, np.concatenate(([0], np.flatnonzero(keep) + 1)))
+            boundary = boundary[keep]
+        if length <= max_length:
+            hierarchy[length] = counts
+
+    return dict(sorted(hierarchy.items()))
@@ -1,36 +1,136 @@
 #!/usr/bin/env python3
-import matplotlib.pyplot as plt
-from hilbertcurve.hilbertcurve import HilbertCurve
-import ipaddress
+"""
+Hilbert map of IPv4 addresses
+
+Maps every address onto a Hilbert curve (vectorized, see hilbert.py),
+accumulates a density raster with one pixel per /LEVEL block and renders it
+as an image instead of scattering one point per IP.
+
+A pyramid run computes the finest raster once and derives every coarser
+level by summing 2x2 blocks, writing <name>_<level>.png for each level (plus
+<name>_<level>_label.png with /8 labels and tiles of fine levels on request).
+
+Usage:
+    python3 plot_hilbert_map.py [IP_FILE] [--level 24] [--output hilbert_map_rrsig.png]
+    python3 plot_hilbert_map.py IP_FILE --pyramid 6 8 12 16 18 20 24 --name hilbert_map_resolvers \
+        [--label-levels 8] [--tile-levels 24 --tile-size 1024]
+    python3 plot_hilbert_map.py resolvers.txt dnssec.txt rrsig.txt --names resolvers dnssec rrsig \
+        [--mode channels|difference] [--level 20] [--output overlay.png]
+
+With several input files the sets are drawn into one image, as red/green/blue
+channels or (for two sets) as a difference of their per-pixel shares. Their
+Hilbert coordinates are cached per file content (see hilbert.cached_coordinates).
+Inputs may also be binary .ips files (see ipfile.py), which are memory-mapped
+instead of parsed.
+
+Requires: pip install numpy matplotlib
+"""
+
+import argparse
+import os
+import time
+
+import matplotlib
+
+from hilbert import (DEFAULT_CACHE_DIR, build_pyramid, cached_coordinates, color_norm, coordinates_raster,
+                     density_raster, iter_ip_chunks, iter_tiles, render_density, render_overlay, save_tile)
 # plt.style.use('rose-pine')
 
-# Parameters for Hilbert curve (IPv4 = 32 bits → level=16, dim=2)
-p = 16  # iterations
-n = 2   # dimensions
-hilbert_curve = HilbertCurve(p, n)
-
-# Read IPs
-ips = []
-with open('/home/ubuntu/bachelor-thesis/data/rrsig_ips_uniq.txt') as f:
-    for line in f:
-        ip = line.strip()
-        try:
-            ip_int = int(ipaddress.IPv4Address(ip))
-            point = hilbert_curve.coordinates_from_distance(ip_int)
-            ips.append(point)
-        except:
-            continue
-
-# Extract x, y coords
-x = [pt[0] for pt in ips]
-y = [pt[1] for pt in ips]
-
-# Plot
-plt.figure(figsize=(10, 10))
-plt.scatter(x, y, s=0.5, alpha=0.5)
-plt.title('Hilbert Map of IPs (RRSIG responses)')
-plt.axis('off')
-plt.show()
-
-plt.savefig('data/plots/hilbert_map_rrsig.png', bbox_inches='tight', pad_inches=0.1)
-plt.close()  # Close to free memory
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+DEFAULT_IP_FILE = os.path.join(DATA_DIR, 'db_exports', 'rrsig_ips_uniq.txt')
+DEFAULT_OUTPUT = os.path.join(DATA_DIR, 'plots', 'hilbert_map_rrsig.png')
+PYRAMID_DIR = os.path.join(DATA_DIR, 'plots', 'hilbert maps')
+
+
+def write_pyramid(raster, level: int, levels, name: str, output_dir: str, title: str, cmap: str = 'viridis',
+                  log_scale: bool = True, dpi: int = 300, label_levels=(), tile_levels=(), tile_size: int = 1024):
+    """Write every pyramid level (and optional labelled maps and tiles) derived from one raster"""
+    os.makedirs(output_dir, exist_ok=True)
+    pyramid = build_pyramid(raster, level, set(levels) | set(label_levels) | set(tile_levels))
+
+    for lvl in sorted(pyramid):
+        grid = pyramid[lvl]
+        outputs = []
+        if lvl in levels:
+            outputs.append((os.path.join(output_dir, f"{name}_{lvl}.png"), False))
+        if lvl in label_levels:
+            outputs.append((os.path.join(output_dir, f"{name}_{lvl}_label.png"), True))
+        for path, labels in outputs:
+            render_density(grid, path, title=f"{title} (/{lvl} per pixel)", cmap=cmap, log_scale=log_scale,
+                           dpi=dpi, level=lvl, labels=labels)
+            print(f"✓ Saved {path}")
+
+        if lvl in tile_levels:
+            tile_dir = os.path.join(output_dir, f"{name}_{lvl}_tiles")
+            os.makedirs(tile_dir, exist_ok=True)
+            norm = color_norm(grid, log_scale)  # One colour scale across all tiles of a level
+            count = 0
+            for row, column, tile in iter_tiles(grid, tile_size):
+                save_tile(tile, os.path.join(tile_dir, f"{row}_{column}.png"), norm, cmap)
+                count += 1
+            print(f"✓ Saved {count} tiles to {tile_dir}")
+
+
+def main():
+    """Render a Hilbert density map, pyramid or multi-dataset overlay from files with one IP per line"""
+    parser = argparse.ArgumentParser(description="Hilbert map of IPv4 addresses")
+    parser.add_argument('ip_files', nargs='*', default=[DEFAULT_IP_FILE], help="One IP per line; several files make an overlay")
+    parser.add_argument('--level', type=int, default=24,
+                        help="Even prefix length per pixel; the map is 2^(level/2) pixels wide (24 -> 4096)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--title', default='Hilbert Map of IPs (RRSIG responses)')
+    parser.add_argument('--cmap', default='viridis')
+    parser.add_argument('--linear', action='store_true', help="Linear instead of logarithmic colour scale")
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--show', action='store_true', help="Also open an interactive window")
+    parser.add_argument('--pyramid', type=int, nargs='+', metavar='LEVEL',
+                        help="Write these levels from one pass over the input (e.g. 6 8 12 16 18 20 24)")
+    parser.add_argument('--name', help="Pyramid file prefix (default: hilbert_map_<input name>)")
+    parser.add_argument('--output-dir', default=PYRAMID_DIR, help="Pyramid output directory")
+    parser.add_argument('--label-levels', type=int, nargs='*', default=[], help="Also write /8 labelled maps")
+    parser.add_argument('--tile-levels', type=int, nargs='*', default=[], help="Also write tiles of these levels")
+    parser.add_argument('--tile-size', type=int, default=1024)
+    parser.add_argument('--mode', choices=['channels', 'difference'], default='channels',
+                        help="How several input files are combined")
+    parser.add_argument('--names', nargs='*', help="Legend names for the input files")
+    parser.add_argument('--labels', action='store_true', help="Write /8 labels onto the map")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Coordinate cache for overlays")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the coordinate cache")
+    args = parser.parse_args()
+
+    if not args.show:
+        matplotlib.use('Agg')
+
+    if len(args.ip_files) > 1:
+        names = args.names or [os.path.splitext(os.path.basename(path))[0] for path in args.ip_files]
+        start = time.perf_counter()
+        rasters = [coordinates_raster(*cached_coordinates(path, None if args.no_cache else args.cache_dir), args.level)
+                   for path in args.ip_files]
+        print(f"✓ Mapped {len(rasters)} datasets onto {rasters[0].shape[1]}x{rasters[0].shape[0]} Hilbert maps "
+              f"in {time.perf_counter() - start:.2f}s")
+        render_overlay(rasters, names, args.output, mode=args.mode, title=args.title, dpi=args.dpi, show=args.show,
+                       level=args.level, labels=args.labels)
+        print(f"✓ Saved {args.output}")
+        return
+    args.ip_file = args.ip_files[0]
+
+    level = max([args.level] if not args.pyramid else args.pyramid + args.label_levels + args.tile_levels)
+    start = time.perf_counter()
+    raster = density_raster(iter_ip_chunks(args.ip_file), level)
+    print(f"✓ Mapped {int(raster.sum()):,} addresses onto a {raster.shape[1]}x{raster.shape[0]} Hilbert map "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    if args.pyramid:
+        name = args.name or 'hilbert_map_' + os.path.splitext(os.path.basename(args.ip_file))[0]
+        write_pyramid(raster, level, args.pyramid, name, args.output_dir, args.title, cmap=args.cmap,
+                      log_scale=not args.linear, dpi=args.dpi, label_levels=args.label_levels,
+                      tile_levels=args.tile_levels, tile_size=args.tile_size)
+        return
+
+    render_density(raster, args.output, title=args.title, cmap=args.cmap, log_scale=not args.linear,
+                   dpi=args.dpi, show=args.show, level=level, labels=args.labels)
+    print(f"✓ Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
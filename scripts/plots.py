@@ -1,38 +1,74 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import pymysql
+#!/usr/bin/env python3
+"""
+Resolver distribution charts
+
+Charts are declared in CHARTS (dimension, filter, chart type, top-N, output
+path). The pipeline loads the needed columns of dns_resolvers in one query,
+resolves AS names once through the in-memory ASN index, computes every
+aggregate in pandas and renders the figures in parallel worker processes
+with the non-interactive Agg backend.
+
+Usage:
+    python3 plots.py [--db URL] [--output-dir data/plots] [--workers 4] [--only NAME ...]
+
+Requires: pip install pandas matplotlib numpy
+"""
 
-plt.style.use('rose-pine')
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
 
-# MySQL Configuration
-db_config = {
-    'user': 'pink',
-    'password': 'passw',
-    'host': 'localhost',
-    'database': 'dns_servers',
+import matplotlib
+import pandas as pd
+import matplotlib.pyplot as plt
+from asn_index import ASNIndex
+from storage import DEFAULT_DB_CONFIG, DatabaseErrors, get_backend, resolve_source
+
+STYLE = 'rose-pine'
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'plots')
+
+# Every chart the pipeline renders. dimension is a column of the loaded frame
+# ('owner', 'geo_location', 'as_name' or 'ip_prefix'); filter 'dnssec' keeps
+# resolvers with DNSSEC support; drop_empty removes NULL/'' labels.
+CHARTS = [
+    {'name': 'ip_histogram', 'dimension': 'ip_prefix', 'chart': 'histogram',
+     'title': "Distribution of DNS Resolvers by /8 IP Address Block", 'output': 'ip_histogram.svg'},
+    {'name': 'top10_owner', 'dimension': 'owner', 'chart': 'bar', 'top_n': 10,
+     'title': "Top Organizations by Number of DNS Resolvers", 'x_label': "Organization",
+     'y_label': "Number of DNS Resolvers", 'output': 'top10_dns_resolver_by_owner.svg'},
+    {'name': 'owner', 'dimension': 'owner', 'chart': 'pie', 'top_n': 5, 'drop_empty': True,
+     'title': "Top 5 Organizations by DNS Resolver Count", 'output': 'dns_resolvers_by_owner.svg'},
+    {'name': 'dnssec_owner', 'dimension': 'owner', 'filter': 'dnssec', 'chart': 'pie', 'top_n': 5, 'drop_empty': True,
+     'title': "Top 5 Organizations by DNSSEC Resolver Count", 'output': 'dnssec_resolvers_by_owner.svg'},
+    {'name': 'country', 'dimension': 'geo_location', 'chart': 'pie', 'top_n': 5,
+     'title': "Top 5 Countires by DNS Resolver Count", 'output': 'dns_resolvers_by_country.svg'},
+    {'name': 'dnssec_country', 'dimension': 'geo_location', 'filter': 'dnssec', 'chart': 'pie', 'top_n': 5,
+     'title': "Top 5 Countires by DNSSEC Resolver Count", 'output': 'dnssec_resolvers_by_country.svg'},
+    {'name': 'as', 'dimension': 'as_name', 'chart': 'pie', 'top_n': 5, 'drop_empty': True,
+     'title': "Top 5 AS by DNS Server Count", 'output': 'dns_resolvers_by_as.svg'},
+    {'name': 'dnssec_as', 'dimension': 'as_name', 'filter': 'dnssec', 'chart': 'pie', 'top_n': 5, 'drop_empty': True,
+     'title': "Top 5 AS by DNSSEC Server Count", 'output': 'dnssec_resolvers_by_as.svg'},
+]
+
+FILTERS = {
+    'dnssec': lambda df: pd.to_numeric(df['dnssec_support'], errors='coerce').fillna(0).astype(bool),
 }
 
-def create_plot(sql_query, title, x_label, y_label, output_path, plot_type='bar'):
+
+def render_plot(df, title, x_label, y_label, output_path, plot_type='bar', top_n=None):
     """
-    Generates a bar plot or pie chart based on the SQL query provided.
+    Renders a bar plot or pie chart from an already aggregated DataFrame.
 
     Args:
-        sql_query (str): SQL query to execute.
+        df (pd.DataFrame): Aggregated data with 'count' and 'owner' columns.
         title (str): Title of the plot.
         x_label (str): Label for the x-axis (only for bar plots).
         y_label (str): Label for the y-axis (only for bar plots).
         output_path (str): Path to save the plot.
         plot_type (str): Type of plot to generate ('bar' or 'pie'). Defaults to 'bar'.
+        top_n (int): Entries shown (bar) or kept before "Other" (pie). Defaults to 10 / 5.
     """
-    try:
-        # Establish database connection
-        cnx = pymysql.connect(**db_config)
-        df = pd.read_sql(sql_query, cnx)
-        cnx.close()
-    except pymysql.MySQLError as err:
-        print(f"Error connecting to MySQL: {err}")
-        return
-
     # Clean and rename columns (if necessary)
     df.columns = [col.strip().lower() for col in df.columns]
 
@@ -44,7 +80,7 @@ def create_plot(sql_query, title, x_label, y_label, output_path, plot_type='bar'
             df["count"] = pd.to_numeric(df["count"], errors="coerce").fillna(0).astype(int)
 
             # Sort by count and get top N (e.g., top 10)
-            N = 10
+            N = top_n or 10
             top_n = df.sort_values("count", ascending=False).head(N)
 
             # Calculate total and percentage
@@ -83,8 +119,9 @@ def create_plot(sql_query, title, x_label, y_label, output_path, plot_type='bar'
             geo_counts = df.set_index('owner')['count'].sort_values(ascending=False)
 
             # Split into top 5 and "Other"
-            top5 = geo_counts.head(5)
-            other = geo_counts.iloc[5:].sum()
+            N = top_n or 5
+            top5 = geo_counts.head(N)
+            other = geo_counts.iloc[N:].sum()
             top5['Other'] = other
 
             # Create pie chart
@@ -101,181 +138,121 @@ def create_plot(sql_query, title, x_label, y_label, output_path, plot_type='bar'
         print(f"Invalid plot_type: {plot_type}.  Must be 'bar' or 'pie'.")
 
 
-def create_ip_histogram(db_config, output_path, title):
+def render_histogram(df, title, output_path):
     """
-    Generates a histogram of DNS resolvers based on the /8 IP address block.
+    Renders the /8 histogram from an aggregated DataFrame with 'ip_prefix' and 'count' columns.
 
     Args:
-        db_config (dict): Database configuration.
-        output_path (str): Path to save the plot.
+        df (pd.DataFrame): Resolver count per first octet.
         title (str): Title of the plot.
+        output_path (str): Path to save the plot.
     """
+    # Convert IP prefix to numeric for sorting
+    df = df.copy()
+    df['ip_prefix_numeric'] = pd.to_numeric(df['ip_prefix'], errors='coerce')
+    df = df.sort_values('ip_prefix_numeric')
+
+    # Plot
+    plt.figure(figsize=(12, 6))
+    plt.bar(df["ip_prefix"], df["count"], color="skyblue", edgecolor="black")
+
+    # Labels and formatting
+    plt.title(title)
+    plt.xlabel("IP Address /8 Prefix")
+    plt.ylabel("Number of DNS Resolvers")
+    plt.xticks(rotation=45, ha='right')
+
+    # Only show every 4th label
+    for n, label in enumerate(plt.gca().xaxis.get_ticklabels()):
+        if n % 5 != 0:
+            label.set_visible(False)
+
+    plt.tight_layout()
+
+    # Save as SVG
+    plt.savefig(output_path, format="svg")
+    plt.close()  # Close the figure to free memory
+
+
+def load_resolvers(backend) -> pd.DataFrame:
+    """
+    Loads every column the charts need with a single query.
+
+    AS names come from the ASN interval index; like the old range join, a
+    resolver only gets one if a covering range belongs to its recorded ASN.
+    """
+    df = backend.read_sql("SELECT ip, owner, geo_location, asn, dnssec_support FROM dns_resolvers")
+
+    as_names = ASNIndex.cached(backend).lookup_matching(df['ip'].fillna(''), df['asn'].astype(str))
+    df['as_name'] = pd.Series(as_names, index=df.index)
+
+    # Same as SUBSTRING_INDEX(ip, '.', 1)
+    df['ip_prefix'] = df['ip'].str.split('.', n=1).str[0]
+    return df
+
+
+def aggregate(df: pd.DataFrame, spec: Dict) -> pd.DataFrame:
+    """Counts resolvers per value of the chart's dimension, as 'owner'/'count' (or 'ip_prefix'/'count')"""
+    if spec.get('filter'):
+        df = df[FILTERS[spec['filter']](df)]
+    values = df[spec['dimension']]
+    if spec.get('drop_empty'):
+        values = values[values.notna() & (values != '')]
+    counts = values.value_counts(dropna=False)
+
+    label = 'ip_prefix' if spec['chart'] == 'histogram' else 'owner'
+    labels = ['Unknown' if pd.isna(value) else value for value in counts.index]
+    return pd.DataFrame({label: labels, 'count': counts.to_numpy()})
+
+
+def _init_worker(style):
+    """Use the non-interactive backend (and the plot style, if installed) in every worker"""
+    matplotlib.use('Agg')
+    if style in plt.style.available:
+        plt.style.use(style)
+
+
+def render_chart(spec: Dict, df: pd.DataFrame, output_dir: str) -> str:
+    """Renders one chart from its aggregate; runs inside a worker process"""
+    output_path = os.path.join(output_dir, spec['output'])
+    if spec['chart'] == 'histogram':
+        render_histogram(df, spec['title'], output_path)
+    else:
+        render_plot(df, spec['title'], spec.get('x_label', ''), spec.get('y_label', ''), output_path,
+                    spec['chart'], top_n=spec.get('top_n', 10 if spec['chart'] == 'bar' else 5))
+    return output_path
+
+
+def run_pipeline(charts: List[Dict] = CHARTS, source=None, output_dir: str = OUTPUT_DIR, workers: int = None):
+    """Loads the resolvers once, aggregates every chart and renders them in parallel"""
     try:
-        # Establish database connection
-        cnx = pymysql.connect(**db_config)
-        query = """
-            SELECT
-                SUBSTRING_INDEX(ip, '.', 1) AS ip_prefix,
-                COUNT(*) AS count
-            FROM dns_resolvers
-            GROUP BY ip_prefix
-        """
-        df = pd.read_sql(query, cnx)
-        cnx.close()
-
-        # Ensure 'count' is numeric
-        df["count"] = pd.to_numeric(df["count"], errors="coerce").fillna(0).astype(int)
-
-        # Convert IP prefix to numeric for sorting
-        df['ip_prefix_numeric'] = pd.to_numeric(df['ip_prefix'], errors='coerce')
-        df = df.sort_values('ip_prefix_numeric')
-
-        # Plot
-        plt.figure(figsize=(12, 6))
-        plt.bar(df["ip_prefix"], df["count"], color="skyblue", edgecolor="black")
-
-        # Labels and formatting
-        plt.title(title)
-        plt.xlabel("IP Address /8 Prefix")
-        plt.ylabel("Number of DNS Resolvers")
-        plt.xticks(rotation=45, ha='right')
-
-        # Only show every 4th label
-        for n, label in enumerate(plt.gca().xaxis.get_ticklabels()):
-            if n % 5 != 0:
-                label.set_visible(False)
-
-        plt.tight_layout()
-
-        # Save as SVG
-        plt.savefig(output_path, format="svg")
-        plt.close()  # Close the figure to free memory
-
-    except pymysql.MySQLError as err:
-        print(f"Error connecting to MySQL: {err}")
-
-
-create_ip_histogram(
-    db_config=db_config,
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/ip_histogram.svg",
-    title="Distribution of DNS Resolvers by /8 IP Address Block"
-)
-
-sql_query_1 = """
-SELECT owner, COUNT(*) AS count
-FROM dns_resolvers
-GROUP BY owner
-ORDER BY COUNT(*) DESC;
-"""
-create_plot(
-    sql_query=sql_query_1,
-    title="Top Organizations by Number of DNS Resolvers",
-    x_label="Organization",
-    y_label="Number of DNS Resolvers",
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/top10_dns_resolver_by_owner.svg",
-    plot_type='bar'
-)
-
-sql_query_2 = """
-SELECT owner, COUNT(*) AS count
-FROM dns_resolvers
-WHERE owner IS NOT NULL AND owner != ''
-GROUP BY owner
-"""
-create_plot(
-    sql_query=sql_query_2,
-    title="Top 5 Organizations by DNS Resolver Count",
-    x_label="",  # Not used for pie charts
-    y_label="",  # Not used for pie charts
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dns_resolvers_by_owner.svg",
-    plot_type='pie'
-)
-
-sql_query_7 = """
-SELECT owner, COUNT(*) AS count
-FROM dns_resolvers
-WHERE owner IS NOT NULL AND owner != '' AND dnssec_support is True
-GROUP BY owner
-"""
-create_plot(
-    sql_query=sql_query_7,
-    title="Top 5 Organizations by DNSSEC Resolver Count",
-    x_label="",  # Not used for pie charts
-    y_label="",  # Not used for pie charts
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dnssec_resolvers_by_owner.svg",
-    plot_type='pie'
-)
-
-sql_query_3 = """
-SELECT
-   COUNT(*) AS count,
-   geo_location AS COUNTRY
-FROM dns_resolvers
-GROUP BY geo_location
-"""
-create_plot(
-    sql_query=sql_query_3,
-    title="Top 5 Countires by DNS Resolver Count",
-    x_label="",
-    y_label="",
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dns_resolvers_by_country.svg",
-    plot_type='pie'
-)
-
-sql_query_6 = """
-SELECT
-   COUNT(*) AS count,
-   geo_location AS COUNTRY
-FROM dns_resolvers
-WHERE dnssec_support is True
-GROUP BY geo_location
-"""
-create_plot(
-    sql_query=sql_query_6,
-    title="Top 5 Countires by DNSSEC Resolver Count",
-    x_label="",
-    y_label="",
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dnssec_resolvers_by_country.svg",
-    plot_type='pie'
-)
-
-sql_query_4 = """
-SELECT
-    COUNT(*) AS count,
-    a.as_name AS name
-FROM dns_resolvers AS d
-JOIN as_ip_ranges AS a
-    ON INET_ATON(d.ip) BETWEEN INET_ATON(a.start_ip) AND INET_ATON(a.end_ip)
-WHERE d.asn = a.asn
-GROUP BY a.as_name
-ORDER BY COUNT(*) DESC
-"""
-create_plot(
-    sql_query=sql_query_4,
-    title="Top 5 AS by DNS Server Count",
-    x_label="",
-    y_label="",
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dns_resolvers_by_as.svg",
-    plot_type='pie'
-)
-
-# DNSSEC
-sql_query_5 = """
-SELECT
-    COUNT(*) AS count,
-    a.as_name AS name
-FROM dns_resolvers AS d
-JOIN as_ip_ranges AS a
-    ON INET_ATON(d.ip) BETWEEN INET_ATON(a.start_ip) AND INET_ATON(a.end_ip)
-WHERE d.asn = a.asn AND d.dnssec_support IS True
-GROUP BY a.as_name
-ORDER BY COUNT(*) DESC
-"""
-create_plot(
-    sql_query=sql_query_5,
-    title="Top 5 AS by DNSSEC Server Count",
-    x_label="",
-    y_label="",
-    output_path="/home/ubuntu/bachelor-thesis/data/plots/dnssec_resolvers_by_as.svg",
-    plot_type='pie'
-)
+        df = load_resolvers(get_backend(resolve_source(source, DEFAULT_DB_CONFIG)))
+    except DatabaseErrors as err:
+        print(f"Error reading from storage backend: {err}")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    aggregates = [(spec, aggregate(df, spec)) for spec in charts]
+    print(f"Loaded {len(df):,} resolvers, rendering {len(aggregates)} charts")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(STYLE,)) as pool:
+        futures = [pool.submit(render_chart, spec, agg, output_dir) for spec, agg in aggregates]
+        for future in futures:
+            print(f"Saved {future.result()}")
+
+
+def main():
+    """Renders all (or the selected) charts"""
+    parser = argparse.ArgumentParser(description="Render resolver distribution charts")
+    parser.add_argument('--db', help="Storage URL (default: $DNS_DB_URL, then the MySQL config)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: CPU count)")
+    parser.add_argument('--only', nargs='*', help="Chart names to render: " + ', '.join(c['name'] for c in CHARTS))
+    args = parser.parse_args()
+
+    charts = [c for c in CHARTS if not args.only or c['name'] in args.only]
+    run_pipeline(charts, args.db, args.output_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
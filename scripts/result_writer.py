@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Batched, transactional upsert writer for scan results
+
+Buffers result rows and flushes them as multi-row
+INSERT ... ON DUPLICATE KEY UPDATE statements over a single pooled MySQL
+connection, one transaction per batch. This replaces starting one
+`sudo mysql` process per IP (and a second one for the dig_output UPDATE):
+dig_output is simply another column of the same upsert.
+
+Usage:
+    python3 result_writer.py load RESULTS_FILE [--format tsv|csv|jsonl] [--batch-size 500]
+    python3 result_writer.py insert-ips IP_FILE [--table dns_servers]
+
+The password is read from the DNS_DB_PASSWORD environment variable only, so
+it never appears on the command line (or in `ps`). Under sudo, keep it with
+`sudo --preserve-env=DNS_DB_PASSWORD`, or connect through --unix-socket with
+socket authentication.
+
+Requires: pip install mysql-connector-python pandas
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:
+    mysql = pooling = None
+
+from storage import DEFAULT_DB_CONFIG
+
+PASSWORD_ENV = 'DNS_DB_PASSWORD'
+
+# One pool (holding one connection) per database configuration and process
+_POOLS: Dict[tuple, 'pooling.MySQLConnectionPool'] = {}
+
+
+def get_pool(config: Dict) -> 'pooling.MySQLConnectionPool':
+    """Return the process-wide connection pool for a database configuration"""
+    if pooling is None:
+        raise ImportError("result_writer.py requires mysql-connector-python")
+    key = tuple(sorted(config.items()))
+    if key not in _POOLS:
+        _POOLS[key] = pooling.MySQLConnectionPool(pool_name=f"writer_{len(_POOLS)}", pool_size=1,
+                                                  autocommit=False, **config)
+    return _POOLS[key]
+
+
+class ResultWriter:
+    """Buffer rows and write them as batched multi-row upserts"""
+
+    def __init__(self, config: Optional[Dict] = None, table: str = 'dns_resolvers',
+                 key_columns: Iterable[str] = ('ip',), batch_size: int = 500):
+        """
+        Args:
+            config: mysql.connector connection arguments (defaults to DEFAULT_DB_CONFIG)
+            table: Target table
+            key_columns: Columns that identify a row and are not updated on duplicates
+            batch_size: Rows per INSERT statement / transaction
+        """
+        self.config = config or DEFAULT_DB_CONFIG
+        self.table = table
+        self.key_columns = set(key_columns)
+        self.batch_size = batch_size
+        self.buffer: List[Dict] = []
+        self.written = 0
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def _connect(self):
+        """Check out the pooled connection on first use"""
+        if self.connection is None:
+            self.connection = get_pool(self.config).get_connection()
+        return self.connection
+
+    def upsert_statement(self, columns: List[str], rows: int) -> str:
+        """Build a multi-row INSERT ... ON DUPLICATE KEY UPDATE for the given columns"""
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        updates = [f"{column} = VALUES({column})" for column in columns if column not in self.key_columns]
+        if not updates:
+            # Nothing to update, keep the existing row
+            updates = [f"{column} = {column}" for column in columns[:1]]
+        return (f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES "
+                + ', '.join([placeholders] * rows)
+                + " ON DUPLICATE KEY UPDATE " + ', '.join(updates))
+
+    def write(self, row: Dict):
+        """Queue one result row, flushing when the batch is full"""
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, rows: Iterable[Dict]):
+        """Queue many result rows"""
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write all buffered rows in one transaction"""
+        if not self.buffer:
+            return
+
+        # Rows with different column sets need different statements
+        groups: Dict[tuple, List[Dict]] = {}
+        for row in self.buffer:
+            groups.setdefault(tuple(row), []).append(row)
+
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction()
+            for columns, rows in groups.items():
+                columns = list(columns)
+                params = [row[column] for row in rows for column in columns]
+                cursor.execute(self.upsert_statement(columns, len(rows)), params)
+            connection.commit()
+        except mysql.connector.Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """Return the connection to the pool"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def read_rows(path: str, fmt: str) -> Iterable[Dict]:
+    """Read result rows from a TSV/CSV file with a header line, or JSON lines"""
+    f = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if fmt == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f, delimiter='\t' if fmt == 'tsv' else ',', quoting=csv.QUOTE_NONE if fmt == 'tsv' else csv.QUOTE_MINIMAL)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main():
+    """Main function with command line configuration"""
+    parser = argparse.ArgumentParser(description="Batched upsert writer for scan results")
+    parser.add_argument('--host', default=DEFAULT_DB_CONFIG['host'])
+    parser.add_argument('--user', default=DEFAULT_DB_CONFIG['user'])
+    parser.add_argument('--database', default=DEFAULT_DB_CONFIG['database'])
+    parser.add_argument('--unix-socket', help="Connect through a socket instead of host (e.g. with sudo)")
+    parser.add_argument('--batch-size', type=int, default=500)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    load = sub.add_parser('load', help="Upsert result rows")
+    load.add_argument('results_file', help="Results file ('-' for stdin)")
+    load.add_argument('--format', choices=['tsv', 'csv', 'jsonl'], default='tsv')
+    load.add_argument('--table', default='dns_resolvers')
+    load.add_argument('--key', default='ip', help="Comma separated key columns")
+
+    insert = sub.add_parser('insert-ips', help="Insert one IP per line")
+    insert.add_argument('ip_file')
+    insert.add_argument('--table', default='dns_servers')
+
+    args = parser.parse_args()
+
+    config = {'user': args.user, 'password': os.environ.get(PASSWORD_ENV, DEFAULT_DB_CONFIG['password']),
+              'database': args.database}
+    if args.unix_socket:
+        config['unix_socket'] = args.unix_socket
+    else:
+        config['host'] = args.host
+
+    if args.command == 'load':
+        rows = read_rows(args.results_file, args.format)
+        key_columns = args.key.split(',')
+    else:
+        def ip_rows():
+            with open(args.ip_file) as f:
+                for line in f:
+                    if line.strip():
+                        yield {'ip': line.strip()}
+        rows = ip_rows()
+        key_columns = ['ip']
+
+    with ResultWriter(config, table=args.table, key_columns=key_columns, batch_size=args.batch_size) as writer:
+        writer.write_many(rows)
+
+    print(f"✓ Wrote {writer.written:,} rows to {args.table}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Local columnar snapshot cache for the dns_resolvers table
+
+Materializes the table once into a directory of column files and
+memory-maps them on later runs instead of re-running the full
+SELECT ip, asn, as_name ... FROM dns_resolvers:
+
+- ip.npy                     packed uint32 addresses (+ ip_valid.npy mask)
+- <column>.codes.npy         dictionary codes for asn, as_name, owner, geo_location
+                             (smallest integer type that fits, -1 = NULL)
+- labels.npz                 compressed side table with the dictionary labels
+                             (object arrays, so labels keep their DB types)
+- dnssec_support.npy, dnssec_validated.npy   int8 flags
+
+Snapshots are keyed by a cheap fingerprint of the source table (backend,
+row count, max id, and the table's UPDATE_TIME on MySQL or the file
+modification times on SQLite/Parquet; see storage.table_fingerprint), so
+in-place UPDATEs by the scan invalidate the snapshot too without scanning
+the table. Older snapshots
+are evicted oldest-first once the cache exceeds its size budget, and the
+cache can be invalidated explicitly.
+
+Usage:
+    python3 snapshot.py build [--db URL] [--refresh]
+    python3 snapshot.py list
+    python3 snapshot.py invalidate [--table dns_resolvers]
+
+Requires: pip install numpy pandas
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ipv4 import parse_ipv4, format_ipv4
+from storage import DEFAULT_DB_CONFIG, DatabaseErrors, StorageBackend, get_backend, resolve_source, table_fingerprint
+
+DEFAULT_CACHE_DIR = os.environ.get('DNS_SNAPSHOT_DIR', os.path.expanduser('~/.cache/dns_resolver_snapshots'))
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+CATEGORICAL_COLUMNS = ['asn', 'as_name', 'owner', 'geo_location']
+FLAG_COLUMNS = ['dnssec_support', 'dnssec_validated']
+
+
+def _code_dtype(n_labels: int):
+    """Smallest signed integer type that holds codes 0..n_labels-1 and -1"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_labels < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ResolverSnapshot:
+    """Memory-mapped, dictionary-encoded columns of the dns_resolvers table"""
+
+    def __init__(self, path: str, columns: Dict[str, np.ndarray], labels: Dict[str, np.ndarray], meta: Dict):
+        self.path = path
+        self.columns = columns
+        self.labels = labels
+        self.meta = meta
+
+    def __len__(self) -> int:
+        return len(self.columns['ip'])
+
+    @property
+    def ips(self) -> np.ndarray:
+        """Valid IPs as uint32"""
+        return np.asarray(self.columns['ip'])[np.asarray(self.columns['ip_valid'])]
+
+    def codes(self, column: str) -> np.ndarray:
+        """Dictionary codes of a categorical column (-1 = NULL)"""
+        return self.columns[f"{column}.codes"]
+
+    def decode(self, column: str, codes: np.ndarray) -> np.ndarray:
+        """Map codes back to their labels (None for -1)"""
+        labels = np.append(self.labels[column].astype(object), None)
+        return labels[np.asarray(codes)]
+
+    def to_frame(self, columns: Optional[List[str]] = None, with_ip_strings: bool = False) -> pd.DataFrame:
+        """
+        Build a DataFrame shaped like the SQL result
+
+        Categorical columns become pandas Categoricals over the side table, and
+        the packed 'ip_int'/'ip_valid' columns are included so
+        DNSGiniCalculator.load_ips() does not have to parse anything.
+        """
+        columns = columns or CATEGORICAL_COLUMNS + FLAG_COLUMNS
+        data = {'ip_int': np.asarray(self.columns['ip']), 'ip_valid': np.asarray(self.columns['ip_valid'])}
+        if with_ip_strings:
+            data['ip'] = [format_ipv4(ip) if valid else None for ip, valid in zip(data['ip_int'], data['ip_valid'])]
+        for column in columns:
+            if column in CATEGORICAL_COLUMNS:
+                data[column] = pd.Categorical.from_codes(np.asarray(self.codes(column)), categories=self.labels[column])
+            else:
+                data[column] = np.asarray(self.columns[column])
+        return pd.DataFrame(data)
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, path: str, meta: Dict) -> 'ResolverSnapshot':
+        """Encode a query result into a snapshot directory (written atomically)"""
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix='.building-')
+        try:
+            ips, valid = parse_ipv4(df['ip'])
+            np.save(os.path.join(tmp, 'ip.npy'), ips)
+            np.save(os.path.join(tmp, 'ip_valid.npy'), valid)
+
+            labels = {}
+            for column in CATEGORICAL_COLUMNS:
+                codes, uniques = pd.factorize(df[column] if column in df else pd.Series([None] * len(df)))
+                labels[column] = np.asarray(uniques, dtype=object)
+                np.save(os.path.join(tmp, f"{column}.codes.npy"), codes.astype(_code_dtype(len(uniques))))
+            np.savez_compressed(os.path.join(tmp, 'labels.npz'), **labels)
+
+            for column in FLAG_COLUMNS:
+                flags = pd.to_numeric(df[column], errors='coerce').fillna(0) if column in df else np.zeros(len(df))
+                np.save(os.path.join(tmp, f"{column}.npy"), np.asarray(flags, dtype=np.int8))
+
+            meta = dict(meta, rows=len(df), created=time.time())
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+
+            os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> 'ResolverSnapshot':
+        """Memory-map an existing snapshot directory"""
+        columns = {}
+        for name in os.listdir(path):
+            if name.endswith('.npy'):
+                columns[name[:-4]] = np.load(os.path.join(path, name), mmap_mode='r')
+        with np.load(os.path.join(path, 'labels.npz'), allow_pickle=True) as data:
+            labels = {column: data[column] for column in data.files}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(path, columns, labels, meta)
+
+
+class SnapshotCache:
+    """Directory of fingerprinted snapshots with size-bounded eviction"""
+
+    QUERY = """
+        SELECT ip, asn, as_name, owner, geo_location, dnssec_support, dnssec_validated
+        FROM {table}
+        WHERE ip IS NOT NULL AND ip != ''
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, table: str, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, f"{table}-{fingerprint}")
+
+    def get(self, backend: StorageBackend, table: str = 'dns_resolvers', refresh: bool = False) -> ResolverSnapshot:
+        """
+        Return the snapshot for the table's current fingerprint
+
+        Materializes it from the backend on a cache miss (or when refresh is
+        set), then evicts old snapshots beyond the size budget.
+        """
+        fingerprint = table_fingerprint(backend, table)
+        path = self._path(table, fingerprint)
+
+        if refresh and os.path.isdir(path):
+            shutil.rmtree(path)
+
+        if os.path.isdir(path):
+            os.utime(os.path.join(path, 'meta.json'))  # Mark as recently used
+            snapshot = ResolverSnapshot.open(path)
+            print(f"✓ Loaded {len(snapshot):,} {table} rows from snapshot {fingerprint}")
+            return snapshot
+
+        df = backend.read_sql(self.QUERY.format(table=table))
+        snapshot = ResolverSnapshot.write(df, path, {'table': table, 'fingerprint': fingerprint,
+                                                     'source': backend.describe()})
+        print(f"✓ Materialized {len(snapshot):,} {table} rows into snapshot {fingerprint}")
+        self.evict(keep=path)
+        return snapshot
+
+    def entries(self) -> List[Dict]:
+        """List cached snapshots, most recently used first"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            meta_path = os.path.join(path, 'meta.json')
+            if name.startswith('.') or not os.path.isfile(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            with open(meta_path) as f:
+                meta = json.load(f)
+            entries.append(dict(meta, path=path, bytes=size, used=os.path.getmtime(meta_path)))
+        return sorted(entries, key=lambda e: e['used'], reverse=True)
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used snapshots until the cache fits its size budget"""
+        entries = self.entries()
+        total = sum(e['bytes'] for e in entries)
+        for entry in reversed(entries):
+            if total <= self.max_bytes:
+                break
+            if entry['path'] == keep:
+                continue
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            total -= entry['bytes']
+            print(f"✓ Evicted snapshot {os.path.basename(entry['path'])}")
+
+    def invalidate(self, table: Optional[str] = None) -> int:
+        """Delete all snapshots (of one table, if given); returns the number removed"""
+        removed = 0
+        for entry in self.entries():
+            if table is None or entry.get('table') == table:
+                shutil.rmtree(entry['path'], ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def main():
+    """Build, list or invalidate resolver snapshots"""
+    parser = argparse.ArgumentParser(description="Columnar snapshot cache for dns_resolvers")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Materialize (or reuse) the snapshot for the current table state")
+    build.add_argument('--db', help="Storage URL (default: $DNS_DB_URL)")
+    build.add_argument('--table', default='dns_resolvers')
+    build.add_argument('--refresh', action='store_true', help="Rebuild even if the fingerprint matches")
+
+    sub.add_parser('list', help="Show cached snapshots")
+
+    invalidate = sub.add_parser('invalidate', help="Delete cached snapshots")
+    invalidate.add_argument('--table', default=None)
+
+    args = parser.parse_args()
+    cache = SnapshotCache(args.cache_dir, args.max_bytes)
+
+    if args.command == 'build':
+        try:
+            cache.get(get_backend(resolve_source(args.db, DEFAULT_DB_CONFIG)), args.table, refresh=args.refresh)
+        except DatabaseErrors as err:
+            print(f"✗ Could not build snapshot: {err}")
+            sys.exit(1)
+    elif args.command == 'list':
+        for entry in cache.entries():
+            print(f"{os.path.basename(entry['path']):<40} {entry['rows']:>12,} rows {entry['bytes'] / 1024 ** 2:>10.1f} MiB  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['used']))}  {entry.get('source', '')}")
+    else:
+        print(f"✓ Removed {cache.invalidate(args.table)} snapshot(s)")
+
+
+if __name__ == "__main__":
+    main()
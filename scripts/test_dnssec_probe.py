@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio DNSSEC prober against a local stand-in UDP responder
+
+The responder listens on 127.0.0.1, answers every query with configurable
+flags and record types (optionally preceded by a decoy packet, and over TCP
+as well), and records what it received, so DO/AD/RRSIG parsing, response
+matching, TCP fallback, timeouts, retries and the rate limit are checked
+without network access.
+
+Usage:
+    python3 -m pytest scripts/test_dnssec_probe.py
+"""
+
+import asyncio
+import struct
+import time
+import unittest
+from typing import List, Optional, Tuple
+
+from dnssec_probe import (DNSSECProber, EDNS_DO, FLAG_AD, FLAG_QR, FLAG_RA, FLAG_RD, FLAG_TC, TYPE_NS, TYPE_OPT,
+                          TYPE_RRSIG, _skip_name, canonical_ipv4, encode_question)
+
+
+def build_response(query: bytes, flags: int, answer_types: List[int]) -> bytes:
+    """Answer a query with one record per type (root owner name, 4 bytes of rdata)"""
+    txid = struct.unpack('!H', query[:2])[0]
+    question_end = _skip_name(query, 12) + 4
+    header = struct.pack('!HHHHHH', txid, FLAG_QR | flags, 1, len(answer_types), 0, 0)
+    records = b''.join(b'\x00' + struct.pack('!HHIH', rtype, 1, 3600, 4) + b'\x00' * 4 for rtype in answer_types)
+    return header + query[12:question_end] + records
+
+
+def build_decoy(query: bytes, kind: str) -> bytes:
+    """Validated RRSIG answer with the query's txid that must not be taken as its answer"""
+    reply = build_response(query, FLAG_RD | FLAG_RA | FLAG_AD, [TYPE_RRSIG])
+    if kind == 'no_qr':
+        return reply[:2] + bytes([reply[2] & ~(FLAG_QR >> 8) & 0xFF]) + reply[3:]
+    question_end = _skip_name(query, 12) + 4
+    return reply[:12] + encode_question('example.com.') + reply[question_end:]
+
+
+class StandInResponder(asyncio.DatagramProtocol):
+    """Local UDP DNS responder that answers (or drops) every query"""
+
+    def __init__(self, flags: int = FLAG_RD | FLAG_RA, answer_types: Tuple[int, ...] = (TYPE_NS,),
+                 drop: bool = False, truncate: int = 0, decoy: Optional[str] = None,
+                 tcp_answer_types: Optional[Tuple[int, ...]] = None):
+        """
+        Args:
+            flags: Header flags of every answer (QR is always set)
+            answer_types: RR type of each answer record
+            drop: Never answer, to exercise timeouts and retries
+            truncate: Cut this many bytes off the end of every answer
+            decoy: Send a decoy before every answer: 'no_qr' (QR bit clear) or
+                'question' (answers a different question)
+            tcp_answer_types: Also answer over TCP on the same port, with these
+                record types (None = no TCP listener)
+        """
+        self.flags = flags
+        self.answer_types = list(answer_types)
+        self.drop = drop
+        self.truncate = truncate
+        self.decoy = decoy
+        self.tcp_answer_types = tcp_answer_types
+        self.queries: List[Tuple[float, bytes]] = []
+        self.tcp_queries: List[bytes] = []
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries.append((time.monotonic(), data))
+        if self.drop:
+            return
+        if self.decoy:
+            self.transport.sendto(build_decoy(data, self.decoy), addr)
+        reply = build_response(data, self.flags, self.answer_types)
+        self.transport.sendto(reply[:len(reply) - self.truncate], addr)
+
+    async def handle_tcp(self, reader, writer):
+        """Answer one length-prefixed query over TCP, without the TC flag"""
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        query = await reader.readexactly(length)
+        self.tcp_queries.append(query)
+        reply = build_response(query, self.flags & ~FLAG_TC, list(self.tcp_answer_types))
+        writer.write(struct.pack('!H', len(reply)) + reply)
+        await writer.drain()
+        writer.close()
+
+
+def probe(responder: StandInResponder, ips: List[str], **kwargs) -> List[dict]:
+    """Run the prober against a responder on an ephemeral local port"""
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: responder, local_addr=('127.0.0.1', 0))
+        port = transport.get_extra_info('sockname')[1]
+        server = None
+        if responder.tcp_answer_types is not None:
+            server = await asyncio.start_server(responder.handle_tcp, '127.0.0.1', port)
+        try:
+            prober = DNSSECProber(port=port, **kwargs)
+            results = []
+            await prober.run(ips, results.append)
+            return results
+        finally:
+            transport.close()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+    return asyncio.run(run())
+
+
+def opt_ttl(query: bytes) -> int:
+    """TTL field (extended RCODE, version, DO bit) of the OPT record in a query"""
+    offset = _skip_name(query, 12) + 4
+    offset = _skip_name(query, offset)
+    rtype, _, ttl, _ = struct.unpack('!HHIH', query[offset:offset + 10])
+    assert rtype == TYPE_OPT
+    return ttl
+
+
+class ProbeResponseTest(unittest.TestCase):
+    """Flags and records of the answers end up in the result rows"""
+
+    def test_query_sets_do_bit(self):
+        responder = StandInResponder()
+        probe(responder, ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual(len(responder.queries), 1)
+        self.assertTrue(opt_ttl(responder.queries[0][1]) & EDNS_DO)
+
+    def test_rrsig_and_ad(self):
+        responder = StandInResponder(flags=FLAG_RD | FLAG_RA | FLAG_AD, answer_types=(TYPE_NS, TYPE_RRSIG))
+        [row] = probe(responder, ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual((row['dnssec_support'], row['dnssec_validated']), (1, 1))
+        self.assertIn('flags: qr rd ra ad', row['dig_output'])
+        self.assertIn('answer: NS,RRSIG', row['dig_output'])
+
+    def test_rrsig_without_ad(self):
+        responder = StandInResponder(answer_types=(TYPE_NS, TYPE_RRSIG))
+        [row] = probe(responder, ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual((row['dnssec_support'], row['dnssec_validated']), (1, 0))
+
+    def test_no_dnssec(self):
+        [row] = probe(StandInResponder(), ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual((row['dnssec_support'], row['dnssec_validated']), (0, 0))
+        self.assertIn('status: NOERROR', row['dig_output'])
+
+    def test_malformed_response(self):
+        [row] = probe(StandInResponder(answer_types=(TYPE_RRSIG,), truncate=2), ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual(row['dnssec_support'], 0)
+        self.assertIn('malformed response', row['dig_output'])
+
+    def test_non_canonical_address(self):
+        [row] = probe(StandInResponder(answer_types=(TYPE_RRSIG,)), ['127.000.000.001'], timeout=1, retries=0)
+        self.assertEqual(row['ip'], '127.000.000.001')
+        self.assertEqual(row['dnssec_support'], 1)
+
+    def test_canonical_ipv4(self):
+        self.assertEqual(canonical_ipv4('010.001.002.003'), '10.1.2.3')
+        self.assertEqual(canonical_ipv4(' 8.8.8.8\n'), '8.8.8.8')
+        for value in ('256.1.1.1', '1.2.3', '1.2.3.4.5', '::1', 'example.com', '1.2.3.0004'):
+            self.assertIsNone(canonical_ipv4(value))
+
+
+class ResponseMatchingTest(unittest.TestCase):
+    """Only real answers to the query count, and truncated ones are retried over TCP"""
+
+    def test_ignores_packet_without_qr(self):
+        [row] = probe(StandInResponder(decoy='no_qr'), ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual((row['dnssec_support'], row['dnssec_validated']), (0, 0))
+        self.assertIn('answer: NS;', row['dig_output'])
+
+    def test_ignores_other_question(self):
+        [row] = probe(StandInResponder(decoy='question'), ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual((row['dnssec_support'], row['dnssec_validated']), (0, 0))
+        self.assertIn('answer: NS;', row['dig_output'])
+
+    def test_truncated_retried_over_tcp(self):
+        responder = StandInResponder(flags=FLAG_RD | FLAG_RA | FLAG_TC, answer_types=(),
+                                     tcp_answer_types=(TYPE_NS, TYPE_RRSIG))
+        [row] = probe(responder, ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual(len(responder.tcp_queries), 1)
+        self.assertEqual(row['dnssec_support'], 1)
+        self.assertTrue(row['dig_output'].startswith(';; Truncated, retried in TCP mode.'), row['dig_output'])
+        self.assertNotIn(' tc', row['dig_output'])
+
+    def test_truncated_without_tcp(self):
+        responder = StandInResponder(flags=FLAG_RD | FLAG_RA | FLAG_TC, answer_types=())
+        [row] = probe(responder, ['127.0.0.1'], timeout=1, retries=0)
+        self.assertEqual(row['dnssec_support'], 0)
+        self.assertTrue(row['dig_output'].startswith(';; truncated, TCP retry failed:'), row['dig_output'])
+        self.assertIn('flags: qr tc rd ra', row['dig_output'])
+
+
+class ProbeFailureTest(unittest.TestCase):
+    """Silent, unreachable and invalid targets"""
+
+    def test_timeout_with_retries(self):
+        responder = StandInResponder(drop=True)
+        start = time.monotonic()
+        [row] = probe(responder, ['127.0.0.1'], timeout=0.2, retries=2)
+        self.assertEqual(len(responder.queries), 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+        self.assertEqual(row['dnssec_support'], 0)
+        self.assertIn('timed out', row['dig_output'])
+
+    def test_send_error_is_reported(self):
+        # Broadcast without SO_BROADCAST fails in sendto() instead of timing out
+        responder = StandInResponder()
+        start = time.monotonic()
+        [row] = probe(responder, ['255.255.255.255'], timeout=2, retries=2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(row['dig_output'].startswith(';; error:'), row['dig_output'])
+
+    def test_invalid_address(self):
+        responder = StandInResponder()
+        [row] = probe(responder, ['example.com'], timeout=1, retries=0)
+        self.assertEqual(responder.queries, [])
+        self.assertIn('not an IPv4 address', row['dig_output'])
+
+
+class RateLimitTest(unittest.TestCase):
+    """The token bucket spaces queries out across all workers"""
+
+    def test_rate_limit(self):
+        responder = StandInResponder()
+        rate, count = 100, 30
+        rows = probe(responder, ['127.0.0.1'] * count, rate=rate, in_flight=count, timeout=1, retries=0)
+        self.assertEqual(len(rows), count)
+        self.assertEqual(len(responder.queries), count)
+
+        # Burst is rate // 100 = 1 token, so the queries take at least (count - 1) / rate
+        times = sorted(sent for sent, _ in responder.queries)
+        self.assertGreaterEqual(times[-1] - times[0], (count - 1) / rate * 0.9)
+
+    def test_unlimited_rate(self):
+        responder = StandInResponder()
+        rows = probe(responder, ['127.0.0.1'] * 50, rate=0, in_flight=50, timeout=1, retries=0)
+        self.assertEqual(len(rows), 50)
+        self.assertTrue(all(row['dig_output'].startswith(';; status: NOERROR') for row in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()